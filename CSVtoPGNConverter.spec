@@ -5,7 +5,7 @@ a = Analysis(
     ['cvs-to-pgn-w-filters.py'],
     pathex=[],
     binaries=[],
-    datas=[('README.md', '.')],
+    datas=[('README.md', '.'), ('csv2pgn/data', 'csv2pgn/data')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,217 @@
+"""Per-stage timing of the CSV to PGN pipeline
+
+Times each stage of the conversion separately on a CSV file, then the whole
+convert() run, and prints a JSON report with seconds and rows/s per stage and
+the peak RSS. Keep the reports of earlier runs and pass one as --baseline to
+see the change per stage.
+
+    python benchmarks/generate.py games 1M -o games-1m.csv
+    python benchmarks/bench.py games-1m.csv --rows 100k -o report.json
+    python benchmarks/bench.py games-1m.csv --rows 100k --baseline report.json
+
+Stages, run block by block on the first --rows rows:
+
+    read       split the file into blocks and parse them with pandas
+    filter     rating and opening masks on each block (the vectorized apply_filters)
+    build      replay and validate the moves into a game tree (row_to_pgn_game)
+    serialize  str(game) on the built games (python-chess StringExporter)
+    render     replay straight to PGN text, the path convert() uses
+    write      write the rendered text through PgnWriter
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import closing
+
+# Run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chess
+import pandas as pd
+
+from csv2pgn import CHUNK_ROWS, ConversionFilters, PgnWriter, convert, iter_csv_blocks
+from csv2pgn.engine import detect_profile, read_csv_block
+from csv2pgn.themes import theme_set
+
+from generate import parse_size
+
+STAGES = ['read', 'filter', 'build', 'serialize', 'render', 'write']
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished children, in MB
+    
+    Returns (None, None) where the resource module is not available (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None, None
+        
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+
+def stage_report(seconds, rows):
+    return {
+        'seconds': round(seconds, 4),
+        'rows': rows,
+        'rows_per_s': round(rows / seconds, 1) if seconds else None,
+    }
+
+
+def time_stages(csv_path, filters, rows_limit=None, chunk_rows=CHUNK_ROWS):
+    """Run every stage in turn on each block and return the per-stage reports"""
+    seconds = dict.fromkeys(STAGES, 0.0)
+    counts = dict.fromkeys(STAGES, 0)
+    profile_name = None
+    rows_seen = 0
+    
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        writer = PgnWriter(devnull)
+        blocks = iter_csv_blocks(csv_path, chunk_rows)
+        
+        with closing(blocks):
+            while rows_limit is None or rows_seen < rows_limit:
+                start = time.perf_counter()
+                try:
+                    block, _, _ = next(blocks)
+                except StopIteration:
+                    break
+                chunk = read_csv_block(block)
+                if rows_limit is not None:
+                    chunk = chunk.iloc[:rows_limit - rows_seen]
+                seconds['read'] += time.perf_counter() - start
+                counts['read'] += len(chunk)
+                rows_seen += len(chunk)
+                
+                profile = detect_profile(tuple(chunk.columns))
+                profile_name = profile.name
+                classify = bool(filters.themes) and not profile.themes_from_columns
+                
+                start = time.perf_counter()
+                rows = profile.filter_chunk(chunk, filters).to_dict('records')
+                seconds['filter'] += time.perf_counter() - start
+                counts['filter'] += len(chunk)
+                
+                start = time.perf_counter()
+                games = [profile.build_game(row, classify)[0] for row in rows]
+                seconds['build'] += time.perf_counter() - start
+                counts['build'] += len(rows)
+                
+                start = time.perf_counter()
+                for game in games:
+                    str(game) + "\n\n"
+                seconds['serialize'] += time.perf_counter() - start
+                counts['serialize'] += len(games)
+                
+                start = time.perf_counter()
+                selected = theme_set(filters.themes) if classify else None
+                texts = []
+                for row in rows:
+                    pgn, _, themes = profile.render_game(row, classify)
+                    if not selected or not selected.isdisjoint(themes):
+                        texts.append(pgn)
+                seconds['render'] += time.perf_counter() - start
+                counts['render'] += len(rows)
+                
+                start = time.perf_counter()
+                for pgn in texts:
+                    writer.write(pgn)
+                writer.flush()
+                seconds['write'] += time.perf_counter() - start
+                counts['write'] += len(texts)
+                
+    return profile_name, {stage: stage_report(seconds[stage], counts[stage]) for stage in STAGES}
+
+
+def time_convert(csv_path, filters, workers, chunk_rows):
+    """Time a full convert() run into a temporary file"""
+    fd, pgn_path = tempfile.mkstemp(suffix='.pgn')
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        stats = convert(csv_path, pgn_path, filters, workers=workers, chunk_rows=chunk_rows)
+        seconds = time.perf_counter() - start
+        output_bytes = os.path.getsize(pgn_path)
+    finally:
+        os.remove(pgn_path)
+        
+    report = stage_report(seconds, stats.processed)
+    report.update(workers=workers, converted=stats.converted, skipped=stats.skipped, output_bytes=output_bytes)
+    return report
+
+
+def compare(report, baseline):
+    """Print the rows/s change of every stage against an earlier report"""
+    def rate(entry):
+        return entry.get('rows_per_s') if entry else None
+        
+    pairs = [(stage, report['stages'].get(stage), baseline.get('stages', {}).get(stage)) for stage in STAGES]
+    pairs.append(('convert', report.get('convert'), baseline.get('convert')))
+    
+    for name, new, old in pairs:
+        if rate(new) and rate(old):
+            sys.stderr.write(f"{name:10} {rate(old):12.1f} -> {rate(new):12.1f} rows/s  ({rate(new) / rate(old):.2f}x)\n")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Time each stage of the CSV to PGN conversion")
+    parser.add_argument('input', help="CSV file, e.g. one written by generate.py")
+    parser.add_argument('-o', '--output', help="write the JSON report to this file (default: stdout)")
+    parser.add_argument('--rows', type=parse_size, help="rows timed per stage (default: all)")
+    parser.add_argument('--min-rating', type=int, default=0)
+    parser.add_argument('--max-rating', type=int, default=3000)
+    parser.add_argument('--opening', action='append', default=[])
+    parser.add_argument('--theme', action='append', default=[])
+    parser.add_argument('-j', '--workers', type=int, default=1, help="worker processes for the convert run")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--no-convert', action='store_true', help="skip the full convert() run")
+    parser.add_argument('--baseline', help="earlier JSON report to compare against")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    filters = ConversionFilters(args.min_rating, args.max_rating, args.opening, args.theme)
+    
+    profile_name, stages = time_stages(args.input, filters, args.rows, args.chunk_rows)
+    report = {
+        'input': os.path.abspath(args.input),
+        'input_bytes': os.path.getsize(args.input),
+        'format': profile_name,
+        'filters': vars(filters),
+        'chunk_rows': args.chunk_rows,
+        'stages': stages,
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'chess': chess.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+    }
+    if not args.no_convert:
+        report['convert'] = time_convert(args.input, filters, args.workers, args.chunk_rows)
+    report['peak_rss_mb'], report['peak_rss_children_mb'] = peak_rss_mb()
+    
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+        
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
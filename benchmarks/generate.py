@@ -0,0 +1,223 @@
+"""Deterministic synthetic CSV generator for benchmarking the conversion
+
+Writes game CSVs (the generic column layout) or Lichess puzzle CSVs. Replaying
+random legal games for millions of rows would take longer than converting
+them, so a pool of games is played out once and rows are drawn from it with
+varied headers, ratings and lengths. The same seed always gives the same file.
+
+    python benchmarks/generate.py games 1M -o games-1m.csv
+    python benchmarks/generate.py puzzles 10k -o puzzles-10k.csv
+"""
+import argparse
+import csv
+import random
+import sys
+import unicodedata
+
+import chess
+
+# Row count suffixes accepted on the command line
+SIZE_SUFFIXES = {'k': 1000, 'm': 1000000}
+
+# Distinct games played out for the rows to be drawn from
+POOL_SIZE = 1000
+
+# Share of game rows whose moves contain an illegal move
+INVALID_RATE = 0.02
+
+# Opening lines the pool games start from, with the names used in the opening column
+OPENING_LINES = [
+    ('B20', 'Sicilian Defense', 'e4 c5'),
+    ('B90', 'Sicilian Defense: Najdorf Variation', 'e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6 Nc3 a6'),
+    ('C00', 'French Defense', 'e4 e6'),
+    ('C11', 'French Defense: Classical Variation', 'e4 e6 d4 d5 Nc3 Nf6'),
+    ('B12', 'Caro-Kann Defense: Advance Variation', 'e4 c6 d4 d5 e5'),
+    ('D06', "Queen's Gambit", 'd4 d5 c4'),
+    ('D37', "Queen's Gambit Declined", 'd4 d5 c4 e6 Nc3 Nf6 Nf3'),
+    ('E60', "King's Indian Defense", 'd4 Nf6 c4 g6'),
+    ('A10', 'English Opening', 'c4'),
+    ('C60', 'Ruy Lopez', 'e4 e5 Nf3 Nc6 Bb5'),
+    ('C50', 'Italian Game', 'e4 e5 Nf3 Nc6 Bc4'),
+    ('B01', 'Scandinavian Defense', 'e4 d5'),
+    ('B02', 'Alekhine Defense', 'e4 Nf6'),
+    ('E20', 'Nimzo-Indian Defense', 'd4 Nf6 c4 e6 Nc3 Bb4'),
+    ('D80', 'Grünfeld Defense', 'd4 Nf6 c4 g6 Nc3 d5'),
+    ('A02', "Bird's Opening", 'f4'),
+    ('A04', 'Réti Opening', 'Nf3'),
+    ('C25', 'Vienna Game', 'e4 e5 Nc3'),
+    ('C30', "King's Gambit", 'e4 e5 f4'),
+    ('C42', 'Petrov Defense', 'e4 e5 Nf3 Nf6'),
+    ('B07', 'Pirc Defense', 'e4 d6 d4 Nf6'),
+    ('A40', "Queen's Pawn Game", 'd4'),
+]
+
+GAME_COLUMNS = [
+    'event', 'site', 'date', 'round', 'white', 'black', 'result',
+    'white_rating', 'black_rating', 'rating', 'eco', 'opening',
+    'time_control', 'termination', 'moves',
+]
+
+PUZZLE_COLUMNS = [
+    'PuzzleId', 'FEN', 'Moves', 'Rating', 'RatingDeviation', 'Popularity',
+    'NbPlays', 'Themes', 'GameUrl', 'OpeningTags',
+]
+
+PUZZLE_TAGS = [
+    'advantage', 'crushing', 'endgame', 'middlegame', 'opening', 'short', 'long',
+    'veryLong', 'oneMove', 'fork', 'pin', 'skewer', 'discoveredAttack', 'deflection',
+    'attraction', 'sacrifice', 'hangingPiece', 'kingsideAttack', 'master',
+]
+
+EVENTS = ['Rated Blitz game', 'Rated Rapid game', 'Rated Classical game', 'Casual Blitz game', 'Rated Bullet game']
+TIME_CONTROLS = ['60+0', '180+0', '180+2', '300+3', '600+0', '900+10', '1800+0']
+TERMINATIONS = ['Normal', 'Time forfeit', 'Abandoned']
+
+
+def parse_size(text):
+    """Parse a row count such as 10000, 10k or 1M"""
+    suffix = text[-1].lower()
+    if suffix in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[suffix])
+    return int(text)
+
+
+def play_pool_game(rng):
+    """Play one opening line and continue it with random legal moves
+    
+    Returns (eco, opening, board) with the whole game on the board's move stack.
+    """
+    eco, opening, line = rng.choice(OPENING_LINES)
+    board = chess.Board()
+    for san in line.split():
+        board.push_san(san)
+        
+    # Game lengths around 40 moves, like online games
+    plies = max(len(board.move_stack) + 4, min(240, int(rng.gauss(80, 30))))
+    while len(board.move_stack) < plies and not board.is_game_over():
+        moves = list(board.legal_moves)
+        # Prefer captures a little so games resolve like real ones
+        captures = [m for m in moves if board.is_capture(m)]
+        board.push(rng.choice(captures if captures and rng.random() < 0.3 else moves))
+        
+    return eco, opening, board
+
+
+def replay_pool_game(board):
+    """Return the numbered SAN movetext of a game, e.g. "1. e4 c5 2. Nf3", and the FEN before each move"""
+    replay = chess.Board()
+    parts = []
+    fens = []
+    for move in board.move_stack:
+        fens.append(replay.fen())
+        if replay.turn == chess.WHITE:
+            parts.append(f"{replay.fullmove_number}.")
+        parts.append(replay.san_and_push(move))
+    return ' '.join(parts), fens
+
+
+def game_result(board, rng):
+    outcome = board.outcome()
+    if outcome is not None:
+        return outcome.result()
+    return rng.choice(['1-0', '0-1', '1/2-1/2'])
+
+
+def build_pool(size, seed):
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(size):
+        eco, opening, board = play_pool_game(rng)
+        movetext, fens = replay_pool_game(board)
+        ucis = [move.uci() for move in board.move_stack]
+        pool.append((eco, opening, movetext, game_result(board, rng), ucis, fens))
+    return pool
+
+
+def game_rows(rows, pool, rng):
+    """Yield game CSV rows drawn from the pool"""
+    for i in range(rows):
+        eco, opening, movetext, result, _, _ = rng.choice(pool)
+        
+        # Cut some games short so lengths vary beyond the pool
+        if rng.random() < 0.3:
+            tokens = movetext.split()
+            movetext = ' '.join(tokens[:rng.randint(1, len(tokens))])
+            result = rng.choice(['1-0', '0-1', '1/2-1/2'])
+        if rng.random() < INVALID_RATE:
+            movetext += ' Qz9'
+            
+        white_rating = int(rng.gauss(1600, 350))
+        black_rating = white_rating + int(rng.gauss(0, 120))
+        yield [
+            rng.choice(EVENTS), 'https://lichess.org/' + format(i, '08x'),
+            f"20{rng.randint(15, 24)}.{rng.randint(1, 12):02d}.{rng.randint(1, 28):02d}", '-',
+            f"player{rng.randrange(100000)}", f"player{rng.randrange(100000)}", result,
+            white_rating, black_rating, (white_rating + black_rating) // 2, eco, opening,
+            rng.choice(TIME_CONTROLS), rng.choice(TERMINATIONS), movetext,
+        ]
+
+
+def opening_tags(opening):
+    """Lichess OpeningTags for an opening name, e.g. "Sicilian_Defense Sicilian_Defense_Najdorf_Variation" """
+    opening = unicodedata.normalize('NFKD', opening).encode('ascii', 'ignore').decode()
+    family, _, variation = opening.partition(': ')
+    family_tag = family.replace("'", '').replace(' ', '_')
+    if not variation:
+        return family_tag
+    return family_tag + ' ' + family_tag + '_' + variation.replace(' ', '_')
+
+
+def puzzle_rows(rows, pool, rng):
+    """Yield Lichess puzzle CSV rows cut from positions of the pool games"""
+    for i in range(rows):
+        _, opening, _, _, ucis, fens = rng.choice(pool)
+        
+        # The puzzle starts one move before the solution, as in the Lichess export
+        start = rng.randint(min(8, len(ucis) - 2), len(ucis) - 2)
+        length = min(len(ucis) - start, rng.choice([2, 2, 4, 4, 4, 6, 8]))
+        
+        tags = rng.sample(PUZZLE_TAGS, rng.randint(2, 4))
+        if rng.random() < 0.15:
+            tags.append(f"mateIn{rng.randint(1, 5)}")
+        yield [
+            format(i, '05x'), fens[start], ' '.join(ucis[start:start + length]),
+            int(rng.gauss(1500, 500)), rng.randint(60, 110), rng.randint(50, 100), rng.randint(10, 50000),
+            ' '.join(tags), f"https://lichess.org/{i:08x}#{start}", opening_tags(opening),
+        ]
+
+
+def generate(kind, rows, output, seed=0, pool_size=POOL_SIZE):
+    """Write a synthetic CSV of the given kind ('games' or 'puzzles') and row count"""
+    pool = build_pool(pool_size, seed)
+    rng = random.Random(seed + 1)
+    
+    if kind == 'games':
+        columns, row_iter = GAME_COLUMNS, game_rows(rows, pool, rng)
+    else:
+        columns, row_iter = PUZZLE_COLUMNS, puzzle_rows(rows, pool, rng)
+        
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(columns)
+    writer.writerows(row_iter)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic CSV for benchmarks")
+    parser.add_argument('kind', choices=['games', 'puzzles'])
+    parser.add_argument('rows', type=parse_size, help="row count, e.g. 10k, 1M or 10M")
+    parser.add_argument('-o', '--output', default='-', help="output CSV file (default: stdout)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pool', type=int, default=POOL_SIZE, metavar='N',
+                        help=f"distinct games played out and sampled from (default: {POOL_SIZE})")
+    args = parser.parse_args(argv)
+    
+    if args.output == '-':
+        generate(args.kind, args.rows, sys.stdout, args.seed, args.pool)
+    else:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            generate(args.kind, args.rows, f, args.seed, args.pool)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,6 +11,7 @@ PyInstaller.__main__.run([
     '--windowed',
     '--icon=NONE',
     '--add-data=README.md;.',
+    '--add-data=csv2pgn/data;csv2pgn/data',
     '--clean',
     '--noconfirm'
 ]) 
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""CSV to PGN conversion with rating, opening and theme filters"""
+from .engine import (
+    CHUNK_ROWS, OPENINGS, THEMES,
+    ConversionCancelled, ConversionFilters, ConversionStats,
+    apply_filters, convert, iter_converted_blocks, iter_csv_blocks, map_blocks,
+    matches_opening, matches_theme, parse_moves, render_game, replay_moves,
+    row_to_pgn_game, validate_pgn_moves,
+)
+from .checkpoint import default_checkpoint_path, find_checkpoint
+from .eco import OpeningTracker, classify_moves
+from .expressions import FilterExpression, compile_expression
+from .index import default_index_path
+from .metrics import ConversionMetrics, stats_report, write_stats
+from .openings import OpeningMatcher, opening_matcher
+from .preview import CsvPreview, preview_csv
+from .shards import ShardKey, ShardSpec, manifest_path, parse_shard_key
+from .writer import PgnWriter, format_game
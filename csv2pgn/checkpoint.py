@@ -0,0 +1,252 @@
+"""Checkpoints for resuming long conversions
+
+A checkpointed conversion saves its progress in a small JSON sidecar next to
+the PGN file every CHECKPOINT_SECONDS, when it is cancelled and when it
+fails: the input byte offset and row count of the last converted block and
+the size of the output up to that block. Before a checkpoint is saved the
+output is flushed and synced to disk, so the checkpoint never points past
+data that could be lost.
+
+The input is read up to its last line break, so a checkpoint never points
+into a row that is still being written; a last row without one is only
+converted once the input is found unchanged since the start, at the end.
+
+Resuming truncates the output back to the checkpointed size, seeks the input
+to the checkpointed offset (a compressed input is decompressed up to it) and
+continues from there. A compressed output stream is completed at every
+checkpoint, so the resumed run appends a new one. The checkpoint also
+holds the input fingerprint and the filters; a checkpoint written for another
+file or other filters is refused. It is removed when the conversion
+completes.
+
+A conversion dropping duplicates also saves the hashes of the rows converted
+so far next to the checkpoint (OUTPUT.ckpt.keys), so the resumed run still
+recognises the games written before the interruption.
+"""
+import json
+import os
+from contextlib import closing
+from time import perf_counter
+
+from .compression import open_output, sync_output
+from .engine import CHUNK_ROWS, ConversionCancelled, ConversionStats, iter_converted_blocks
+from .index import file_fingerprint
+from .writer import PgnWriter
+
+# Bump when the checkpoint fields or their meaning change
+CHECKPOINT_VERSION = 1
+
+# Seconds between checkpoints of a running conversion
+CHECKPOINT_SECONDS = 30
+
+
+def default_checkpoint_path(pgn_path):
+    return os.fspath(pgn_path) + '.ckpt'
+    
+    
+def keys_path(checkpoint_path):
+    return checkpoint_path + '.keys'
+
+
+def read_checkpoint(checkpoint_path):
+    """Load a checkpoint file, or return None if there is none or it is unreadable"""
+    try:
+        with open(checkpoint_path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+        
+    if not isinstance(state, dict) or state.get('version') != CHECKPOINT_VERSION:
+        return None
+    return state
+
+
+def write_checkpoint(checkpoint_path, state):
+    """Save a checkpoint atomically, so a crash while saving keeps the previous one"""
+    temp_path = checkpoint_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, checkpoint_path)
+
+
+def find_checkpoint(source, pgn_path, filters, checkpoint_path='auto'):
+    """Return the checkpoint an interrupted conversion of source left for pgn_path, or None
+    
+    Only a checkpoint written for the same input file, unchanged since, and
+    the same filters is returned.
+    """
+    if checkpoint_path == 'auto':
+        checkpoint_path = default_checkpoint_path(pgn_path)
+    state = read_checkpoint(checkpoint_path)
+    if state is None or not os.path.exists(source):
+        return None
+        
+    if state.get('fingerprint') != file_fingerprint(source) or state.get('filters') != vars(filters):
+        return None
+    return state
+
+
+def load_seen(filters, state, checkpoint_path, resumed):
+    """Return the HashSet of converted rows for a conversion dropping duplicates, else None
+    
+    A resumed conversion loads the hashes saved with its checkpoint.
+    """
+    if not filters.dedup:
+        return None
+    from .dedup import HashSet
+    if not resumed or not state['rows']:
+        return HashSet()
+        
+    try:
+        seen = HashSet.load(keys_path(checkpoint_path))
+    except (OSError, ValueError):
+        seen = None
+    if seen is None or len(seen) != state.get('hashes'):
+        raise ValueError(f"Duplicate hashes of checkpoint {checkpoint_path} are missing or outdated")
+    return seen
+
+
+def convert_from_state(source, output, checkpoint_path, state, filters, workers=1, chunk_rows=CHUNK_ROWS,
+                       on_progress=None, on_error=None, cancel=None, append=False,
+                       interval=CHECKPOINT_SECONDS, seen=None, on_save=None, complete=None):
+    """Convert the CSV file from the input offset of state, saving state as a checkpoint
+    
+    With append, the output is continued (it must already be truncated to the
+    output offset of state). The state is saved every interval seconds, when
+    the conversion stops early and when it completes; on_save(state), if
+    given, can add fields to it just before it is written.
+    
+    Only rows ending in a line break are converted, so the saved input
+    offset always falls between rows. complete(), if given, is asked after
+    those whether the input is complete; if it is, a last row without a
+    line break is converted too.
+    """
+    stats = ConversionStats()
+    stats.processed = stats.resumed_rows = state['rows']
+    stats.converted = state['converted']
+    stats.skipped = state['skipped']
+    stats.bytes_read = state['input_offset']
+    started = perf_counter()
+    
+    with open_output(output, append=append) as pgn_file:
+        writer = PgnWriter(pgn_file)
+        
+        def save():
+            # The checkpoint may only cover output that is on disk
+            writer.flush()
+            output_offset = sync_output(pgn_file)
+            state.update(
+                input_offset=stats.bytes_read, rows=stats.processed, output_offset=output_offset,
+                converted=stats.converted, skipped=stats.skipped,
+            )
+            if seen is not None:
+                seen.save(keys_path(checkpoint_path))
+                state['hashes'] = len(seen)
+            if on_save is not None:
+                on_save(state)
+            write_checkpoint(checkpoint_path, state)
+            
+        def convert_rows():
+            yield from iter_converted_blocks(source, filters, workers, chunk_rows, start=state['input_offset'],
+                                             seen=seen, whole_rows=True)
+            if complete is not None and complete():
+                yield from iter_converted_blocks(source, filters, workers, chunk_rows, start=stats.bytes_read,
+                                                 seen=seen)
+                
+        results = convert_rows()
+        last_saved = perf_counter()
+        
+        try:
+            with closing(results):
+                for pgn_text, rows, converted, skipped, errors, metrics, bytes_read, total_bytes in results:
+                    start = perf_counter()
+                    writer.write(pgn_text)
+                    metrics.add_time('write', perf_counter() - start)
+                    stats.metrics.merge(metrics, row_offset=stats.processed)
+                    
+                    if on_error:
+                        for error in errors:
+                            on_error(error)
+                            
+                    stats.processed += rows
+                    stats.converted += converted
+                    stats.skipped += skipped
+                    stats.bytes_read = bytes_read
+                    stats.total_bytes = total_bytes
+                    
+                    if perf_counter() - last_saved >= interval:
+                        start = perf_counter()
+                        save()
+                        stats.metrics.add_time('checkpoint', perf_counter() - start)
+                        last_saved = perf_counter()
+                        
+                    if on_progress:
+                        on_progress(stats)
+                        
+                    if cancel is not None and cancel.is_set():
+                        raise ConversionCancelled()
+        except BaseException:
+            # Keep the blocks finished so far for a later resume; if the output
+            # cannot be written any more, the previous checkpoint stays valid
+            try:
+                save()
+            except OSError:
+                pass
+            raise
+            
+        save()
+        
+    stats.metrics.add_time('total', perf_counter() - started)
+    return stats
+
+
+def convert_with_checkpoints(source, output, checkpoint_path, filters, workers=1, chunk_rows=CHUNK_ROWS,
+                             on_progress=None, on_error=None, cancel=None, resume=False,
+                             interval=CHECKPOINT_SECONDS):
+    """Convert a CSV file to a PGN file, saving checkpoints and optionally resuming from one
+    
+    With resume and no checkpoint the conversion starts from the beginning.
+    A checkpoint for another input or other filters raises ValueError.
+    """
+    if not isinstance(source, (str, os.PathLike)) or not isinstance(output, (str, os.PathLike)):
+        raise ValueError("Checkpoints need a CSV file and a PGN file, not streams")
+        
+    if checkpoint_path == 'auto':
+        checkpoint_path = default_checkpoint_path(output)
+        
+    fingerprint = file_fingerprint(source)
+    state = {
+        'version': CHECKPOINT_VERSION,
+        'input': os.path.abspath(source),
+        'fingerprint': fingerprint,
+        'filters': vars(filters),
+        'input_offset': 0,
+        'rows': 0,
+        'output_offset': 0,
+        'converted': 0,
+        'skipped': 0,
+    }
+    
+    mode = 'w'
+    if resume and os.path.exists(checkpoint_path):
+        saved = find_checkpoint(source, output, filters, checkpoint_path)
+        if saved is None:
+            raise ValueError(f"Checkpoint {checkpoint_path} is for another input file or other filters")
+        if not os.path.exists(output) or os.path.getsize(output) < saved['output_offset']:
+            raise ValueError(f"Output file {output} is shorter than its checkpoint")
+            
+        # Drop whatever was written after the checkpoint
+        os.truncate(output, saved['output_offset'])
+        state, mode = saved, 'a'
+        
+    seen = load_seen(filters, state, checkpoint_path, resumed=(mode == 'a'))
+    stats = convert_from_state(source, output, checkpoint_path, state, filters, workers, chunk_rows,
+                               on_progress, on_error, cancel, append=(mode == 'a'), interval=interval, seen=seen,
+                               complete=lambda: file_fingerprint(source) == fingerprint)
+    
+    for path in (checkpoint_path, keys_path(checkpoint_path)):
+        if os.path.exists(path):
+            os.remove(path)
+    return stats
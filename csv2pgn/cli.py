@@ -0,0 +1,204 @@
+"""Command line front end for the conversion engine
+
+Reads CSV from a file or stdin and writes PGN to a file or stdout, so it can
+run from cron jobs and on servers without a display. Example:
+
+    python -m csv2pgn games.csv -o games.pgn --min-rating 2200 --theme "Mate in 2"
+    zcat games.csv.gz | python -m csv2pgn --opening "Sicilian Defense" > sicilian.pgn
+    python -m csv2pgn puzzles.csv.zst -o puzzles.pgn.gz
+    python -m csv2pgn games.csv -o shards/games.pgn --shard-by rating:200 --shard-games 100000
+    python -m csv2pgn games.csv -o games.pgn --stats stats.json --profile convert.prof
+    python -m csv2pgn huge.csv -o huge.pgn --checkpoint --resume
+    python -m csv2pgn merged.csv -o merged.pgn --dedup
+    python -m csv2pgn daily_puzzles.csv -o puzzles.pgn --incremental
+    python -m csv2pgn huge.csv --preview --min-rating 2000 --opening French
+    python -m csv2pgn puzzles.csv -o mates.pgn --where "rating between 1800 and 2200 and themes has mateIn2"
+    python -m csv2pgn puzzles.parquet -o puzzles.pgn --min-rating 2000 --theme Fork
+"""
+import argparse
+import io
+import sys
+from contextlib import nullcontext
+
+from .engine import CHUNK_ROWS, ConversionFilters, convert
+from .lichess import THEME_TAGS
+from .metrics import profiling, write_stats
+from .preview import preview_csv
+from .shards import SHARD_KEYS, ShardSpec, manifest_path, parse_shard_key
+from .themes import SUPPORTED_THEMES
+
+
+# Size suffixes accepted by --shard-size
+SIZE_UNITS = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_bytes(text):
+    """Parse a byte count such as 500000, 64K, 512M or 2G"""
+    try:
+        unit = SIZE_UNITS.get(text[-1:].lower())
+        return int(float(text[:-1]) * unit) if unit else int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {text}")
+
+
+def shard_key(text):
+    try:
+        return parse_shard_key(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='csv2pgn',
+        description="Convert chess games from CSV to PGN with rating, opening and theme filters."
+    )
+    parser.add_argument('input', nargs='?', default='-',
+                        help="input CSV file, or - for stdin (default); gzip, bzip2, xz and "
+                             "zstd input is decompressed on the fly; Parquet and Arrow (Feather) "
+                             "files are read column by column")
+    parser.add_argument('-o', '--output', default='-',
+                        help="output PGN file, or - for stdout (default); a .gz, .bz2, .xz "
+                             "or .zst file is compressed")
+    parser.add_argument('--min-rating', type=int, default=0,
+                        help="minimum rating (default: %(default)s)")
+    parser.add_argument('--max-rating', type=int, default=3000,
+                        help="maximum rating (default: %(default)s)")
+    parser.add_argument('--opening', action='append', default=[], metavar='NAME',
+                        help="keep games whose opening contains NAME; may be repeated")
+    parser.add_argument('--theme', action='append', default=[], metavar='NAME',
+                        help="keep games matching theme NAME; may be repeated")
+    parser.add_argument('--where', metavar='EXPR',
+                        help="keep games matching a filter expression, e.g. \"rating >= 2000 and "
+                             "(opening ~ French or themes has fork)\"; fields are rating, opening, "
+                             "themes and the CSV columns")
+    parser.add_argument('--dedup', action='store_true',
+                        help="skip repeated games: same start position and moves")
+    parser.add_argument('--dedup-by', metavar='COLUMN',
+                        help="skip games repeating a value of COLUMN (e.g. PuzzleId); implies --dedup")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="number of worker processes (default: %(default)s)")
+    parser.add_argument('--index', action='store_true',
+                        help="cache parsed games in an index file (INPUT.pgnidx) so later runs "
+                             "with other filters skip the CSV")
+    parser.add_argument('--index-path', metavar='PATH',
+                        help="keep the index in PATH instead; implies --index")
+    parser.add_argument('--checkpoint', action='store_true',
+                        help="save progress to a checkpoint file (OUTPUT.ckpt) so an "
+                             "interrupted conversion can be resumed")
+    parser.add_argument('--checkpoint-path', metavar='PATH',
+                        help="keep the checkpoint in PATH instead; implies --checkpoint")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue from the last checkpoint, if there is one; implies --checkpoint")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only convert the rows appended to the CSV since the last run and append "
+                             "them to the PGN file; the state is kept in OUTPUT.state")
+    parser.add_argument('--incremental-path', metavar='PATH',
+                        help="keep the incremental state in PATH instead; implies --incremental")
+    parser.add_argument('--shard-games', type=int, metavar='N',
+                        help="split the output into files of at most N games")
+    parser.add_argument('--shard-size', type=parse_bytes, metavar='SIZE',
+                        help="split the output into files of at most SIZE bytes of PGN, e.g. 512M")
+    parser.add_argument('--shard-by', type=shard_key, metavar='KEY',
+                        help=f"write one file per key: {', '.join(SHARD_KEYS)} (rating:WIDTH sets "
+                             "the bucket width); a manifest lists the files")
+    parser.add_argument('--preview', action='store_true',
+                        help="print the columns, first rows, row count and an estimate of the "
+                             "rows matching the filters from a sample, without converting")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help="CSV rows per block (default: %(default)s)")
+    parser.add_argument('--stats', metavar='PATH',
+                        help="write counters, stage timers, skip reasons and the replay time "
+                             "histogram to a JSON file")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="run under cProfile on one process and save the profile to PATH")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="do not report progress on stderr")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    
+    for theme in args.theme:
+        if theme.lower() not in SUPPORTED_THEMES and theme.lower() not in THEME_TAGS:
+            sys.stderr.write(f"Warning: theme '{theme}' is not detected from moves or Lichess puzzle tags\n")
+    
+    dedup = args.dedup_by or ('moves' if args.dedup else None)
+    filters = ConversionFilters(args.min_rating, args.max_rating, args.opening, args.theme, dedup, args.where)
+    source = sys.stdin.buffer if args.input == '-' else args.input
+    
+    if args.preview:
+        if args.input == '-':
+            sys.stderr.write("The preview needs an input file\n")
+            return 2
+        try:
+            print(preview_csv(args.input, filters).summary())
+        except (OSError, ValueError) as e:
+            sys.stderr.write(f"Preview failed: {e}\n")
+            return 1
+        return 0
+        
+    if args.output == '-':
+        output = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='', write_through=True)
+    else:
+        output = args.output
+    
+    def on_progress(stats):
+        if stats.total_bytes or stats.total_rows:
+            sys.stderr.write(f"\rProcessed {stats.processed} games ({stats.percent:.1f}%)")
+        else:
+            sys.stderr.write(f"\rProcessed {stats.processed} games")
+        sys.stderr.flush()
+    
+    def on_error(message):
+        sys.stderr.write(f"\n{message}\n")
+    
+    # Worker processes would escape the profiler
+    workers = max(1, args.workers)
+    if args.profile and workers > 1:
+        sys.stderr.write("Warning: profiling runs on a single process\n")
+        workers = 1
+        
+    index_path = args.index_path or ('auto' if args.index else None)
+    incremental = args.incremental_path or ('auto' if args.incremental else None)
+    checkpoint_path = args.checkpoint_path
+    if checkpoint_path is None and (args.checkpoint or args.resume):
+        checkpoint_path = 'auto'
+        
+    shards = None
+    if args.shard_games or args.shard_size or args.shard_by:
+        if args.output == '-':
+            sys.stderr.write("Sharded output needs an output file (-o)\n")
+            return 2
+        shards = ShardSpec(args.shard_games, args.shard_size, args.shard_by)
+        
+    try:
+        with profiling(args.profile) if args.profile else nullcontext():
+            stats = convert(source, output, filters, workers, args.chunk_rows,
+                        None if args.quiet else on_progress, on_error, index_path=index_path,
+                        checkpoint_path=checkpoint_path, resume=args.resume, shards=shards,
+                        incremental=incremental)
+        if args.stats:
+            write_stats(stats, args.stats)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"\nConversion failed: {e}\n")
+        return 1
+    
+    if not args.quiet:
+        if stats.from_index:
+            sys.stderr.write("\nServed from index")
+        if incremental:
+            if stats.rebuild_reason:
+                sys.stderr.write(f"\nConverted from the start: {stats.rebuild_reason}")
+            sys.stderr.write(f"\nNew rows: {stats.processed - stats.resumed_rows}")
+        elif stats.resumed_rows:
+            sys.stderr.write(f"\nResumed after {stats.resumed_rows} rows")
+        if stats.shards:
+            sys.stderr.write(f"\nWrote {len(stats.shards)} shards, listed in {manifest_path(args.output)}")
+        sys.stderr.write(f"\nConverted: {stats.converted} games, skipped: {stats.skipped} games\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
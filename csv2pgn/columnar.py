@@ -0,0 +1,255 @@
+"""Parquet and Arrow IPC (Feather) input
+
+Corpora kept as Parquet or Arrow files are converted without exporting them
+to CSV first. The file is read as record batches of up to chunk_rows rows,
+which take the place of the raw CSV blocks in the conversion loop, with
+
+    column projection   only the columns the profile builds the headers and
+                        moves from, the filter columns, the dedup column and
+                        the columns named in the filter expression are read;
+    row-group pruning   a Parquet row group whose rating statistics lie
+                        outside the rating range is skipped unread. Otherwise
+                        the filter columns of the group are read first, and
+                        the group is skipped without reading its moves when
+                        no row passes the chunk filters.
+
+The rows of skipped groups are counted under their skip reason, so the
+counts match those of the same data converted from CSV. Pruning is off when
+duplicates are dropped, as the keys of filtered rows count as seen. Arrow
+files carry no statistics and are only projected.
+
+pyarrow is an optional dependency: pip install pyarrow. Like pandas, it is
+only imported once a columnar file is read.
+"""
+import os
+from collections import Counter
+
+from .engine import CHUNK_ROWS, detect_profile, prefilter_chunk
+from .expressions import FIELDS, compile_expression, resolve_column
+
+# File extensions and magic bytes of the columnar formats
+COLUMNAR_EXTENSIONS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+COLUMNAR_MAGIC = [
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'arrow'),
+]
+
+# Parquet types whose statistics cover every value; float statistics leave out NaN
+INTEGER_TYPES = frozenset(['INT32', 'INT64'])
+
+
+def columnar_format(source):
+    """Return 'parquet' or 'arrow' for a columnar input file, or None for CSV input and streams"""
+    if not isinstance(source, (str, os.PathLike)):
+        return None
+    columnar = COLUMNAR_EXTENSIONS.get(os.path.splitext(os.fspath(source))[1].lower())
+    if columnar is None and os.path.isfile(source):
+        with open(source, 'rb') as f:
+            head = f.read(8)
+        columnar = next((name for magic, name in COLUMNAR_MAGIC if head.startswith(magic)), None)
+    return columnar
+
+
+def _require_pyarrow():
+    """Import pyarrow with its Parquet, IPC and compute modules; ValueError if it is not installed"""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet and Arrow files need the pyarrow package: pip install pyarrow")
+    return pyarrow
+
+
+class ColumnarBlock:
+    """A record batch standing in for a raw CSV block
+    
+    pruned counts, by skip reason, the rows of the row groups skipped since
+    the previous block; they are numbered before the rows of the batch.
+    """
+    
+    def __init__(self, batch, pruned=None):
+        self.batch = batch
+        self.pruned = Counter() if pruned is None else pruned
+        
+    def to_frame(self):
+        """Convert the batch to a DataFrame of strings like read_csv_block, NaN for nulls"""
+        import pandas as pd
+        
+        frame = text_batch(self.batch).to_pandas()
+        offset = sum(self.pruned.values())
+        frame.index = pd.RangeIndex(offset, offset + len(frame))
+        return frame
+
+
+def text_batch(batch):
+    """Cast the columns of a record batch or table to strings, leaving those without a text form as they are"""
+    pyarrow = _require_pyarrow()
+    arrays = []
+    for array in batch.columns:
+        try:
+            arrays.append(pyarrow.compute.cast(array, pyarrow.string()))
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowNotImplementedError):
+            arrays.append(array)
+    return type(batch).from_arrays(arrays, names=batch.schema.names)
+
+
+def expression_columns(names, filters):
+    """Input columns named in the filter expression"""
+    if filters is None or not filters.expression:
+        return set()
+    fields = compile_expression(filters.expression).fields - FIELDS
+    return {resolve_column(tuple(names), field) for field in fields}
+
+
+def projected_columns(names, profile, filters):
+    """Columns read from a columnar file, in file order"""
+    wanted = set(profile.input_columns) | expression_columns(names, filters)
+    if filters is not None and filters.dedup:
+        wanted.update(profile.dedup_columns if filters.dedup == 'moves' else [filters.dedup])
+    return [name for name in names if name in wanted]
+
+
+def rating_out_of_range(row_group, leaf_names, profile, filters):
+    """Whether the statistics of a row group put every rating outside the rating range"""
+    column = next((col for col in profile.rating_columns if col in leaf_names), None)
+    if column is None:
+        return False
+    chunk = row_group.column(leaf_names.index(column))
+    statistics = chunk.statistics
+    
+    # Rows without a rating pass the filter, so the group needs a rating on every row
+    if (chunk.physical_type not in INTEGER_TYPES or statistics is None or not statistics.has_min_max
+            or not statistics.has_null_count or statistics.null_count):
+        return False
+    return statistics.max < filters.min_rating or statistics.min > filters.max_rating
+
+
+def iter_parquet_blocks(path, chunk_rows, filters, prune):
+    pyarrow = _require_pyarrow()
+    parquet_file = pyarrow.parquet.ParquetFile(path, memory_map=True)
+    metadata = parquet_file.metadata
+    schema = parquet_file.schema_arrow
+    leaf_names = metadata.schema.names
+    profile = detect_profile(tuple(schema.names))
+    columns = projected_columns(schema.names, profile, filters)
+    
+    wanted = set(profile.filter_columns) | expression_columns(schema.names, filters)
+    filter_columns = [col for col in columns if col in wanted]
+    total_bytes = os.path.getsize(path)
+    total_rows = max(1, metadata.num_rows)
+    rows_read = 0
+    pruned = Counter()
+    
+    for i in range(metadata.num_row_groups):
+        group_rows = metadata.row_group(i).num_rows
+        rows_read += group_rows
+        bytes_read = total_bytes * rows_read // total_rows
+        
+        if prune and rating_out_of_range(metadata.row_group(i), leaf_names, profile, filters):
+            pruned['rating'] += group_rows
+            continue
+            
+        if prune and filter_columns:
+            # Read the filter columns and only fetch the others when a row passes;
+            # they are filtered as text, like the rows of the converted batches
+            table = parquet_file.read_row_group(i, columns=filter_columns)
+            skips = Counter()
+            if not len(prefilter_chunk(text_batch(table).to_pandas(), profile, filters, skips)[0]):
+                pruned.update(skips)
+                continue
+            rest = [col for col in columns if col not in filter_columns]
+            if rest:
+                other = parquet_file.read_row_group(i, columns=rest)
+                for name in rest:
+                    table = table.append_column(name, other.column(name))
+            table = table.select(columns)
+        else:
+            table = parquet_file.read_row_group(i, columns=columns)
+            
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            yield ColumnarBlock(batch, pruned), bytes_read, total_bytes
+            pruned = Counter()
+            
+    # Rows pruned at the end still need counting
+    if pruned:
+        empty = pyarrow.RecordBatch.from_pylist([], schema=pyarrow.schema([schema.field(col) for col in columns]))
+        yield ColumnarBlock(empty, pruned), total_bytes, total_bytes
+
+
+def iter_arrow_blocks(path, chunk_rows, filters):
+    pyarrow = _require_pyarrow()
+    total_bytes = os.path.getsize(path)
+    with pyarrow.memory_map(os.fspath(path)) as source:
+        reader = pyarrow.ipc.open_file(source)
+        names = reader.schema.names
+        columns = projected_columns(names, detect_profile(tuple(names)), filters)
+        total_rows = max(1, sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches)))
+        rows_read = 0
+        
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i).select(columns)
+            for start in range(0, batch.num_rows, chunk_rows):
+                block = batch.slice(start, chunk_rows)
+                rows_read += block.num_rows
+                yield ColumnarBlock(block), total_bytes * rows_read // total_rows, total_bytes
+
+
+def iter_columnar_blocks(path, chunk_rows=CHUNK_ROWS, filters=None, prune=False):
+    """Stream a Parquet or Arrow file as (ColumnarBlock, bytes_read, total_bytes) tuples
+    
+    bytes_read is the share of the file size of the rows read so far. With
+    prune, row groups without a row passing the filters are skipped.
+    """
+    _require_pyarrow()
+    if columnar_format(path) == 'parquet':
+        yield from iter_parquet_blocks(path, chunk_rows, filters, prune and filters is not None and not filters.dedup)
+    else:
+        yield from iter_arrow_blocks(path, chunk_rows, filters)
+
+
+def columnar_columns(path):
+    """Column names of a Parquet or Arrow file, read from its schema"""
+    pyarrow = _require_pyarrow()
+    if columnar_format(path) == 'parquet':
+        return pyarrow.parquet.read_schema(path, memory_map=True).names
+    with pyarrow.memory_map(os.fspath(path)) as source:
+        return pyarrow.ipc.open_file(source).schema.names
+
+
+def frame_block(frame):
+    """Wrap a DataFrame as a ColumnarBlock"""
+    pyarrow = _require_pyarrow()
+    return ColumnarBlock(pyarrow.RecordBatch.from_pandas(frame, preserve_index=False))
+
+
+def read_columnar_sample(path, rows):
+    """Return (columns, total rows, a DataFrame of about rows rows spread over the file)"""
+    pyarrow = _require_pyarrow()
+    import pandas as pd
+    
+    if columnar_format(path) == 'parquet':
+        parquet_file = pyarrow.parquet.ParquetFile(path, memory_map=True)
+        count = parquet_file.metadata.num_row_groups
+        read = parquet_file.read_row_group
+        names, total = parquet_file.schema_arrow.names, parquet_file.metadata.num_rows
+    else:
+        reader = pyarrow.ipc.open_file(pyarrow.memory_map(os.fspath(path)))
+        count = reader.num_record_batches
+        read = reader.get_batch
+        names = reader.schema.names
+        total = sum(reader.get_batch(i).num_rows for i in range(count))
+        
+    # The first rows of evenly spaced groups
+    groups = sorted({i * count // min(count, 64) for i in range(min(count, 64))})
+    per_group = max(1, rows // max(1, len(groups)))
+    frames = [read(i).slice(0, per_group).to_pandas() for i in groups]
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=names)
+    return list(names), total, frame
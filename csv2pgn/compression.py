@@ -0,0 +1,299 @@
+"""Compressed CSV input and PGN output
+
+Inputs compressed with gzip, bzip2, xz or zstd are decompressed while they
+are read; the codec comes from the file extension or, failing that, from the
+magic bytes at the start of the file or stream. Decompression runs on a
+reader thread that stays a few chunks ahead of the parser, so it overlaps
+with the move replay (the codecs release the GIL while they work).
+
+A PGN output path ending in one of the extensions is compressed the same
+way, on a writer thread. Each sync() ends the compressed stream so the file
+up to that point is complete; appending starts a new stream, which every
+codec reads back as one file. zstd needs the optional zstandard package.
+"""
+import bz2
+import io
+import lzma
+import os
+import queue
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# File extensions and magic bytes of the supported codecs
+CODEC_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+    '.zstd': 'zstd',
+}
+CODEC_MAGIC = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+]
+
+# Decompressed bytes per chunk handed from the reader thread, and chunks kept in flight
+READ_CHUNK = 1024 * 1024
+QUEUE_CHUNKS = 8
+
+
+def codec_from_path(path):
+    """Return the codec named by a file extension, or None"""
+    return CODEC_EXTENSIONS.get(os.path.splitext(os.fspath(path))[1].lower())
+
+
+def codec_from_magic(head):
+    """Return the codec whose magic bytes start head, or None"""
+    for magic, codec in CODEC_MAGIC:
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ValueError("zstd files need the zstandard package: pip install zstandard")
+
+
+def _decompressing_stream(codec, fileobj):
+    """Return a binary file object decompressing fileobj, across concatenated streams"""
+    if codec == 'gzip':
+        import gzip
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if codec == 'bz2':
+        return bz2.BZ2File(fileobj, 'rb')
+    if codec == 'xz':
+        return lzma.LZMAFile(fileobj, 'rb')
+    _require_zstandard()
+    return zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True)
+
+
+def _compressor(codec):
+    if codec == 'gzip':
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if codec == 'bz2':
+        return bz2.BZ2Compressor()
+    if codec == 'xz':
+        return lzma.LZMACompressor(lzma.FORMAT_XZ)
+    _require_zstandard()
+    return zstandard.ZstdCompressor().compressobj()
+
+
+class _ThreadedDecompressor(io.RawIOBase):
+    """Raw stream of the chunks a reader thread decompresses ahead of the consumer"""
+    
+    def __init__(self, codec, fileobj, owns_file):
+        super().__init__()
+        self.fileobj = fileobj
+        self.owns_file = owns_file
+        self.chunks = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.stopping = threading.Event()
+        self.pending = memoryview(b'')
+        self.finished = False
+        self.error = None
+        self.produced = 0
+        self.thread = threading.Thread(target=self._run, args=(codec,), daemon=True)
+        self.thread.start()
+        
+    def _run(self, codec):
+        try:
+            stream = _decompressing_stream(codec, self.fileobj)
+            while not self.stopping.is_set():
+                data = stream.read(READ_CHUNK)
+                if not data:
+                    break
+                self.produced += len(data)
+                self._put(data)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self._put(None)
+            
+    def _put(self, item):
+        # Give up when the consumer has closed the stream
+        while not self.stopping.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+                
+    def readable(self):
+        return True
+        
+    def readinto(self, buffer):
+        while not self.pending:
+            if self.finished:
+                return 0
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.finished = True
+                if self.error is not None:
+                    raise self.error
+                return 0
+            self.pending = memoryview(chunk)
+            
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+        
+    def compressed_position(self):
+        try:
+            return self.fileobj.tell()
+        except (OSError, ValueError):
+            return 0
+            
+    def close(self):
+        if not self.closed:
+            self.stopping.set()
+            self.thread.join()
+            if self.owns_file:
+                self.fileobj.close()
+        super().close()
+
+
+class DecompressingReader(io.BufferedReader):
+    """Buffered reader over a compressed file, decompressed on a background thread"""
+    
+    def __init__(self, codec, fileobj, owns_file=True, compressed_size=0):
+        super().__init__(_ThreadedDecompressor(codec, fileobj, owns_file), READ_CHUNK)
+        self.codec = codec
+        self.compressed_size = compressed_size
+        
+    def seekable(self):
+        return False
+        
+    def estimated_size(self):
+        """Estimate the decompressed size from the compression ratio so far; 0 if unknown"""
+        consumed = self.raw.compressed_position()
+        if not self.compressed_size or not consumed:
+            return 0
+        return max(self.raw.produced, self.raw.produced * self.compressed_size // consumed)
+
+
+def open_input(source):
+    """Open a CSV path or wrap a binary stream, decompressing it if it is compressed
+    
+    Streams are sniffed with peek(), so it works on sys.stdin.buffer; a
+    wrapped stream is not closed with the reader.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        csv_file = open(source, 'rb')
+        try:
+            codec = codec_from_path(source) or codec_from_magic(csv_file.peek(8))
+            if codec is None:
+                return csv_file
+            if codec == 'zstd':
+                _require_zstandard()
+            return DecompressingReader(codec, csv_file, owns_file=True,
+                                       compressed_size=os.fstat(csv_file.fileno()).st_size)
+        except BaseException:
+            csv_file.close()
+            raise
+            
+    peek = getattr(source, 'peek', None)
+    codec = codec_from_magic(peek(8)) if peek is not None else None
+    if codec is None:
+        return source
+    if codec == 'zstd':
+        _require_zstandard()
+    return DecompressingReader(codec, source, owns_file=False)
+
+
+class CompressingWriter:
+    """Text file that compresses what is written into a file on a background thread"""
+    
+    def __init__(self, path, codec, append=False):
+        if codec == 'zstd':
+            _require_zstandard()
+        self.file = open(path, 'ab' if append else 'wb')
+        self.codec = codec
+        self.requests = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        
+    def _run(self):
+        compressor = None
+        while True:
+            item = self.requests.get()
+            try:
+                if self.error is not None:
+                    pass
+                elif isinstance(item, bytes):
+                    if compressor is None:
+                        compressor = _compressor(self.codec)
+                    self.file.write(compressor.compress(item))
+                else:
+                    # End the stream so the file is complete up to here
+                    if compressor is not None:
+                        self.file.write(compressor.flush())
+                        compressor = None
+                    self.file.flush()
+            except BaseException as e:
+                self.error = e
+            if item is None:
+                return
+            if not isinstance(item, bytes):
+                item.put(self.error)
+                
+    def _check(self):
+        if self.error is not None:
+            raise self.error
+            
+    def write(self, text):
+        self._check()
+        self.requests.put(text.encode('utf-8'))
+        return len(text)
+        
+    def flush(self):
+        """Hand the written text to the compressor; the stream is only completed by sync()"""
+        self._check()
+        
+    def sync(self):
+        """Complete the compressed stream, write it to disk and return the file size"""
+        done = queue.Queue()
+        self.requests.put(done)
+        error = done.get()
+        if error is not None:
+            raise error
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+        
+    def close(self):
+        if self.thread.is_alive():
+            self.requests.put(None)
+            self.thread.join()
+        self.file.close()
+        self._check()
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_output(path, append=False):
+    """Open a PGN output file for text, compressed if its extension names a codec"""
+    codec = codec_from_path(path)
+    if codec is None:
+        return open(path, 'a' if append else 'w', encoding='utf-8')
+    return CompressingWriter(path, codec, append)
+
+
+def sync_output(output):
+    """Flush an output opened by open_output to disk and return its size in bytes"""
+    if isinstance(output, CompressingWriter):
+        return output.sync()
+    output.flush()
+    os.fsync(output.fileno())
+    return output.tell()
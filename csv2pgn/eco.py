@@ -0,0 +1,321 @@
+"""ECO classification of games from their moves
+
+The opening table in data/eco.tsv lists an ECO code, an opening name and the
+SAN moves of each line. It is compiled into data/eco.bin, a compact binary
+book holding
+
+    the Zobrist hash and occupancy bitboard of every named position, so a
+    transposition into a known line is still recognised, and
+    a trie of the table lines keyed by move, whose nodes carry the name of
+    their position.
+
+OpeningTracker follows a game during the replay the conversion already does:
+while the game stays on a table line each ply is one dict lookup in the trie,
+and once it leaves the trie a Zobrist hash is only computed when the piece
+placement occurs in the table at all. Positions past the longest table line
+are not looked at.
+
+Selected opening names map to ranges of ECO codes (e.g. B20-B99 for the
+Sicilian Defense), compared as numbers A00=0 ... E99=499. Rebuild the binary
+book after editing the table with
+
+    python -m csv2pgn.eco
+"""
+import hashlib
+import os
+import re
+import struct
+import sys
+from array import array
+from functools import lru_cache
+
+import chess
+import chess.polyglot
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+TABLE_PATH = os.path.join(DATA_DIR, 'eco.tsv')
+BOOK_PATH = os.path.join(DATA_DIR, 'eco.bin')
+
+# Magic, format version, table checksum, entry/position/edge counts, max ply
+BOOK_HEADER = struct.Struct('<4sHQIIIH')
+BOOK_MAGIC = b'ECOB'
+BOOK_VERSION = 1
+
+# An ECO code at the start of a string, e.g. "B20" or "b90 sicilian defense"
+ECO_RE = re.compile(r'([a-e])(\d\d)(?![0-9])', re.IGNORECASE)
+ECO_RANGE_RE = re.compile(r'([a-e]\d\d)\s*[-–]\s*([a-e]\d\d)', re.IGNORECASE)
+
+# Opening names (lowercased) -> ECO code ranges of the opening and its variations
+ECO_RANGES = {
+    'sicilian defense': [('B20', 'B99')],
+    'french defense': [('C00', 'C19')],
+    'caro-kann defense': [('B10', 'B19')],
+    "queen's gambit": [('D06', 'D69')],
+    "king's indian defense": [('E60', 'E99')],
+    'english opening': [('A10', 'A39')],
+    'ruy lopez': [('C60', 'C99')],
+    'italian game': [('C50', 'C59')],
+    'scandinavian defense': [('B01', 'B01')],
+    'alekhine defense': [('B02', 'B05')],
+    'nimzo-indian defense': [('E20', 'E59')],
+    "queen's indian defense": [('E12', 'E19')],
+    'grünfeld defense': [('D70', 'D99')],
+    'catalan opening': [('E00', 'E09')],
+    "bird's opening": [('A02', 'A03')],
+    'réti opening': [('A04', 'A09')],
+    'vienna game': [('C25', 'C29')],
+    "king's gambit": [('C30', 'C39')],
+    'petrov defense': [('C42', 'C43')],
+    'pirc defense': [('B07', 'B09')],
+}
+
+
+def eco_number(text):
+    """Return the ECO code at the start of text as a number from 0 (A00) to 499 (E99), or None"""
+    match = ECO_RE.match(text.strip()) if isinstance(text, str) else None
+    if match is None:
+        return None
+    return (ord(match.group(1).upper()) - ord('A')) * 100 + int(match.group(2))
+
+
+@lru_cache(maxsize=None)
+def name_ranges(name):
+    """Return the ECO number ranges of a selected opening name
+    
+    Known opening names map through ECO_RANGES; a code ("B20") or a code
+    range ("B20-B99") selects itself. Other names have no ranges.
+    """
+    name = name.strip().lower()
+    if name in ECO_RANGES:
+        return tuple((eco_number(low), eco_number(high)) for low, high in ECO_RANGES[name])
+        
+    match = ECO_RANGE_RE.fullmatch(name)
+    if match:
+        return ((eco_number(match.group(1)), eco_number(match.group(2))),)
+    if ECO_RE.fullmatch(name):
+        number = eco_number(name)
+        return ((number, number),)
+    return ()
+
+
+def move_code(move):
+    """Pack a move into 16 bits: from square, to square and promotion piece"""
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+class EcoBook:
+    """Opening table indexed by position hash and by move trie"""
+    
+    def __init__(self, entries, positions, occupancies, children, node_entries, max_ply):
+        self.entries = entries
+        self.positions = positions
+        self.occupancies = occupancies
+        self.children = children
+        self.node_entries = node_entries
+        self.max_ply = max_ply
+        
+    def lookup(self, board):
+        """Return the (eco, name) entry of a board position, or None"""
+        if board.occupied not in self.occupancies:
+            return None
+        entry = self.positions.get(chess.polyglot.zobrist_hash(board))
+        return None if entry is None else self.entries[entry]
+
+
+class OpeningTracker:
+    """Follows the moves of a game and keeps the deepest table entry it reached"""
+    
+    def __init__(self, book=None):
+        self.book = book if book is not None else load_book()
+        self.node = 0
+        self.ply = 0
+        self.entry = None
+        
+    def update(self, board, move):
+        """Look at the position after move was pushed on board"""
+        book = self.book
+        if self.ply >= book.max_ply:
+            return
+        self.ply += 1
+        
+        # Still on a table line: one trie step
+        if self.node is not None:
+            self.node = book.children[self.node].get(move_code(move))
+            if self.node is not None:
+                entry = book.node_entries[self.node]
+                if entry >= 0:
+                    self.entry = book.entries[entry]
+                return
+                
+        # Off the trie: only a transposition can lead back into the table
+        entry = book.lookup(board)
+        if entry is not None:
+            self.entry = entry
+            
+    @property
+    def label(self):
+        """Opening label such as "B90 Sicilian Defense: Najdorf Variation", or None"""
+        return None if self.entry is None else f"{self.entry[0]} {self.entry[1]}"
+
+
+def read_table(path=TABLE_PATH):
+    """Read the opening table as a list of (eco, name, SAN moves) tuples"""
+    lines = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#') or line.startswith('eco\t'):
+                continue
+            eco, name, moves = line.split('\t')
+            lines.append((eco, name, moves.split()))
+    return lines
+
+
+def table_checksum(path=TABLE_PATH):
+    with open(path, 'rb') as f:
+        return int.from_bytes(hashlib.blake2b(f.read(), digest_size=8).digest(), 'little')
+
+
+def compile_table(lines):
+    """Compile table lines into the arrays stored in the binary book
+    
+    Returns (entries, hashes, occupancies, position entries, edge parents,
+    edge moves, node entries, max ply). Node 0 is the start position and
+    node i + 1 the child reached through edge i.
+    """
+    entries = []
+    positions = {}
+    occupancies = {}
+    trie = [{}]
+    node_boards = [None]
+    edge_parents = array('I')
+    edge_moves = array('H')
+    
+    for eco, name, sans in lines:
+        entry = len(entries)
+        entries.append((eco, name))
+        board = chess.Board()
+        node = 0
+        for san in sans:
+            code = move_code(board.push_san(san))
+            if code not in trie[node]:
+                # Edge i leads to node i + 1
+                trie[node][code] = len(trie)
+                trie.append({})
+                node_boards.append(board.copy(stack=False))
+                edge_parents.append(node)
+                edge_moves.append(code)
+            node = trie[node][code]
+            
+        # The first line reaching a position names it
+        key = chess.polyglot.zobrist_hash(board)
+        if key not in positions:
+            positions[key] = entry
+            occupancies[key] = board.occupied
+            
+    # Trie nodes carry the name of their position, also when reached by a transposition
+    node_entries = array('h', [-1])
+    for board in node_boards[1:]:
+        node_entries.append(positions.get(chess.polyglot.zobrist_hash(board), -1))
+        
+    keys = sorted(positions)
+    return (
+        entries,
+        array('Q', keys),
+        array('Q', (occupancies[key] for key in keys)),
+        array('H', (positions[key] for key in keys)),
+        edge_parents,
+        edge_moves,
+        node_entries,
+        max(len(sans) for _, _, sans in lines),
+    )
+
+
+def write_book(path=BOOK_PATH, table_path=TABLE_PATH):
+    """Compile the opening table into the binary book file"""
+    entries, keys, occupancies, key_entries, edge_parents, edge_moves, node_entries, max_ply = \
+        compile_table(read_table(table_path))
+    names = '\n'.join(f"{eco}\t{name}" for eco, name in entries).encode('utf-8')
+    
+    with open(path, 'wb') as f:
+        f.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, table_checksum(table_path),
+                                 len(entries), len(keys), len(edge_moves), max_ply))
+        f.write(struct.pack('<I', len(names)))
+        f.write(names)
+        for values in (keys, occupancies, key_entries, edge_parents, edge_moves, node_entries):
+            if sys.byteorder == 'big':
+                values = array(values.typecode, values)
+                values.byteswap()
+            f.write(values.tobytes())
+
+
+def read_book(path=BOOK_PATH):
+    """Load a binary book file as (table checksum, EcoBook); None if it is missing or not a book"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < BOOK_HEADER.size:
+        return None
+        
+    magic, version, checksum, n_entries, n_keys, n_edges, max_ply = BOOK_HEADER.unpack_from(data)
+    if magic != BOOK_MAGIC or version != BOOK_VERSION:
+        return None
+    offset = BOOK_HEADER.size
+    
+    (names_size,) = struct.unpack_from('<I', data, offset)
+    offset += 4
+    entries = [tuple(line.split('\t')) for line in data[offset:offset + names_size].decode('utf-8').split('\n')]
+    offset += names_size
+    
+    arrays = []
+    for typecode, count in (('Q', n_keys), ('Q', n_keys), ('H', n_keys), ('I', n_edges), ('H', n_edges), ('h', n_edges + 1)):
+        values = array(typecode)
+        size = values.itemsize * count
+        values.frombytes(data[offset:offset + size])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        arrays.append(values)
+        offset += size
+    keys, occupancies, key_entries, edge_parents, edge_moves, node_entries = arrays
+    
+    return checksum, make_book(entries, keys, occupancies, key_entries, edge_parents, edge_moves,
+                               node_entries, max_ply)
+
+
+def make_book(entries, keys, occupancies, key_entries, edge_parents, edge_moves, node_entries, max_ply):
+    """Build an EcoBook from the compiled arrays"""
+    children = [{} for _ in range(len(edge_moves) + 1)]
+    for edge, (parent, code) in enumerate(zip(edge_parents, edge_moves)):
+        children[parent][code] = edge + 1
+    return EcoBook(entries, dict(zip(keys, key_entries)), frozenset(occupancies), children,
+                   list(node_entries), max_ply)
+
+
+@lru_cache(maxsize=None)
+def load_book():
+    """Return the bundled book, rebuilt in memory if the binary file is missing or outdated"""
+    loaded = read_book()
+    if loaded is not None:
+        checksum, book = loaded
+        if not os.path.exists(TABLE_PATH) or checksum == table_checksum():
+            return book
+            
+    return make_book(*compile_table(read_table()))
+
+
+def classify_moves(sans):
+    """Return the (eco, name) entry of a game given as SAN moves, or None"""
+    board = chess.Board()
+    tracker = OpeningTracker()
+    for san in sans:
+        tracker.update(board, board.push_san(san))
+    return tracker.entry
+
+
+if __name__ == '__main__':
+    write_book()
+    _, book = read_book()
+    print(f"Wrote {BOOK_PATH}: {len(book.entries)} lines, {len(book.positions)} positions, "
+          f"{len(book.children) - 1} trie edges, {book.max_ply} plies deep")
@@ -0,0 +1,929 @@
+"""Conversion engine: streams CSV rows through the filters into PGN text
+
+This module has no GUI dependencies so it can be used from the command line,
+from scripts and from worker processes. pandas is only imported once a CSV
+block is actually parsed.
+"""
+import os
+import re
+from collections import deque
+from contextlib import closing
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from time import perf_counter
+
+import chess
+import chess.pgn
+
+from .compression import open_input, open_output
+from .eco import OpeningTracker
+from .expressions import compile_expression
+from .lichess import LichessPuzzleProfile
+from .metrics import ConversionMetrics, count_skips
+from .openings import opening_matcher
+from .themes import ThemeClassifier, theme_set
+from .writer import PgnWriter, format_game
+
+# Number of CSV rows parsed and converted per chunk
+CHUNK_ROWS = 10000
+
+# Precompiled tokenizer pieces for SAN move strings
+MOVE_NUMBER_RE = re.compile(r'\d+\.+')
+ANNOTATION_CHARS = '+#!?'
+ANNOTATION_DELETE = str.maketrans('', '', ANNOTATION_CHARS)
+GAME_RESULTS = frozenset(['1-0', '0-1', '1/2-1/2', '*'])
+
+# CSV columns searched, in order, for each filtered value
+RATING_COLUMNS = ['rating', 'white_rating', 'black_rating', 'player_rating']
+OPENING_COLUMNS = ['opening', 'opening_name', 'eco']
+MOVES_COLUMNS = ['moves', 'pgn', 'game_moves', 'notation']
+
+# Common chess openings
+OPENINGS = [
+    "Sicilian Defense", "French Defense", "Caro-Kann Defense",
+    "Queen's Gambit", "King's Indian Defense", "English Opening",
+    "Ruy Lopez", "Italian Game", "Scandinavian Defense",
+    "Alekhine Defense", "Nimzo-Indian Defense", "Queen's Indian Defense",
+    "Grünfeld Defense", "Catalan Opening", "Bird's Opening",
+    "Réti Opening", "Vienna Game", "King's Gambit",
+    "Petrov Defense", "Pirc Defense"
+]
+
+# Puzzle themes
+THEMES = [
+    "Mate in 1", "Mate in 2", "Mate in 3", "Mate in 4+",
+    "Back Rank Mate", "Smothered Mate", "Anastasia's Mate",
+    "Arabian Mate", "Boden's Mate", "Légal's Mate",
+    "Pin", "Fork", "Skewer", "Discovered Attack",
+    "Double Attack", "Deflection", "Decoy", "Clearance",
+    "Interference", "Zugzwang", "Sacrifice", "Promotion",
+    "En Passant", "Castling", "Endgame", "Opening",
+    "Middlegame", "Tactical", "Positional"
+]
+
+
+def is_missing(value):
+    """Check for an empty CSV cell (None or NaN) without importing pandas"""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def iter_csv_blocks(source, chunk_rows=CHUNK_ROWS, start=0, whole_rows=False):
+    """Stream a CSV file as (raw block, bytes_read, total_bytes) tuples
+    
+    source is a path or a binary file object such as sys.stdin.buffer, and
+    may be compressed (see compression.py). Each block holds the header line
+    followed by up to chunk_rows records. bytes_read counts decompressed
+    bytes and total_bytes is their expected total, 0 when the size of the
+    input is not known. A start offset past the header, which must fall
+    between records, skips the rows before it. With whole_rows, reading
+    stops after the last record ending in a line break, so a row still being
+    appended is left out and read whole by a later run.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open_input(source) as csv_file:
+            yield from _read_blocks(csv_file, chunk_rows, start, whole_rows)
+        return
+    
+    # A decompressing wrapper is closed here, the stream itself is left open
+    csv_file = open_input(source)
+    try:
+        yield from _read_blocks(csv_file, chunk_rows, start, whole_rows)
+    finally:
+        if csv_file is not source:
+            csv_file.close()
+
+
+def _read_blocks(source, chunk_rows, start, whole_rows):
+    estimated_size = getattr(source, 'estimated_size', None)
+    try:
+        total_bytes = os.fstat(source.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        total_bytes = 0
+    
+    header = source.readline()
+    bytes_read = len(header)
+    if start > bytes_read:
+        # Decompressed streams and pipes can only skip forward by reading
+        if source.seekable():
+            source.seek(start)
+        else:
+            while bytes_read < start:
+                skipped = len(source.read(min(start - bytes_read, 1024 * 1024)))
+                if not skipped:
+                    break
+                bytes_read += skipped
+        bytes_read = start
+    lines = []
+    quotes = 0
+    # Lines and input bytes up to the end of the last whole record
+    whole = 0
+    whole_bytes = bytes_read
+    
+    for line in source:
+        lines.append(line)
+        bytes_read += len(line)
+        quotes += line.count(b'"')
+        
+        # Only cut the chunk between records, not inside a quoted field
+        if quotes % 2 == 0 and (not whole_rows or line.endswith(b'\n')):
+            whole, whole_bytes = len(lines), bytes_read
+            if len(lines) >= chunk_rows:
+                if estimated_size is not None:
+                    total_bytes = estimated_size()
+                yield header + b''.join(lines), bytes_read, total_bytes
+                lines = []
+                quotes = 0
+                whole = 0
+    
+    if whole_rows:
+        del lines[whole:]
+        bytes_read = whole_bytes
+    if lines:
+        yield header + b''.join(lines), bytes_read, bytes_read if estimated_size is not None else total_bytes
+
+
+def read_csv_block(block):
+    """Parse a raw CSV block into a DataFrame of strings, NaN for empty cells
+    
+    Every cell keeps its text as written, so the PGN does not depend on the
+    types pandas would infer for a particular block; the filters convert the
+    rating columns with pd.to_numeric.
+    """
+    import pandas as pd
+    return pd.read_csv(BytesIO(block), dtype=str)
+
+
+def input_columns(source):
+    """Column names of a CSV, Parquet or Arrow input file; None for streams and empty files"""
+    if not isinstance(source, (str, os.PathLike)):
+        return None
+    from .columnar import columnar_columns, columnar_format
+    
+    if columnar_format(source):
+        return columnar_columns(source)
+    with open_input(source) as csv_file:
+        header = csv_file.readline()
+    return list(read_csv_block(header).columns) if header.strip() else None
+
+
+def iter_blocks(source, chunk_rows=CHUNK_ROWS, start=0, filters=None, prune=False, whole_rows=False):
+    """Stream a CSV input as raw blocks, or a Parquet or Arrow file as ColumnarBlocks
+    
+    Yields (block, bytes_read, total_bytes) like iter_csv_blocks. For
+    columnar files (see columnar.py) the filters select the columns read,
+    and with prune the row groups without a matching row are skipped.
+    """
+    from .columnar import columnar_format, iter_columnar_blocks
+    
+    if columnar_format(source) is None:
+        return iter_csv_blocks(source, chunk_rows, start, whole_rows)
+    if start:
+        raise ValueError("Parquet and Arrow input cannot be resumed at an offset")
+    return iter_columnar_blocks(source, chunk_rows, filters, prune)
+
+
+def read_block(block):
+    """Parse a raw CSV block, or convert a ColumnarBlock, into a DataFrame"""
+    return read_csv_block(block) if isinstance(block, bytes) else block.to_frame()
+
+
+def replay_moves(moves_str, board, classifier=None, sans=None, opening=None):
+    """Replay SAN moves on a board in one pass
+    
+    Returns the mainline moves, which stop at the first comment or variation,
+    or None if there are no moves or one of them is illegal. The SAN of every
+    mainline move is appended to sans if it is a list. If a ThemeClassifier is
+    given it sees every move and the final position, and an OpeningTracker
+    given as opening sees every mainline move.
+    """
+    tokens = MOVE_NUMBER_RE.sub('', moves_str).split()
+    if not tokens:
+        return None
+    
+    moves = []
+    building = True
+    
+    for token in tokens:
+        # Skip annotations and comments; the mainline stops at the first one
+        if token[0] in '({':
+            building = False
+            continue
+        
+        clean_move = token.rstrip(ANNOTATION_CHARS)
+        if not clean_move or clean_move in GAME_RESULTS:
+            continue
+        
+        try:
+            move = board.parse_san(clean_move)
+        except ValueError:
+            return None
+        
+        # The SAN is computed once here instead of on a second replay when writing
+        record_san = building and sans is not None
+        if classifier is not None:
+            san = classifier.push(board, move, san=record_san)
+        elif record_san:
+            san = board.san_and_push(move)
+        else:
+            board.push(move)
+        
+        if building:
+            moves.append(move)
+            if record_san:
+                sans.append(san)
+            if opening is not None:
+                opening.update(board, move)
+    
+    if classifier is not None:
+        classifier.finish(board)
+    return moves
+
+
+def normalize_moves(moves_str):
+    """Return the moves of a moves string joined by single spaces, for comparing games
+    
+    Move numbers, annotation characters and a final game result are dropped,
+    so "1.e4 e5+ 1-0" and "1. e4 e5 1-0" compare equal. None if nothing is left.
+    """
+    if not isinstance(moves_str, str):
+        return None
+    tokens = MOVE_NUMBER_RE.sub('', moves_str).translate(ANNOTATION_DELETE).split()
+    if tokens and tokens[-1] in GAME_RESULTS:
+        tokens.pop()
+    return ' '.join(tokens) or None
+
+
+def parse_moves(moves_str, game, classifier=None):
+    """Replay SAN moves onto a game in one pass and return whether all of them were legal
+    
+    If a ThemeClassifier is given it sees every move and the final position.
+    """
+    moves = replay_moves(moves_str, game.board(), classifier)
+    if moves is None:
+        # Invalid games keep their headers but get no moves
+        return False
+    
+    node = game
+    for move in moves:
+        node = node.add_variation(move)
+    return True
+
+
+def validate_pgn_moves(moves_str):
+    """Validate if moves string is valid PGN"""
+    try:
+        if not moves_str or is_missing(moves_str):
+            return False
+        
+        return parse_moves(str(moves_str).strip(), chess.pgn.Game())
+    except Exception:
+        return False
+
+
+def matches_theme(game_themes, themes):
+    """Check if the detected themes of a game include any of the selected themes"""
+    if not themes:
+        return True
+        
+    return not theme_set(themes).isdisjoint(game_themes)
+
+
+def matches_opening(opening_str, selected_openings):
+    """Check if game matches selected openings"""
+    if not selected_openings:
+        return True
+        
+    if not opening_str or is_missing(opening_str):
+        return False
+        
+    return opening_matcher(tuple(selected_openings))(opening_str)
+
+
+def first_value(row, columns):
+    """Return the first non-empty value among the given columns of a row"""
+    for col in columns:
+        if col in row and not is_missing(row[col]):
+            return row[col]
+    return None
+
+
+def row_rating(row):
+    """Return the rating of a game row, or None if it has no usable rating"""
+    for col in RATING_COLUMNS:
+        if col in row and not is_missing(row[col]):
+            try:
+                return int(float(row[col]))
+            except (ValueError, TypeError):
+                continue
+    
+    return None
+
+
+def apply_filters(row, filters):
+    """Apply the rating and opening filters to a game row
+    
+    Themes are detected while the moves are replayed, so the theme filter is
+    applied afterwards with matches_theme. So is the opening filter for rows
+    without an opening name, whose opening is classified from the moves.
+    """
+    # Rating filter
+    game_rating = row_rating(row)
+    if game_rating is not None:
+        if game_rating < filters.min_rating or game_rating > filters.max_rating:
+            return False
+    
+    # Opening filter
+    game_opening = first_value(row, OPENING_COLUMNS)
+    if game_opening is not None and not matches_opening(str(game_opening), filters.openings):
+        return False
+        
+    return True
+
+
+@lru_cache(maxsize=None)
+def resolve_filter_columns(columns):
+    """Pick the rating and opening columns present in a CSV header"""
+    return (
+        [col for col in RATING_COLUMNS if col in columns],
+        [col for col in OPENING_COLUMNS if col in columns],
+    )
+
+
+def _coalesce(chunk, columns):
+    """Combine columns into one Series holding the first non-empty value per row"""
+    result = None
+    for col in columns:
+        values = chunk[col]
+        result = values if result is None else result.where(result.notna(), values)
+    return result
+
+
+def chunk_ratings(chunk):
+    """Rating of every row of a chunk as floats, NaN without a usable rating; like row_rating"""
+    import numpy as np
+    import pandas as pd
+    
+    # Unparseable values fall through to the next column
+    rating = pd.Series(np.nan, index=chunk.index)
+    for col in resolve_filter_columns(tuple(chunk.columns))[0]:
+        rating = rating.fillna(pd.to_numeric(chunk[col], errors='coerce'))
+    return np.trunc(rating)
+
+
+def chunk_openings(chunk):
+    """Opening name or ECO code of every row of a chunk, NaN without one"""
+    import pandas as pd
+    
+    openings = _coalesce(chunk, resolve_filter_columns(tuple(chunk.columns))[1])
+    return pd.Series(None, index=chunk.index, dtype=object) if openings is None else openings
+
+
+def filter_chunk(chunk, filters, skips=None):
+    """Apply the rating and opening filters to a chunk with column-wise masks
+    
+    Returns the matching rows; equivalent to apply_filters on every row. The
+    opening filter only looks at the rows that passed the rating filter and
+    keeps the rows without an opening name for classification from their
+    moves. The rows each filter drops are counted in skips (a Counter) if
+    given.
+    """
+    rating_cols, opening_cols = resolve_filter_columns(tuple(chunk.columns))
+    
+    # Rating filter
+    if rating_cols:
+        rating = chunk_ratings(chunk)
+        chunk = count_skips(chunk, rating.isna() | rating.between(filters.min_rating, filters.max_rating),
+                            skips, 'rating')
+    
+    # Opening filter, one lookup per distinct opening string
+    if filters.openings:
+        openings = _coalesce(chunk, opening_cols)
+        if openings is None:
+            return chunk
+        
+        mask = opening_matcher(tuple(filters.openings)).mask(openings) | openings.isna()
+        chunk = count_skips(chunk, mask, skips, 'opening')
+    
+    return chunk
+
+
+def row_to_pgn_game(row):
+    """Convert a CSV row to a PGN game object"""
+    return build_game(row)[0]
+
+
+# PGN headers and the CSV columns searched, in order, for each
+HEADER_COLUMNS = {
+    'event': ['event', 'tournament', 'competition'],
+    'site': ['site', 'location', 'venue'],
+    'date': ['date', 'game_date', 'played_date'],
+    'round': ['round', 'round_number'],
+    'white': ['white', 'white_player', 'player1'],
+    'black': ['black', 'black_player', 'player2'],
+    'result': ['result', 'game_result'],
+    'eco': ['eco', 'opening_code'],
+    'opening': ['opening', 'opening_name'],
+    'whiteelo': ['white_rating', 'white_elo', 'rating1'],
+    'blackelo': ['black_rating', 'black_elo', 'rating2'],
+    'timecontrol': ['time_control', 'timecontrol'],
+    'termination': ['termination', 'end_reason']
+}
+
+
+def row_headers(row):
+    """Build the PGN headers of a CSV row"""
+    headers = chess.pgn.Headers()
+    
+    # Set standard headers
+    for pgn_header, csv_columns in HEADER_COLUMNS.items():
+        for csv_col in csv_columns:
+            if csv_col in row and not is_missing(row[csv_col]):
+                headers[pgn_header.title()] = str(row[csv_col])
+                break
+    
+    # Default values if not found
+    if 'Event' not in headers:
+        headers['Event'] = 'Unknown'
+    if 'Site' not in headers:
+        headers['Site'] = 'Unknown'
+    if 'Date' not in headers:
+        headers['Date'] = '????.??.??'
+    if 'Round' not in headers:
+        headers['Round'] = '?'
+    if 'White' not in headers:
+        headers['White'] = 'Unknown'
+    if 'Black' not in headers:
+        headers['Black'] = 'Unknown'
+    if 'Result' not in headers:
+        headers['Result'] = '*'
+    
+    return headers
+
+
+def row_moves(row):
+    """Return the stripped moves string of a CSV row, or None"""
+    moves_str = first_value(row, MOVES_COLUMNS)
+    if moves_str is not None:
+        moves_str = str(moves_str).strip()
+    return moves_str
+
+
+def build_game(row, classify=False):
+    """Convert a CSV row to a (PGN game, moves valid, themes) tuple
+    
+    themes is the frozenset of detected themes when classify is set and the
+    moves are valid, and empty otherwise.
+    """
+    game = chess.pgn.Game()
+    game.headers = row_headers(row)
+    moves_str = row_moves(row)
+    
+    # Validate, classify and add moves in a single replay
+    classifier = ThemeClassifier() if classify else None
+    valid = bool(moves_str) and parse_moves(moves_str, game, classifier)
+    themes = classifier.themes if valid and classify else frozenset()
+    
+    return game, valid, themes
+
+
+def render_game(row, classify=False, opening=None):
+    """Convert a CSV row straight to a (PGN text, moves valid, themes) tuple
+    
+    Same as build_game, but no game tree is built: the text, equal to
+    str(game) + "\n\n", is written from the SAN recorded during the replay.
+    An OpeningTracker given as opening classifies the opening on the way.
+    """
+    headers = row_headers(row)
+    moves_str = row_moves(row)
+    
+    classifier = ThemeClassifier() if classify else None
+    sans = []
+    valid = bool(moves_str) and replay_moves(moves_str, chess.Board(), classifier, sans, opening) is not None
+    themes = classifier.themes if valid and classify else frozenset()
+    
+    return format_game(headers, sans if valid else ()), valid, themes
+
+
+class GenericProfile:
+    """Game CSVs with SAN moves and the rating, opening and moves columns above"""
+    
+    name = 'generic'
+    themes_from_columns = False
+    classifies_openings = True
+    dedup_columns = MOVES_COLUMNS
+    rating_columns = RATING_COLUMNS
+    # Columns read from columnar input, and those the chunk filters look at
+    input_columns = sorted({col for cols in HEADER_COLUMNS.values() for col in cols}.union(
+        RATING_COLUMNS, OPENING_COLUMNS, MOVES_COLUMNS))
+    filter_columns = RATING_COLUMNS + OPENING_COLUMNS
+    
+    def matches(self, columns):
+        return True
+    
+    def filter_chunk(self, chunk, filters, skips=None):
+        return filter_chunk(chunk, filters, skips)
+    
+    def build_game(self, row, classify=False):
+        return build_game(row, classify)
+    
+    def render_game(self, row, classify=False, opening=None):
+        return render_game(row, classify, opening)
+    
+    def has_moves(self, row):
+        return bool(row_moves(row))
+        
+    def opening_from_moves(self, row):
+        """Whether the opening of a row has to be classified from its moves"""
+        return first_value(row, OPENING_COLUMNS) is None
+        
+    def ratings(self, chunk):
+        return chunk_ratings(chunk)
+        
+    def openings(self, chunk):
+        return chunk_openings(chunk)
+        
+    def theme_cells(self, chunk):
+        """Theme column of a chunk for filter expressions; None as themes come from the replay"""
+        return None
+        
+    def opening_text(self, row):
+        """Opening of a row matched by filter expressions, or None"""
+        return first_value(row, OPENING_COLUMNS)
+        
+    def move_keys(self, chunk):
+        """Moves of every row without move numbers, annotations or result; NaN without moves
+        
+        Every game starts from the initial position, so the moves identify it.
+        """
+        moves = _coalesce(chunk, [col for col in MOVES_COLUMNS if col in chunk.columns])
+        if moves is None:
+            raise ValueError("No moves column to find duplicates by")
+        return moves.map(normalize_moves)
+        
+    def opening_family(self, row):
+        """Opening name without its variation, e.g. "Sicilian Defense", or None"""
+        opening = first_value(row, OPENING_COLUMNS)
+        return None if opening is None else str(opening).split(':')[0].strip() or None
+        
+    def row_rating(self, row):
+        return row_rating(row)
+    
+    def row_opening(self, row):
+        """Opening key stored in the index; opening_needle values are searched in it"""
+        opening = first_value(row, OPENING_COLUMNS)
+        return None if opening is None else str(opening).lower()
+    
+    def opening_needle(self, name):
+        return name.lower()
+
+
+# Input profiles, most specific first
+PROFILES = [LichessPuzzleProfile(), GenericProfile()]
+
+
+@lru_cache(maxsize=None)
+def detect_profile(columns):
+    """Pick the input profile for a CSV header"""
+    for profile in PROFILES:
+        if profile.matches(columns):
+            return profile
+
+
+def get_profile(name):
+    """Look up an input profile by name"""
+    for profile in PROFILES:
+        if profile.name == name:
+            return profile
+    raise ValueError(f"Unknown input profile: {name}")
+
+
+class ConversionCancelled(Exception):
+    """Raised by convert() when the cancel event is set"""
+
+
+class ConversionFilters:
+    """Plain snapshot of the filter settings that can be sent to worker processes"""
+    
+    def __init__(self, min_rating=0, max_rating=3000, openings=(), themes=(), dedup=None, expression=None):
+        self.min_rating = min_rating
+        self.max_rating = max_rating
+        self.openings = list(openings)
+        self.themes = list(themes)
+        # None, 'moves' (start position and moves) or the column to find duplicates by
+        self.dedup = dedup
+        # Filter expression text (see expressions.py), applied on top of the filters above
+        self.expression = expression or None
+
+
+def prefilter_chunk(chunk, profile, filters, skips=None):
+    """Apply the chunk filters and the filter expression before any replay
+    
+    Returns the rows that may match and a boolean array flagging those the
+    filter expression can only decide after their replay.
+    """
+    import numpy as np
+    
+    matched = profile.filter_chunk(chunk, filters, skips)
+    if not filters.expression:
+        return matched, np.zeros(len(matched), dtype=bool)
+    return compile_expression(filters.expression).filter_chunk(matched, profile, skips)
+
+
+def convert_block(block, filters, shard_key=None, duplicates=None):
+    """Parse, filter and convert one raw CSV block, returning PGN text, counts and metrics
+    
+    Row numbers in the metrics count from 1 at the first row of the block;
+    a ColumnarBlock (see columnar.py) also counts the rows of the row groups
+    skipped before it, which come first.
+    With a shard_key (see shards.py) the PGN is returned as a list of
+    (shard_key(profile, row), game text) pairs instead of one text. Rows
+    marked in the duplicates mask (see dedup.py) are skipped before any
+    other filter. The filter expression, if any, is applied to the chunk
+    after the other filters and to the rows it leaves undecided after their
+    replay.
+    """
+    metrics = ConversionMetrics()
+    
+    start = perf_counter()
+    chunk = read_block(block)
+    profile = detect_profile(tuple(chunk.columns))
+    pruned = 0 if isinstance(block, bytes) else sum(block.pruned.values())
+    if pruned:
+        metrics.skips.update(block.pruned)
+    metrics.add_time('read', perf_counter() - start)
+    
+    start = perf_counter()
+    matched = chunk if duplicates is None else count_skips(chunk, ~duplicates, metrics.skips, 'duplicate')
+    matched, undecided = prefilter_chunk(matched, profile, filters, metrics.skips)
+    expression = compile_expression(filters.expression) if filters.expression else None
+    rows = matched.to_dict('records')
+    metrics.add_time('filter', perf_counter() - start)
+    
+    # Profiles without theme columns detect themes during the replay
+    selected_themes = set() if profile.themes_from_columns else theme_set(filters.themes)
+    matcher = opening_matcher(tuple(filters.openings)) if filters.openings else None
+    expression_themes = expression is not None and expression.needs_themes(profile)
+    expression_opening = expression is not None and expression.needs_opening(profile)
+    pgn_parts = []
+    converted_games = 0
+    skipped_games = len(chunk) - len(matched) + pruned
+    errors = []
+    
+    for position, row, decide in zip(matched.index, rows, undecided):
+        # Convert row to PGN
+        start = perf_counter()
+        if (matcher is not None or (decide and expression_opening)) and profile.opening_from_moves(row):
+            tracker = OpeningTracker()
+        else:
+            tracker = None
+        classify = bool(selected_themes) or (decide and expression_themes)
+        try:
+            pgn, valid, themes = profile.render_game(row, classify=classify, opening=tracker)
+        except Exception as e:
+            errors.append(f"Error converting row to PGN: {str(e)}")
+            metrics.skips['error'] += 1
+            skipped_games += 1
+            continue
+        finally:
+            elapsed = perf_counter() - start
+            metrics.add_time('replay', elapsed)
+            metrics.record_replay(elapsed, position + 1)
+        
+        # Opening filter for rows without an opening name, on the opening of the moves
+        if matcher is not None and tracker is not None and not (valid and tracker.label and matcher(tracker.label)):
+            metrics.skips['opening'] += 1
+            skipped_games += 1
+            continue
+        
+        # Theme filter, on the themes detected during the replay
+        if selected_themes and selected_themes.isdisjoint(themes):
+            metrics.skips['theme'] += 1
+            skipped_games += 1
+            continue
+        
+        # Filter expression for rows the chunk masks could not decide
+        if decide and not expression.matches(row, profile, themes, tracker.label if tracker is not None and valid else None):
+            metrics.skips['expression'] += 1
+            skipped_games += 1
+            continue
+        
+        # Invalid games are still written, with their headers only
+        if not valid:
+            metrics.invalid['illegal_move' if profile.has_moves(row) else 'missing_moves'] += 1
+            
+        pgn_parts.append(pgn if shard_key is None else (shard_key(profile, row), pgn))
+        converted_games += 1
+    
+    pgn = ''.join(pgn_parts) if shard_key is None else pgn_parts
+    return pgn, len(chunk) + pruned, converted_games, skipped_games, errors, metrics
+
+
+_worker_filters = None
+
+
+def _init_worker(filters):
+    """Keep the filters in each worker so they are not pickled with every block"""
+    global _worker_filters
+    _worker_filters = filters
+
+
+def _run_in_worker(func, block, kwargs):
+    return func(block, _worker_filters, **kwargs)
+
+
+def map_blocks(source, func, filters, workers=1, chunk_rows=CHUNK_ROWS, start=0, prepare=None, prune=False,
+               whole_rows=False):
+    """Apply func(block, filters) to every CSV block, in input order, on one or more processes
+    
+    func must be a module-level function so it can be sent to the workers.
+    prepare(block), if given, runs in this process on every block in input
+    order before it is sent off and returns extra keyword arguments for func.
+    prune skips the row groups of columnar input that match no filter, see
+    iter_blocks, and whole_rows leaves out a last row without a line break,
+    see iter_csv_blocks. Yields (result, bytes_read, total_bytes).
+    """
+    blocks = iter_blocks(source, chunk_rows, start, filters, prune, whole_rows)
+    
+    if workers <= 1:
+        for block, bytes_read, total_bytes in blocks:
+            kwargs = prepare(block) if prepare else {}
+            yield func(block, filters, **kwargs), bytes_read, total_bytes
+        return
+    
+    # Keep a bounded number of blocks in flight and collect them in submission order
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(filters,)) as executor:
+        pending = deque()
+        
+        try:
+            for block, bytes_read, total_bytes in blocks:
+                kwargs = prepare(block) if prepare else {}
+                pending.append((executor.submit(_run_in_worker, func, block, kwargs), bytes_read, total_bytes))
+                
+                if len(pending) >= workers * 2:
+                    future, done_bytes, total = pending.popleft()
+                    yield future.result(), done_bytes, total
+            
+            while pending:
+                future, done_bytes, total = pending.popleft()
+                yield future.result(), done_bytes, total
+        finally:
+            # Drop queued blocks if the caller stops early, e.g. on cancel
+            for future, _, _ in pending:
+                future.cancel()
+
+
+def iter_converted_blocks(source, filters, workers=1, chunk_rows=CHUNK_ROWS, start=0, shard_key=None, seen=None,
+                          whole_rows=False):
+    """Convert a CSV file block by block, in input order, on one or more processes
+    
+    Yields (pgn_text, rows, converted, skipped, errors, metrics, bytes_read, total_bytes).
+    A start offset resumes at that byte of the input and whole_rows stops
+    at the last line break, see iter_csv_blocks; with a shard_key pgn_text is a list of (key, game text) pairs, see
+    convert_block. With filters.dedup, repeated rows are dropped; seen (a
+    dedup.HashSet) holds the hashes of the rows already converted and
+    receives those of every block before it is yielded.
+    """
+    func = convert_block if shard_key is None else partial(convert_block, shard_key=shard_key)
+    dedup = None
+    if filters.dedup:
+        from .dedup import Deduplicator
+        dedup = Deduplicator(filters.dedup, seen)
+        
+    with closing(map_blocks(source, func, filters, workers, chunk_rows, start, prepare=dedup, prune=True,
+                            whole_rows=whole_rows)) as results:
+        for result, bytes_read, total_bytes in results:
+            if dedup is not None:
+                dedup.commit()
+            yield result + (bytes_read, total_bytes)
+
+
+class ConversionStats:
+    """Running totals for a conversion, passed to progress callbacks"""
+    
+    def __init__(self):
+        self.processed = 0
+        self.converted = 0
+        self.skipped = 0
+        self.bytes_read = 0
+        self.total_bytes = 0
+        self.total_rows = 0
+        self.from_index = False
+        self.resumed_rows = 0
+        self.rebuild_reason = None
+        self.shards = []
+        self.metrics = ConversionMetrics()
+    
+    @property
+    def percent(self):
+        if self.total_bytes:
+            return self.bytes_read * 100 / self.total_bytes
+        if self.total_rows:
+            return self.processed * 100 / self.total_rows
+        return 0.0
+
+
+def convert(source, output, filters=None, workers=1, chunk_rows=CHUNK_ROWS,
+            on_progress=None, on_error=None, cancel=None, index_path=None,
+            checkpoint_path=None, resume=False, shards=None, incremental=None):
+    """Convert a CSV source into PGN and return the final ConversionStats
+    
+    source is a path or binary file object, output a path or text file object.
+    A Parquet or Arrow file path is read as record batches (see columnar.py).
+    on_progress(stats) is called after every block and on_error(message) for
+    every row that could not be converted. If cancel (a threading.Event) gets
+    set, ConversionCancelled is raised at the next block boundary.
+    
+    With index_path, parsed games are cached in an index file next to the
+    CSV and later runs with any filters are served from it (see index.py).
+    
+    With checkpoint_path, the progress of a conversion from a CSV file to a
+    PGN file is saved in a sidecar file, and resume continues an interrupted
+    run from its last checkpoint (see checkpoint.py).
+    
+    With a ShardSpec as shards, the games are split over several PGN files
+    named after the output path and listed in a manifest (see shards.py).
+    
+    With a state file path (or 'auto') as incremental, only the rows
+    appended to the CSV file since the last run are converted and appended
+    to the PGN file (see incremental.py).
+    """
+    if filters is None:
+        filters = ConversionFilters()
+    elif filters.expression:
+        # Report a malformed expression, or one naming a column the input
+        # lacks, before any output is written
+        expression = compile_expression(filters.expression)
+        columns = input_columns(source)
+        if columns is not None:
+            expression.check_columns(columns)
+    
+    if shards is not None:
+        if index_path is not None or checkpoint_path is not None or incremental is not None:
+            raise ValueError("Sharded output cannot be combined with an index, checkpoints or incremental runs")
+        from .shards import convert_sharded
+        return convert_sharded(source, output, shards, filters, workers, chunk_rows,
+                               on_progress, on_error, cancel)
+    
+    if index_path is not None and filters.dedup:
+        raise ValueError("Duplicates cannot be dropped when converting through an index")
+    if filters.expression and index_path is not None:
+        raise ValueError("Filter expressions cannot be used when converting through an index")
+        
+    if incremental is not None or checkpoint_path is not None:
+        from .columnar import columnar_format
+        if columnar_format(source):
+            raise ValueError("Checkpoints and incremental runs need CSV input, not Parquet or Arrow files")
+        
+    if incremental is not None:
+        if index_path is not None or checkpoint_path is not None:
+            raise ValueError("Incremental runs keep their own state; they cannot use an index or checkpoints")
+        from .incremental import convert_incremental
+        return convert_incremental(source, output, incremental, filters, workers, chunk_rows,
+                                   on_progress, on_error, cancel)
+    
+    if checkpoint_path is not None:
+        if index_path is not None:
+            raise ValueError("An index and checkpoints cannot be used together")
+        from .checkpoint import convert_with_checkpoints
+        return convert_with_checkpoints(source, output, checkpoint_path, filters, workers, chunk_rows,
+                                        on_progress, on_error, cancel, resume)
+    
+    if isinstance(output, (str, os.PathLike)):
+        with open_output(output) as pgn_file:
+            return convert(source, pgn_file, filters, workers, chunk_rows, on_progress, on_error, cancel, index_path)
+    
+    if index_path is not None:
+        from .index import convert_with_index
+        return convert_with_index(source, output, index_path, filters, workers, chunk_rows,
+                                  on_progress, on_error, cancel)
+    
+    stats = ConversionStats()
+    started = perf_counter()
+    results = iter_converted_blocks(source, filters, workers, chunk_rows)
+    
+    with closing(results), closing(PgnWriter(output)) as writer:
+        for pgn_text, rows, converted, skipped, errors, metrics, bytes_read, total_bytes in results:
+            start = perf_counter()
+            writer.write(pgn_text)
+            metrics.add_time('write', perf_counter() - start)
+            stats.metrics.merge(metrics, row_offset=stats.processed)
+            
+            if on_error:
+                for error in errors:
+                    on_error(error)
+            
+            stats.processed += rows
+            stats.converted += converted
+            stats.skipped += skipped
+            stats.bytes_read = bytes_read
+            stats.total_bytes = total_bytes
+            
+            if on_progress:
+                on_progress(stats)
+            
+            if cancel is not None and cancel.is_set():
+                raise ConversionCancelled()
+    
+    stats.metrics.add_time('total', perf_counter() - started)
+    return stats
@@ -0,0 +1,417 @@
+"""Filter expressions
+
+Besides the rating range and the opening and theme lists, games can be
+selected with an expression such as
+
+    rating between 1800 and 2200 and themes has mateIn2 and not opening ~ "Sicilian"
+
+The grammar, with case-insensitive keywords:
+
+    expr        := term ('or' term)*
+    term        := factor ('and' factor)*
+    factor      := 'not' factor | '(' expr ')' | comparison
+    comparison  := field op value
+                 | field 'between' value 'and' value
+                 | field 'in' '(' value (',' value)* ')'
+                 | field 'has' value
+    op          := '=' | '==' | '!=' | '<' | '<=' | '>' | '>=' | '~'
+    value       := number | "string" | 'string' | word
+
+Fields are rating, opening and themes, looked up through the input profile,
+or any CSV column by name. '~' tests for a substring ignoring case; on the
+opening it uses the opening matcher, so ECO codes and ranges (B20-B99) work.
+'has' tests for a theme, by name ("Mate in 2") or Lichess tag (mateIn2), or
+for a word of a column. Missing values fail every comparison.
+
+An expression is parsed once per process and evaluated on whole chunks:
+numeric comparisons are numpy compares and the others test every distinct
+cell value once. Values only known after the replay (the detected themes of
+games, the opening of games without an opening name) are unknown in the
+chunk masks, combined with three-valued logic. Rows whose result is unknown
+are kept and decided one by one after their replay.
+"""
+import re
+from functools import lru_cache
+
+from .lichess import TAG_THEMES, puzzle_themes
+from .metrics import count_skips
+from .openings import opening_matcher
+
+TOKEN_RE = re.compile(r'''
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d+)?)(?![^\s=!<>~(),"'])
+      | (?P<string>"[^"]*"|'[^']*')
+      | (?P<op>==|!=|<=|>=|[=<>~(),])
+      | (?P<word>[^\s=!<>~(),"']+)
+    )''', re.VERBOSE)
+
+KEYWORDS = frozenset(['and', 'or', 'not', 'between', 'in', 'has'])
+
+# Operators that only compare numbers
+NUMERIC_OPS = frozenset(['<', '<=', '>', '>=', 'between'])
+
+# Fields known to every profile; 'theme' is accepted for 'themes'
+FIELDS = frozenset(['rating', 'opening', 'themes'])
+
+# Lichess theme tags (lowercased) -> theme names they satisfy
+TAG_NAMES = {tag.lower(): frozenset(names) for tag, names in TAG_THEMES.items()}
+
+
+def is_missing_value(value):
+    return value is None or value != value
+
+
+def as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=65536)
+def theme_names(cell):
+    """Theme names and lowercased tags of a Themes cell"""
+    if not isinstance(cell, str):
+        return frozenset()
+    return puzzle_themes(cell) | frozenset(tag.lower() for tag in cell.split())
+
+
+@lru_cache(maxsize=None)
+def resolve_column(columns, name):
+    """Find a CSV column by name, ignoring case"""
+    if name in columns:
+        return name
+    for column in columns:
+        if column.lower() == name.lower():
+            return column
+    raise ValueError(f"Unknown field in filter expression: {name}")
+
+
+class Comparison:
+    """field op value(s), tested on one value or a whole column"""
+    
+    def __init__(self, field, op, values):
+        self.field = 'themes' if field.lower() == 'theme' else field.lower() if field.lower() in FIELDS else field
+        self.op = op
+        self.values = values
+        self.numbers = [as_number(value) for value in values]
+        numeric = all(number is not None for number in self.numbers)
+        
+        if op in NUMERIC_OPS and not numeric:
+            raise ValueError(f"'{op}' needs numbers, not {', '.join(values)}")
+        self.numeric = op in NUMERIC_OPS or (op in ('=', '!=', 'in') and numeric and self.field != 'themes')
+        self.lowered = [value.lower() for value in values]
+        if self.field == 'themes':
+            self.themes = frozenset(self.lowered).union(*(TAG_NAMES.get(value, ()) for value in self.lowered))
+        if self.field == 'opening' and op == '~':
+            self.matcher = opening_matcher(tuple(values))
+            
+    def test(self, value):
+        """Whether one known value satisfies the comparison"""
+        if is_missing_value(value):
+            return False
+        if self.numeric:
+            return self.test_number(as_number(value))
+        if isinstance(value, frozenset):
+            # A set of themes
+            if self.op == '~':
+                return any(needle in item for item in value for needle in self.lowered)
+            if self.op == '!=':
+                return self.themes.isdisjoint(value)
+            return not self.themes.isdisjoint(value)
+            
+        text = str(value).strip().lower()
+        if self.op == '~':
+            return self.matcher(str(value)) if self.field == 'opening' else self.lowered[0] in text
+        if self.op == 'has':
+            return self.lowered[0] in text.split()
+        if self.op == '!=':
+            return text != self.lowered[0]
+        return text in self.lowered
+        
+    def test_number(self, number):
+        if number is None:
+            return False
+        low = self.numbers[0]
+        if self.op == '<':
+            return number < low
+        if self.op == '<=':
+            return number <= low
+        if self.op == '>':
+            return number > low
+        if self.op == '>=':
+            return number >= low
+        if self.op == 'between':
+            return low <= number <= self.numbers[1]
+        if self.op == '!=':
+            return number != low
+        return number in self.numbers
+        
+    def mask(self, values):
+        """Test a Series of values: numbers with numpy, anything else once per distinct value"""
+        import numpy as np
+        import pandas as pd
+        
+        if self.numeric:
+            numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+            low = self.numbers[0]
+            with np.errstate(invalid='ignore'):
+                if self.op == '<':
+                    return numbers < low
+                if self.op == '<=':
+                    return numbers <= low
+                if self.op == '>':
+                    return numbers > low
+                if self.op == '>=':
+                    return numbers >= low
+                if self.op == 'between':
+                    return (numbers >= low) & (numbers <= self.numbers[1])
+                if self.op == '!=':
+                    return (numbers != low) & ~np.isnan(numbers)
+                return np.isin(numbers, self.numbers)
+                
+        codes, uniques = pd.factorize(values)
+        if self.field == 'themes':
+            uniques = [theme_names(cell) for cell in uniques]
+        verdicts = np.fromiter((self.test(value) for value in uniques), dtype=bool, count=len(uniques))
+        
+        # Code -1 marks an empty cell and picks the trailing False
+        return np.append(verdicts, False)[codes]
+        
+    def masks(self, chunk, profile):
+        """Return (true, unknown) boolean arrays for the rows of a chunk"""
+        import numpy as np
+        
+        unknown = np.zeros(len(chunk), dtype=bool)
+        if self.field == 'rating':
+            values = profile.ratings(chunk)
+        elif self.field == 'opening':
+            values = profile.openings(chunk)
+            if profile.classifies_openings:
+                unknown = values.isna().to_numpy()
+        elif self.field == 'themes':
+            values = profile.theme_cells(chunk)
+            if values is None:
+                return np.zeros(len(chunk), dtype=bool), np.ones(len(chunk), dtype=bool)
+        else:
+            values = chunk[resolve_column(tuple(chunk.columns), self.field)]
+            
+        return self.mask(values) & ~unknown, unknown
+        
+    def matches(self, row, profile, themes, opening):
+        """Test one row after its replay, given its detected themes and classified opening"""
+        if self.field == 'rating':
+            value = profile.row_rating(row)
+        elif self.field == 'opening':
+            value = profile.opening_text(row)
+            if value is None:
+                value = opening
+        elif self.field == 'themes':
+            value = themes
+            if profile.themes_from_columns:
+                # An empty Themes cell is missing, as in the chunk masks
+                cell = row.get('Themes')
+                value = None if is_missing_value(cell) else theme_names(cell)
+        else:
+            value = row[resolve_column(tuple(row), self.field)]
+        return self.test(value)
+        
+    def fields(self):
+        return {self.field}
+
+
+class And:
+    def __init__(self, items):
+        self.items = items
+        
+    def masks(self, chunk, profile):
+        true, false = None, None
+        for item in self.items:
+            item_true, item_unknown = item.masks(chunk, profile)
+            item_false = ~item_true & ~item_unknown
+            true = item_true if true is None else true & item_true
+            false = item_false if false is None else false | item_false
+        return true, ~(true | false)
+        
+    def matches(self, row, profile, themes, opening):
+        return all(item.matches(row, profile, themes, opening) for item in self.items)
+        
+    def fields(self):
+        return set().union(*(item.fields() for item in self.items))
+
+
+class Or(And):
+    def masks(self, chunk, profile):
+        true, false = None, None
+        for item in self.items:
+            item_true, item_unknown = item.masks(chunk, profile)
+            item_false = ~item_true & ~item_unknown
+            true = item_true if true is None else true | item_true
+            false = item_false if false is None else false & item_false
+        return true, ~(true | false)
+        
+    def matches(self, row, profile, themes, opening):
+        return any(item.matches(row, profile, themes, opening) for item in self.items)
+
+
+class Not:
+    def __init__(self, item):
+        self.item = item
+        
+    def masks(self, chunk, profile):
+        true, unknown = self.item.masks(chunk, profile)
+        return ~true & ~unknown, unknown
+        
+    def matches(self, row, profile, themes, opening):
+        return not self.item.matches(row, profile, themes, opening)
+        
+    def fields(self):
+        return self.item.fields()
+
+
+def tokenize(text):
+    """Split an expression into (kind, text, column) tokens"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_RE.match(text, position)
+        if match is None:
+            raise ValueError(f"Filter expression error at column {position + 1}: unexpected {text[position:].strip()[:10]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        column = match.start(kind) + 1
+        if kind == 'string':
+            value = value[1:-1]
+        elif kind == 'word' and value.lower() in KEYWORDS:
+            kind, value = 'keyword', value.lower()
+        tokens.append((kind, value, column))
+        position = match.end()
+    return tokens
+
+
+class Parser:
+    """Recursive descent parser building the expression tree from tokens"""
+    
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+        
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None, None)
+        
+    def error(self, message):
+        _, value, column = self.peek()
+        where = f"column {column}" if column else "the end"
+        raise ValueError(f"Filter expression error at {where}: {message}" + (f", got {value!r}" if value else ""))
+        
+    def accept(self, kind, value=None):
+        token_kind, token_value, _ = self.peek()
+        if token_kind == kind and (value is None or token_value == value):
+            self.position += 1
+            return token_value
+        return None
+        
+    def expect(self, kind, value=None, what=None):
+        token = self.accept(kind, value)
+        if token is None:
+            self.error(f"expected {what or value or kind}")
+        return token
+        
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("Filter expression is empty")
+        node = self.expr()
+        if self.position < len(self.tokens):
+            self.error("expected 'and', 'or' or the end")
+        return node
+        
+    def expr(self):
+        items = [self.term()]
+        while self.accept('keyword', 'or'):
+            items.append(self.term())
+        return items[0] if len(items) == 1 else Or(items)
+        
+    def term(self):
+        items = [self.factor()]
+        while self.accept('keyword', 'and'):
+            items.append(self.factor())
+        return items[0] if len(items) == 1 else And(items)
+        
+    def factor(self):
+        if self.accept('keyword', 'not'):
+            return Not(self.factor())
+        if self.accept('op', '('):
+            node = self.expr()
+            self.expect('op', ')')
+            return node
+        return self.comparison()
+        
+    def value(self):
+        kind, value, _ = self.peek()
+        if kind not in ('number', 'string', 'word'):
+            self.error("expected a value")
+        self.position += 1
+        return value
+        
+    def comparison(self):
+        field = self.accept('word')
+        if field is None:
+            self.error("expected a field name")
+            
+        if self.accept('keyword', 'between'):
+            low = self.value()
+            self.expect('keyword', 'and')
+            return Comparison(field, 'between', [low, self.value()])
+        if self.accept('keyword', 'in'):
+            self.expect('op', '(')
+            values = [self.value()]
+            while self.accept('op', ','):
+                values.append(self.value())
+            self.expect('op', ')')
+            return Comparison(field, 'in', values)
+        if self.accept('keyword', 'has'):
+            return Comparison(field, 'has', [self.value()])
+            
+        op = self.accept('op')
+        if op not in ('=', '==', '!=', '<', '<=', '>', '>=', '~'):
+            if op is not None:
+                self.position -= 1
+            self.error("expected a comparison")
+        return Comparison(field, '=' if op == '==' else op, [self.value()])
+
+
+class FilterExpression:
+    """Parsed filter expression with its chunk pre-filter and per-row check"""
+    
+    def __init__(self, text):
+        self.text = text
+        self.root = Parser(text).parse()
+        self.fields = self.root.fields()
+        
+    def filter_chunk(self, chunk, profile, skips=None):
+        """Return (rows that match or cannot be decided yet, undecided flags of those rows)"""
+        true, unknown = self.root.masks(chunk, profile)
+        keep = true | unknown
+        return count_skips(chunk, keep, skips, 'expression'), unknown[keep]
+        
+    def matches(self, row, profile, themes=frozenset(), opening=None):
+        """Decide a row after its replay"""
+        return self.root.matches(row, profile, themes, opening)
+        
+    def check_columns(self, columns):
+        """Raise ValueError if the expression names a column that is not among columns"""
+        for field in sorted(self.fields - FIELDS):
+            resolve_column(tuple(columns), field)
+            
+    def needs_themes(self, profile):
+        return 'themes' in self.fields and not profile.themes_from_columns
+        
+    def needs_opening(self, profile):
+        return 'opening' in self.fields and profile.classifies_openings
+
+
+@lru_cache(maxsize=32)
+def compile_expression(text):
+    """Return the shared FilterExpression for an expression string; ValueError if it is malformed"""
+    return FilterExpression(text)
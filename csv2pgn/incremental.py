@@ -0,0 +1,126 @@
+"""Incremental conversion of a CSV file that grows by appended rows
+
+An incremental conversion keeps a JSON state file next to the PGN file
+(OUTPUT.state) holding, besides the checkpoint fields of checkpoint.py,
+
+    a checksum of the CSV header line, and
+    a fingerprint of the converted part of the CSV: its length and
+    PREFIX_SAMPLES chunks spread over it, up to the last converted row.
+
+The next run checks the state against the file. If the filters, the header
+and the sampled prefix are unchanged, only the rows appended since are
+converted and their games appended to the PGN file; otherwise the PGN file
+is rebuilt from scratch. The state is also saved every CHECKPOINT_SECONDS,
+so an interrupted run continues where it stopped.
+
+A run stops at the last line break of the CSV and the state points there,
+so a row still being written when a run starts is left for the next run,
+which reads it whole. The last row is only converted once it ends in a
+line break.
+"""
+import hashlib
+import os
+
+from .checkpoint import (
+    CHECKPOINT_SECONDS, CHECKPOINT_VERSION, convert_from_state, keys_path, load_seen, read_checkpoint,
+)
+from .compression import codec_from_magic, codec_from_path
+from .engine import CHUNK_ROWS
+
+# Chunks of the converted part of the CSV hashed into its fingerprint, and their size
+PREFIX_SAMPLES = 16
+PREFIX_SAMPLE_BYTES = 64 * 1024
+
+
+def default_state_path(pgn_path):
+    return os.fspath(pgn_path) + '.state'
+
+
+def header_checksum(path):
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.readline(), digest_size=16).hexdigest()
+
+
+def prefix_fingerprint(path, length):
+    """Hash the first length bytes of a file from PREFIX_SAMPLES evenly spaced chunks"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(length).encode())
+    
+    with open(path, 'rb') as f:
+        if length <= PREFIX_SAMPLES * PREFIX_SAMPLE_BYTES:
+            digest.update(f.read(length))
+        else:
+            # The last chunk ends at the last converted row
+            for i in range(PREFIX_SAMPLES):
+                f.seek((length - PREFIX_SAMPLE_BYTES) * i // (PREFIX_SAMPLES - 1))
+                digest.update(f.read(PREFIX_SAMPLE_BYTES))
+                
+    return digest.hexdigest()
+
+
+def rebuild_reason(source, output, filters, state):
+    """Return why the saved state cannot be continued, or None if only new rows need converting"""
+    if state is None or 'prefix' not in state:
+        return "no earlier incremental run"
+    if state.get('filters') != vars(filters):
+        return "the filters changed"
+    if state.get('header') != header_checksum(source):
+        return "the CSV header changed"
+    if (os.path.getsize(source) < state['input_offset'] or
+            state['prefix'] != prefix_fingerprint(source, state['input_offset'])):
+        return "rows converted earlier changed"
+    if not os.path.exists(output) or os.path.getsize(output) < state['output_offset']:
+        return "the PGN file is missing or shorter than recorded"
+    return None
+
+
+def convert_incremental(source, output, state_path, filters, workers=1, chunk_rows=CHUNK_ROWS,
+                        on_progress=None, on_error=None, cancel=None, interval=CHECKPOINT_SECONDS):
+    """Convert the rows appended to a CSV file since the last run and append them to the PGN file
+    
+    The PGN file is rebuilt from scratch when the state does not match;
+    stats.rebuild_reason then says why. stats.resumed_rows counts the rows
+    converted by earlier runs.
+    """
+    if not isinstance(source, (str, os.PathLike)) or not isinstance(output, (str, os.PathLike)):
+        raise ValueError("Incremental conversion needs a CSV file and a PGN file, not streams")
+        
+    # Offsets of a compressed input count decompressed bytes, which cannot be sampled
+    with open(source, 'rb') as f:
+        if codec_from_path(source) or codec_from_magic(f.read(8)):
+            raise ValueError("Incremental conversion needs an uncompressed CSV file")
+            
+    if state_path == 'auto':
+        state_path = default_state_path(output)
+        
+    saved = read_checkpoint(state_path)
+    reason = rebuild_reason(source, output, filters, saved)
+    if reason is None:
+        # Drop whatever an interrupted run wrote after the state was saved
+        os.truncate(output, saved['output_offset'])
+        state = saved
+    else:
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'input': os.path.abspath(source),
+            'header': header_checksum(source),
+            'filters': vars(filters),
+            'input_offset': 0,
+            'rows': 0,
+            'output_offset': 0,
+            'converted': 0,
+            'skipped': 0,
+        }
+        if os.path.exists(keys_path(state_path)):
+            os.remove(keys_path(state_path))
+            
+    def on_save(state):
+        state['prefix'] = prefix_fingerprint(source, state['input_offset'])
+        
+    append = reason is None
+    seen = load_seen(filters, state, state_path, resumed=append)
+    stats = convert_from_state(source, output, state_path, state, filters, workers, chunk_rows,
+                               on_progress, on_error, cancel, append=append, interval=interval,
+                               seen=seen, on_save=on_save)
+    stats.rebuild_reason = reason
+    return stats
@@ -0,0 +1,304 @@
+"""Persistent index of parsed games for instant re-filtering
+
+The first indexed conversion of a CSV file parses and replays every row once
+and stores, per game, the values the filters look at (rating, opening key,
+detected themes) together with the validity verdict and the rendered PGN
+text. The index is a SQLite file keyed by a fingerprint of the CSV (size,
+mtime and a hash of its first and last megabyte). Later conversions of the
+same file, with any filters, skip the CSV and the move replay and just stream
+the matching PGN records back out.
+"""
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+from time import perf_counter
+
+from .engine import (
+    CHUNK_ROWS, ConversionCancelled, ConversionStats,
+    detect_profile, get_profile, map_blocks, read_block,
+)
+from .eco import OpeningTracker
+from .metrics import ConversionMetrics
+from .openings import opening_matcher
+from .themes import theme_set
+from .writer import PgnWriter
+
+# Bump when the stored columns or their meaning change
+INDEX_VERSION = 4
+
+# Bytes hashed from each end of the CSV for the fingerprint
+FINGERPRINT_SAMPLE = 1024 * 1024
+
+SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE games (
+    id INTEGER PRIMARY KEY,
+    rating INTEGER,
+    opening TEXT,
+    themes TEXT,
+    valid INTEGER,
+    pgn TEXT
+);
+'''
+
+
+def default_index_path(csv_path):
+    return os.fspath(csv_path) + '.pgnidx'
+
+
+def file_fingerprint(path):
+    """Hash the size, mtime and first and last megabyte of a file"""
+    st = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{INDEX_VERSION}:{st.st_size}:{st.st_mtime_ns}".encode())
+    
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_SAMPLE))
+        if st.st_size > FINGERPRINT_SAMPLE:
+            f.seek(max(FINGERPRINT_SAMPLE, st.st_size - FINGERPRINT_SAMPLE))
+            digest.update(f.read())
+            
+    return digest.hexdigest()
+
+
+def open_index(index_path, fingerprint):
+    """Open an existing, complete index for the given fingerprint
+    
+    Returns (connection, input profile), or None if there is no usable index.
+    """
+    if not os.path.exists(index_path):
+        return None
+        
+    try:
+        connection = sqlite3.connect(index_path)
+        meta = dict(connection.execute('SELECT key, value FROM meta'))
+    except sqlite3.DatabaseError:
+        connection.close()
+        return None
+        
+    if meta.get('fingerprint') != fingerprint:
+        connection.close()
+        return None
+    return connection, get_profile(meta.get('profile', 'generic'))
+
+
+def index_block(block, filters):
+    """Parse and render every row of a raw CSV block into index records
+    
+    Returns (records, pgn_parts, profile name, errors, metrics); a record is
+    (rating, opening, themes, valid, pgn) where opening is the profile's
+    opening key, or the lowercased ECO label classified from the moves when
+    the row names no opening, and themes a '|'-delimited list of lowercased
+    theme names. pgn_parts holds the PGN text of the records matching the
+    filters.
+    """
+    metrics = ConversionMetrics()
+    records = []
+    pgn_parts = []
+    errors = []
+    
+    start = perf_counter()
+    chunk = read_block(block)
+    profile = detect_profile(tuple(chunk.columns))
+    metrics.add_time('read', perf_counter() - start)
+    
+    matcher = opening_matcher(tuple(profile.opening_needle(o) for o in filters.openings))
+    selected_themes = theme_set(filters.themes)
+    
+    for position, row in enumerate(chunk.to_dict('records'), 1):
+        start = perf_counter()
+        tracker = OpeningTracker() if profile.opening_from_moves(row) else None
+        try:
+            pgn, valid, game_themes = profile.render_game(row, classify=True, opening=tracker)
+        except Exception as e:
+            errors.append(f"Error converting row to PGN: {str(e)}")
+            valid, pgn, game_themes = False, None, ()
+        elapsed = perf_counter() - start
+        metrics.add_time('replay', elapsed)
+        metrics.record_replay(elapsed, position)
+        
+        themes = '|' + '|'.join(sorted(game_themes)) + '|'
+        opening = profile.row_opening(row)
+        if tracker is not None and valid and tracker.label:
+            opening = tracker.label.lower()
+        record = (profile.row_rating(row), opening, themes, valid, pgn)
+        records.append(record)
+        
+        reason = 'error' if pgn is None else record_skip_reason(record, filters, matcher, selected_themes)
+        if reason:
+            metrics.skips[reason] += 1
+            continue
+            
+        if not valid:
+            metrics.invalid['illegal_move' if profile.has_moves(row) else 'missing_moves'] += 1
+        pgn_parts.append(pgn)
+        
+    return records, pgn_parts, profile.name, errors, metrics
+
+
+def record_skip_reason(record, filters, matcher, selected_themes):
+    """Apply the filters to an index record, like filter_chunk does to a CSV row
+    
+    matcher is the opening_matcher of the profile's opening needles. Returns
+    the name of the first filter the record fails, or None if it matches.
+    """
+    rating, opening, themes, _, _ = record
+    
+    if rating is not None and not filters.min_rating <= rating <= filters.max_rating:
+        return 'rating'
+        
+    if filters.openings:
+        if not opening or not matcher(opening):
+            return 'opening'
+            
+    if filters.themes:
+        if not any(f'|{theme}|' in themes for theme in selected_themes):
+            return 'theme'
+            
+    return None
+
+
+def build_query(filters, profile):
+    """Translate the filters into a SQL query over the games table
+    
+    Openings are matched by the SQL function matches_opening, which
+    register_functions binds to the opening_matcher of the filters.
+    """
+    clauses = ['(rating IS NULL OR rating BETWEEN ? AND ?)']
+    params = [filters.min_rating, filters.max_rating]
+    
+    if filters.openings:
+        clauses.append('matches_opening(opening)')
+        
+    if filters.themes:
+        themes = sorted(theme_set(filters.themes))
+        clauses.append('(' + ' OR '.join(['instr(themes, ?) > 0'] * len(themes)) + ')')
+        params.extend(f'|{theme}|' for theme in themes)
+            
+    return f"SELECT id, pgn FROM games WHERE {' AND '.join(clauses)} ORDER BY id", params
+
+
+def register_functions(connection, filters, profile):
+    """Define the SQL functions build_query uses on a connection"""
+    matcher = opening_matcher(tuple(profile.opening_needle(o) for o in filters.openings))
+    connection.create_function('matches_opening', 1, lambda opening: bool(opening) and matcher(opening),
+                               deterministic=True)
+
+
+def convert_with_index(source, output, index_path, filters, workers=1, chunk_rows=CHUNK_ROWS,
+                       on_progress=None, on_error=None, cancel=None):
+    """Convert through the index, building it first if it is missing or stale"""
+    if not isinstance(source, (str, os.PathLike)):
+        raise ValueError("An index can only be used with a CSV file, not a stream")
+        
+    if index_path == 'auto':
+        index_path = default_index_path(source)
+        
+    fingerprint = file_fingerprint(source)
+    opened = open_index(index_path, fingerprint)
+    if opened is not None:
+        connection, profile = opened
+        with closing(connection), closing(PgnWriter(output)) as writer:
+            return _convert_from_index(connection, profile, writer, filters, chunk_rows, on_progress, cancel)
+            
+    with closing(PgnWriter(output)) as writer:
+        return _convert_building_index(source, writer, index_path, fingerprint, filters, workers,
+                                       chunk_rows, on_progress, on_error, cancel)
+
+
+def _convert_from_index(connection, profile, writer, filters, chunk_rows, on_progress, cancel):
+    stats = ConversionStats()
+    stats.from_index = True
+    started = perf_counter()
+    stats.total_rows = connection.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+    
+    register_functions(connection, filters, profile)
+    sql, params = build_query(filters, profile)
+    cursor = connection.execute(sql, params)
+    
+    while True:
+        start = perf_counter()
+        rows = cursor.fetchmany(chunk_rows)
+        stats.metrics.add_time('query', perf_counter() - start)
+        if not rows:
+            break
+            
+        pgn_parts = [pgn for _, pgn in rows if pgn is not None]
+        start = perf_counter()
+        writer.write(''.join(pgn_parts))
+        stats.metrics.add_time('write', perf_counter() - start)
+        
+        stats.converted += len(pgn_parts)
+        stats.processed = rows[-1][0]
+        if on_progress:
+            on_progress(stats)
+            
+        if cancel is not None and cancel.is_set():
+            raise ConversionCancelled()
+            
+    stats.processed = stats.total_rows
+    stats.skipped = stats.total_rows - stats.converted
+    stats.metrics.add_time('total', perf_counter() - started)
+    return stats
+
+
+def _convert_building_index(source, writer, index_path, fingerprint, filters, workers,
+                            chunk_rows, on_progress, on_error, cancel):
+    # Build into a temporary file so an interrupted run never leaves a partial index
+    temp_path = index_path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+        
+    connection = sqlite3.connect(temp_path)
+    try:
+        connection.executescript(SCHEMA)
+        connection.execute('PRAGMA synchronous = OFF')
+        
+        stats = ConversionStats()
+        started = perf_counter()
+        profile_name = 'generic'
+        
+        with closing(map_blocks(source, index_block, filters, workers, chunk_rows)) as results:
+            for (records, pgn_parts, profile_name, errors, metrics), bytes_read, total_bytes in results:
+                start = perf_counter()
+                connection.executemany(
+                    'INSERT INTO games (rating, opening, themes, valid, pgn) VALUES (?, ?, ?, ?, ?)',
+                    records
+                )
+                metrics.add_time('index', perf_counter() - start)
+                
+                start = perf_counter()
+                writer.write(''.join(pgn_parts))
+                metrics.add_time('write', perf_counter() - start)
+                stats.metrics.merge(metrics, row_offset=stats.processed)
+                
+                if on_error:
+                    for error in errors:
+                        on_error(error)
+                        
+                stats.processed += len(records)
+                stats.converted += len(pgn_parts)
+                stats.skipped += len(records) - len(pgn_parts)
+                stats.bytes_read = bytes_read
+                stats.total_bytes = total_bytes
+                
+                if on_progress:
+                    on_progress(stats)
+                    
+                if cancel is not None and cancel.is_set():
+                    raise ConversionCancelled()
+                    
+        connection.execute("INSERT INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+        connection.execute("INSERT INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+        connection.execute("INSERT INTO meta VALUES ('profile', ?)", (profile_name,))
+        connection.commit()
+    except BaseException:
+        connection.close()
+        os.remove(temp_path)
+        raise
+        
+    connection.close()
+    os.replace(temp_path, index_path)
+    stats.metrics.add_time('total', perf_counter() - started)
+    return stats
@@ -0,0 +1,274 @@
+"""Input profile for the Lichess puzzle database
+
+The puzzle CSV (https://database.lichess.org/#puzzles) has the header
+
+    PuzzleId,FEN,Moves,Rating,RatingDeviation,Popularity,NbPlays,Themes,GameUrl,OpeningTags
+
+Moves are UCI moves played from FEN; the first one is the opponent's move that
+leads to the puzzle position. Games are built from a SetUp/FEN start with
+plain UCI pushes instead of SAN parsing, and the Themes and OpeningTags
+columns are matched as token sets, memoized per distinct cell value.
+"""
+import unicodedata
+from functools import lru_cache
+
+import chess
+import chess.pgn
+
+from .metrics import count_skips
+from .themes import theme_set
+from .writer import format_game
+
+REQUIRED_COLUMNS = frozenset(['PuzzleId', 'FEN', 'Moves', 'Rating', 'Themes'])
+
+# Theme name (lowercased) -> Lichess theme tags
+THEME_TAGS = {
+    'mate in 1': ('mateIn1',),
+    'mate in 2': ('mateIn2',),
+    'mate in 3': ('mateIn3',),
+    'mate in 4+': ('mateIn4', 'mateIn5'),
+    'back rank mate': ('backRankMate',),
+    'smothered mate': ('smotheredMate',),
+    "anastasia's mate": ('anastasiaMate',),
+    'arabian mate': ('arabianMate',),
+    "boden's mate": ('bodenMate',),
+    'pin': ('pin',),
+    'fork': ('fork',),
+    'skewer': ('skewer',),
+    'discovered attack': ('discoveredAttack',),
+    'double attack': ('fork', 'doubleCheck'),
+    'deflection': ('deflection',),
+    'decoy': ('attraction',),
+    'clearance': ('clearance',),
+    'interference': ('interference',),
+    'zugzwang': ('zugzwang',),
+    'sacrifice': ('sacrifice',),
+    'promotion': ('promotion', 'underPromotion'),
+    'en passant': ('enPassant',),
+    'castling': ('castling',),
+    'endgame': ('endgame',),
+    'opening': ('opening',),
+    'middlegame': ('middlegame',),
+}
+
+# Lichess theme tag -> theme names it satisfies
+TAG_THEMES = {}
+for _theme, _tags in THEME_TAGS.items():
+    for _tag in _tags:
+        TAG_THEMES.setdefault(_tag, set()).add(_theme)
+
+# Opening names whose Lichess family tag is spelled differently
+OPENING_ALIASES = {
+    'birds_opening': 'bird_opening',
+    'petrov_defense': 'russian_game',
+}
+
+
+def opening_tag(name):
+    """Normalize an opening name to Lichess tag form, e.g. "Queen's Gambit" -> "queens_gambit" """
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+    name = name.replace("'", '').replace(' ', '_').lower()
+    return OPENING_ALIASES.get(name, name)
+
+
+@lru_cache(maxsize=65536)
+def opening_prefixes(tags):
+    """Return every underscore-delimited prefix of the tags in an OpeningTags cell
+    
+    "Queens_Gambit_Declined" yields "queens", "queens_gambit" and
+    "queens_gambit_declined", so a selected family matches all its variations.
+    """
+    if not isinstance(tags, str):
+        return frozenset()
+        
+    prefixes = set()
+    for tag in tags.lower().split():
+        parts = tag.split('_')
+        prefixes.update('_'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    return frozenset(prefixes)
+
+
+@lru_cache(maxsize=65536)
+def puzzle_themes(tags):
+    """Map a Themes cell to the set of (lowercased) theme names it satisfies"""
+    if not isinstance(tags, str):
+        return frozenset()
+        
+    themes = set()
+    for tag in tags.split():
+        themes.update(TAG_THEMES.get(tag, ()))
+    return frozenset(themes)
+
+
+class LichessPuzzleProfile:
+    """Lichess puzzle CSVs: FEN start, UCI moves, Themes and OpeningTags columns"""
+    
+    name = 'lichess'
+    themes_from_columns = True
+    classifies_openings = False
+    dedup_columns = ['FEN', 'Moves']
+    rating_columns = ['Rating']
+    # Columns read from columnar input, and those the chunk filters look at
+    input_columns = sorted(REQUIRED_COLUMNS | {'GameUrl', 'OpeningTags'})
+    filter_columns = ['Rating', 'OpeningTags', 'Themes']
+    
+    def matches(self, columns):
+        return REQUIRED_COLUMNS.issubset(columns)
+        
+    def filter_chunk(self, chunk, filters, skips=None):
+        """Apply the rating, opening and theme filters to a chunk before any replay"""
+        import pandas as pd
+        
+        rating = pd.to_numeric(chunk['Rating'], errors='coerce')
+        chunk = count_skips(chunk, rating.isna() | rating.between(filters.min_rating, filters.max_rating),
+                            skips, 'rating')
+        
+        if filters.openings:
+            if 'OpeningTags' not in chunk.columns:
+                return count_skips(chunk, None, skips, 'opening')
+            selected = frozenset(opening_tag(o) for o in filters.openings)
+            mask = chunk['OpeningTags'].map(lambda tags: not selected.isdisjoint(opening_prefixes(tags)))
+            chunk = count_skips(chunk, mask, skips, 'opening')
+            
+        if filters.themes:
+            selected = theme_set(filters.themes)
+            mask = chunk['Themes'].map(lambda tags: not selected.isdisjoint(puzzle_themes(tags)))
+            chunk = count_skips(chunk, mask, skips, 'theme')
+            
+        return chunk
+        
+    def headers(self, row):
+        """Build the PGN headers of a puzzle row, without the FEN setup"""
+        headers = chess.pgn.Headers()
+        headers['Event'] = 'Lichess Puzzle'
+        headers['Site'] = str(row['GameUrl']) if isinstance(row.get('GameUrl'), str) else '?'
+        headers['Date'] = '????.??.??'
+        headers['Round'] = '?'
+        headers['White'] = 'Unknown'
+        headers['Black'] = 'Unknown'
+        headers['Result'] = '*'
+        headers['PuzzleId'] = str(row['PuzzleId'])
+        
+        rating = self.row_rating(row)
+        if rating is not None:
+            headers['Rating'] = str(rating)
+        for col in ('Themes', 'OpeningTags'):
+            if isinstance(row.get(col), str):
+                headers[col] = row[col]
+                
+        return headers
+        
+    def replay(self, moves, board, sans=None):
+        """Push UCI moves onto board; return them, or None if one is illegal
+        
+        UCI moves only need a legality check, no SAN parsing. The SAN of every
+        move is appended to sans if it is a list.
+        """
+        if not isinstance(moves, str) or not moves.strip():
+            return None
+            
+        played = []
+        for uci in moves.split():
+            try:
+                move = chess.Move.from_uci(uci)
+            except ValueError:
+                return None
+            if not board.is_legal(move):
+                return None
+                
+            if sans is None:
+                board.push(move)
+            else:
+                sans.append(board.san_and_push(move))
+            played.append(move)
+            
+        return played
+        
+    def build_game(self, row, classify=False):
+        """Convert a puzzle row to a (PGN game, moves valid, themes) tuple"""
+        game = chess.pgn.Game()
+        game.headers = self.headers(row)
+        board = chess.Board(row['FEN'])
+        game.setup(board)
+        
+        moves = self.replay(row['Moves'], board)
+        node = game
+        for move in moves or ():
+            node = node.add_variation(move)
+            
+        return game, moves is not None, puzzle_themes(row.get('Themes'))
+        
+    def render_game(self, row, classify=False, opening=None):
+        """Convert a puzzle row straight to a (PGN text, moves valid, themes) tuple
+        
+        Puzzles start in the middle of a game and are never classified, so
+        opening is ignored; the OpeningTags column names the opening.
+        """
+        headers = self.headers(row)
+        board = chess.Board(row['FEN'])
+        
+        # Same headers as Game.setup
+        fen = board.fen()
+        if fen != chess.STARTING_FEN:
+            headers['FEN'] = fen
+            headers['SetUp'] = '1'
+            
+        turn, fullmove_number = board.turn, board.fullmove_number
+        sans = []
+        valid = self.replay(row['Moves'], board, sans) is not None
+        
+        pgn = format_game(headers, sans if valid else (), turn, fullmove_number)
+        return pgn, valid, puzzle_themes(row.get('Themes'))
+        
+    def has_moves(self, row):
+        return isinstance(row['Moves'], str) and bool(row['Moves'].strip())
+        
+    def opening_from_moves(self, row):
+        return False
+        
+    def ratings(self, chunk):
+        import pandas as pd
+        return pd.to_numeric(chunk['Rating'], errors='coerce')
+        
+    def openings(self, chunk):
+        """OpeningTags of every puzzle with spaces for underscores, NaN without tags"""
+        import pandas as pd
+        
+        if 'OpeningTags' not in chunk.columns:
+            return pd.Series(None, index=chunk.index, dtype=object)
+        return chunk['OpeningTags'].str.replace('_', ' ')
+        
+    def theme_cells(self, chunk):
+        return chunk['Themes']
+        
+    def opening_text(self, row):
+        tags = row.get('OpeningTags')
+        return tags.replace('_', ' ') if isinstance(tags, str) else None
+        
+    def move_keys(self, chunk):
+        """Start FEN and moves of every puzzle; NaN without moves"""
+        moves = chunk['Moves'].str.split().str.join(' ')
+        return (chunk['FEN'].str.strip() + ' ' + moves).where(moves.str.len() > 0)
+        
+    def opening_family(self, row):
+        """Opening family of the first OpeningTags tag, e.g. "Sicilian Defense", or None"""
+        tags = row.get('OpeningTags')
+        if not isinstance(tags, str) or not tags.split():
+            return None
+        return tags.split()[0].replace('_', ' ')
+        
+    def row_rating(self, row):
+        try:
+            return int(float(row['Rating']))
+        except (ValueError, TypeError):
+            return None
+            
+    def row_opening(self, row):
+        """Opening key stored in the index; opening_needle values are searched in it"""
+        prefixes = opening_prefixes(row.get('OpeningTags'))
+        if not prefixes:
+            return None
+        return ' ' + ' '.join(sorted(prefixes)) + ' '
+        
+    def opening_needle(self, name):
+        return ' ' + opening_tag(name) + ' '
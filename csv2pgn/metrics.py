@@ -0,0 +1,121 @@
+"""Instrumentation of the conversion hot path
+
+Every block converted, in the main process or a worker, fills a
+ConversionMetrics with stage timers, skip and invalid-move counts by reason
+and the replay time of every game. The block metrics are merged into
+ConversionStats.metrics, which write_stats saves as JSON. Recording costs two
+perf_counter calls per game, next to a replay of a millisecond or more, so
+it is always on.
+"""
+import cProfile
+import json
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from heapq import heappush, heapreplace
+
+# Upper bounds, in milliseconds, of the replay time histogram buckets
+REPLAY_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+# Slowest games kept with their CSV row numbers
+SLOWEST_GAMES = 20
+
+# Reasons a row is skipped, and why a written game has no moves
+SKIP_REASONS = ['duplicate', 'rating', 'opening', 'theme', 'expression', 'error']
+INVALID_REASONS = ['illegal_move', 'missing_moves']
+
+
+class ConversionMetrics:
+    """Stage timers, skip counters and the replay time histogram of a conversion"""
+    
+    def __init__(self):
+        self.timers = Counter()
+        self.skips = Counter()
+        self.invalid = Counter()
+        self.replay_buckets = [0] * (len(REPLAY_BUCKETS_MS) + 1)
+        self.slowest = []
+        
+    def add_time(self, stage, seconds):
+        self.timers[stage] += seconds
+        
+    def record_replay(self, seconds, row):
+        """Count the replay time of the game on CSV row number row"""
+        self.replay_buckets[bisect_left(REPLAY_BUCKETS_MS, seconds * 1000)] += 1
+        self._keep_slowest(seconds, row)
+        
+    def _keep_slowest(self, seconds, row):
+        # Min-heap of the slowest games seen so far
+        if len(self.slowest) < SLOWEST_GAMES:
+            heappush(self.slowest, (seconds, row))
+        elif seconds > self.slowest[0][0]:
+            heapreplace(self.slowest, (seconds, row))
+            
+    def merge(self, other, row_offset=0):
+        """Add the metrics of a block whose row numbers start after row_offset rows"""
+        self.timers.update(other.timers)
+        self.skips.update(other.skips)
+        self.invalid.update(other.invalid)
+        self.replay_buckets = [a + b for a, b in zip(self.replay_buckets, other.replay_buckets)]
+        for seconds, row in other.slowest:
+            self._keep_slowest(seconds, row + row_offset)
+            
+    def replay_histogram(self):
+        labels = [f"<={bound}ms" for bound in REPLAY_BUCKETS_MS] + [f">{REPLAY_BUCKETS_MS[-1]}ms"]
+        return dict(zip(labels, self.replay_buckets))
+        
+    def to_dict(self):
+        replays = sum(self.replay_buckets)
+        return {
+            'timers': {stage: round(seconds, 4) for stage, seconds in sorted(self.timers.items())},
+            'skipped_by_reason': {reason: self.skips[reason] for reason in SKIP_REASONS},
+            'invalid_by_reason': {reason: self.invalid[reason] for reason in INVALID_REASONS},
+            'replays': replays,
+            'replay_mean_ms': round(self.timers['replay'] * 1000 / replays, 4) if replays else None,
+            'replay_histogram': self.replay_histogram(),
+            'slowest_games': [
+                {'row': row, 'ms': round(seconds * 1000, 3)}
+                for seconds, row in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+
+def count_skips(chunk, mask, skips, reason):
+    """Return the rows of chunk selected by mask (None drops them all), counting the rest as skips"""
+    matched = chunk.iloc[:0] if mask is None else chunk[mask]
+    if skips is not None:
+        skips[reason] += len(chunk) - len(matched)
+    return matched
+
+
+def stats_report(stats):
+    """Return the counts and metrics of a finished conversion as a JSON-ready dict"""
+    total = stats.metrics.timers['total']
+    return {
+        'processed': stats.processed,
+        'converted': stats.converted,
+        'skipped': stats.skipped,
+        'bytes_read': stats.bytes_read,
+        'from_index': stats.from_index,
+        'resumed_rows': stats.resumed_rows,
+        'rows_per_s': round(stats.processed / total, 1) if total else None,
+        **stats.metrics.to_dict(),
+    }
+
+
+def write_stats(stats, path):
+    """Save the stats report of a conversion as a JSON file"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(stats_report(stats), f, indent=2)
+        f.write('\n')
+
+
+@contextmanager
+def profiling(path):
+    """Run the body under cProfile and dump the profile to path for pstats or snakeviz"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,69 @@
+"""Opening name matching
+
+A game matches the opening filter when its opening name contains any of the
+selected names, ignoring case, or when it starts with an ECO code inside the
+code ranges of a selected opening (see eco.py), so "B90" matches the Sicilian
+Defense. OpeningMatcher compiles all selected names into one regular
+expression and remembers the verdict per distinct opening string; real
+datasets have a few thousand distinct opening names across millions of rows,
+so nearly every lookup is a dictionary hit.
+"""
+import re
+from functools import lru_cache
+
+from .eco import eco_number, name_ranges
+
+# Verdicts kept per matcher before its cache is reset
+CACHE_SIZE = 100000
+
+
+class OpeningMatcher:
+    """Case-insensitive test for any of the selected names or their ECO codes in an opening string"""
+    
+    def __init__(self, selected):
+        needles = sorted({name.lower() for name in selected})
+        self.pattern = re.compile('|'.join(re.escape(needle) for needle in needles))
+        self.eco_ranges = tuple(bounds for needle in needles for bounds in name_ranges(needle))
+        self.cache = {}
+        
+    def __call__(self, opening):
+        # Non-string cells are matched on their text, like 1.0 as "1.0"
+        if not isinstance(opening, str):
+            opening = str(opening)
+        matched = self.cache.get(opening)
+        
+        if matched is None:
+            if len(self.cache) >= CACHE_SIZE:
+                self.cache.clear()
+            matched = self.cache[opening] = (
+                self.pattern.search(opening.lower()) is not None or self.in_eco_ranges(opening)
+            )
+            
+        return matched
+        
+    def in_eco_ranges(self, opening):
+        """Check whether an opening string starts with an ECO code in the selected ranges"""
+        if not self.eco_ranges:
+            return False
+        number = eco_number(opening)
+        return number is not None and any(low <= number <= high for low, high in self.eco_ranges)
+        
+    def mask(self, openings):
+        """Match a Series of opening strings; empty cells never match
+        
+        Each distinct value is looked up once per call.
+        """
+        import numpy as np
+        import pandas as pd
+        
+        codes, uniques = pd.factorize(openings)
+        verdicts = np.fromiter((self(value) for value in uniques), dtype=bool, count=len(uniques))
+        
+        # Code -1 marks an empty cell and picks the trailing False
+        return pd.Series(np.append(verdicts, False)[codes], index=openings.index)
+
+
+@lru_cache(maxsize=32)
+def opening_matcher(selected):
+    """Return the shared matcher for a tuple of selected opening names"""
+    return OpeningMatcher(selected)
@@ -0,0 +1,204 @@
+"""Fast preview of a CSV file
+
+The preview reads the header and the first rows, counts the rows and
+estimates how many of them match the filters, without parsing the whole
+file:
+
+    row count    an exact newline count over the memory-mapped file up to
+                 EXACT_COUNT_BYTES, above that the file size divided by the
+                 mean row length of SAMPLE_CHUNKS byte samples spread over
+                 the file; for compressed files, the decompressed size
+                 extrapolated from the first SAMPLE_BYTES
+    match rate   the rows of the same samples run through the profile's
+                 chunk filter and the filter expression, and through a
+                 dry-run conversion of at most REPLAY_SAMPLE rows when a
+                 filter needs the moves (themes detected from moves,
+                 openings classified from moves)
+
+Counts are physical lines, so quoted fields containing newlines make the
+count slightly high.
+"""
+import mmap
+import os
+import random
+
+from .compression import DecompressingReader, open_input
+from .engine import ConversionFilters, convert_block, detect_profile, prefilter_chunk, read_block, read_csv_block
+
+# Files up to this size get an exact row count
+EXACT_COUNT_BYTES = 256 * 1024 * 1024
+
+# Byte samples read across larger files, and the size of each
+SAMPLE_CHUNKS = 64
+SAMPLE_CHUNK_BYTES = 32 * 1024
+
+# Decompressed bytes read from the start of a compressed file
+SAMPLE_BYTES = 4 * 1024 * 1024
+
+# Sampled rows converted when a filter can only be decided during the replay
+REPLAY_SAMPLE = 200
+
+# Newlines counted per slice of the memory-mapped file
+COUNT_SLICE = 16 * 1024 * 1024
+
+# Rows sampled from the row groups of Parquet and Arrow files
+COLUMNAR_SAMPLE_ROWS = 20000
+
+
+class CsvPreview:
+    """Header, first rows, row count and filter match estimate of a CSV file"""
+    
+    def __init__(self, path, columns, head, profile, rows, rows_exact, sampled, matched):
+        self.path = path
+        self.columns = columns
+        self.head = head
+        self.profile = profile
+        self.rows = rows
+        self.rows_exact = rows_exact
+        self.sampled = sampled
+        self.matched = matched
+        
+    @property
+    def match_rate(self):
+        return self.matched / self.sampled if self.sampled else None
+        
+    @property
+    def matching_rows(self):
+        """Estimated rows matching the filters, or None without a sample"""
+        rate = self.match_rate
+        return None if rate is None else round(self.rows * rate)
+        
+    def rows_label(self):
+        return f"{self.rows:,}" if self.rows_exact else f"~{self.rows:,} (estimated)"
+        
+    def summary(self):
+        """Preview text for the GUI and the command line"""
+        text = "CSV Preview:\n"
+        text += f"Format: {self.profile}\n"
+        text += f"Total games: {self.rows_label()}\n"
+        text += f"Columns: {', '.join(self.columns)}\n"
+        if self.match_rate is not None:
+            text += (f"Matching the filters: ~{self.matching_rows:,} "
+                     f"({self.match_rate:.1%} of {self.sampled:,} sampled rows)\n")
+        text += f"\nFirst {len(self.head)} rows:\n{self.head.to_string()}"
+        return text
+
+
+def count_lines(path):
+    """Count the newlines of an uncompressed file through a memory map"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines = sum(mm[i:i + COUNT_SLICE].count(b'\n') for i in range(0, size, COUNT_SLICE))
+            # A last line without a newline is still a row
+            return lines + (mm[size - 1:size] != b'\n')
+
+
+def sample_lines(path, header_size, size, seed=0):
+    """Read whole lines from SAMPLE_CHUNKS byte ranges spread over an uncompressed file"""
+    rng = random.Random(seed)
+    span = (size - header_size) // SAMPLE_CHUNKS
+    lines = []
+    with open(path, 'rb') as f:
+        for i in range(SAMPLE_CHUNKS):
+            start = header_size + i * span + rng.randrange(max(1, span - SAMPLE_CHUNK_BYTES))
+            f.seek(start)
+            data = f.read(SAMPLE_CHUNK_BYTES)
+            # Drop the partial lines at both ends
+            chunk_lines = data.split(b'\n')[1:-1]
+            lines.extend(line + b'\n' for line in chunk_lines if line.strip())
+    return lines
+
+
+def match_sample(header, lines, filters, profile):
+    """Return (sampled, matched) for sampled CSV lines under the filters"""
+    try:
+        chunk = read_csv_block(header + b''.join(lines))
+    except ValueError:
+        return 0, 0
+    return match_rows(chunk, filters, profile, lambda step: header + b''.join(lines[::step]))
+
+
+def match_rows(chunk, filters, profile, block_of):
+    """Return (sampled, matched) for the sampled rows of chunk under the filters
+    
+    block_of(step) returns every step-th sampled row as a block for convert_block.
+    """
+    if chunk.empty:
+        return 0, 0
+        
+    matched, undecided = prefilter_chunk(chunk, profile, filters)
+    matched = len(matched)
+    replay_needed = undecided.any() or (filters.themes and not profile.themes_from_columns) or (
+        filters.openings and any(map(profile.opening_from_moves, chunk.to_dict('records'))))
+    if not replay_needed or not matched:
+        return len(chunk), matched
+        
+    # Dry-run conversion of every step-th sampled row, about REPLAY_SAMPLE of them passing the chunk filters
+    step = max(1, matched // REPLAY_SAMPLE)
+    subset = block_of(step)
+    passed = len(prefilter_chunk(read_block(subset), profile, filters)[0])
+    _, _, converted, _, _, _ = convert_block(subset, filters)
+    return len(chunk), round(matched * converted / passed) if passed else 0
+
+
+def preview_csv(path, filters=None, head_rows=5, seed=0):
+    """Build a CsvPreview of a CSV file from its first rows and byte samples"""
+    if filters is None:
+        filters = ConversionFilters()
+        
+    from .columnar import columnar_format
+    if columnar_format(path):
+        return preview_columnar(path, filters, head_rows)
+        
+    with open_input(path) as csv_file:
+        header = csv_file.readline()
+        compressed = isinstance(csv_file, DecompressingReader)
+        if compressed:
+            # Compressed files are only sampled from the start
+            data = csv_file.read(SAMPLE_BYTES)
+            complete = len(data) < SAMPLE_BYTES or not csv_file.peek(1)
+            if not complete:
+                data = data[:data.rfind(b'\n') + 1]
+            head_lines = data.splitlines(keepends=True)
+            estimated_size = csv_file.estimated_size()
+        else:
+            head_lines = [line for _, line in zip(range(max(head_rows, 1) * 4), csv_file)]
+            
+    head = read_csv_block(header + b''.join(head_lines)).head(head_rows)
+    columns = list(head.columns)
+    profile = detect_profile(tuple(columns))
+    
+    if compressed:
+        lines, rows_exact = head_lines, complete
+        mean_length = len(data) / max(1, len(lines))
+        rows = len(lines) if complete else round((max(estimated_size, len(data)) - len(header)) / mean_length)
+    else:
+        size = os.path.getsize(path)
+        if size <= EXACT_COUNT_BYTES:
+            rows, rows_exact = max(0, count_lines(path) - 1), True
+        else:
+            rows_exact = False
+        if size - len(header) <= SAMPLE_CHUNKS * SAMPLE_CHUNK_BYTES:
+            with open(path, 'rb') as f:
+                lines = f.read().splitlines(keepends=True)[1:]
+        else:
+            lines = sample_lines(path, len(header), size, seed)
+        if not rows_exact:
+            mean_length = sum(len(line) for line in lines) / max(1, len(lines))
+            rows = round((size - len(header)) / mean_length) if mean_length else 0
+            
+    sampled, matched = match_sample(header, lines, filters, profile)
+    return CsvPreview(os.fspath(path), columns, head, profile.name, rows, rows_exact, sampled, matched)
+
+
+def preview_columnar(path, filters, head_rows=5):
+    """Build a CsvPreview of a Parquet or Arrow file; the row count comes from its metadata"""
+    from .columnar import frame_block, read_columnar_sample
+    
+    columns, rows, sample = read_columnar_sample(path, COLUMNAR_SAMPLE_ROWS)
+    profile = detect_profile(tuple(columns))
+    sampled, matched = match_rows(sample, filters, profile, lambda step: frame_block(sample.iloc[::step]))
+    return CsvPreview(os.fspath(path), columns, sample.head(head_rows), profile.name, rows, True, sampled, matched)
@@ -0,0 +1,382 @@
+"""Sharded PGN output
+
+Instead of one PGN file, a sharded conversion writes the games to several
+files next to the output path, each through its own buffered writer:
+
+    sequential shards  games-00000.pgn, games-00001.pgn, ... each holding at
+                       most max_games games or max_bytes bytes of PGN text;
+                       concatenated in order they equal the unsharded output
+    keyed shards       games-rating-2200.pgn, games-opening-sicilian-defense.pgn
+                       ... one per rating bucket or opening family, optionally
+                       split further by the same bounds
+
+The shard key is computed in the worker processes with the game. A JSON
+manifest (games.manifest.json) lists every shard with its key, game count,
+PGN bytes and, for sequential shards, its byte range in the unsharded
+output. Compressed shard names (games.pgn.gz) are compressed on one writer
+thread per shard.
+
+At most MAX_OPEN_SHARDS shard files are open at once, as a fine opening key
+can make thousands of shards: the least recently written one is closed and
+reopened for appending when it gets its next game. A compressed shard that
+was reopened holds several compressed streams, which decompress as one.
+
+A keyed run updates the manifest of an earlier keyed run with the same key:
+shards of keys it did not write are kept, so converting one bucket again
+leaves the other shards alone.
+
+Keys are named after their ASCII transliteration ("Grünfeld Defense" ->
+grunfeld-defense). A key whose name is taken by another key, in this run or
+in the manifest being updated, gets a hash of the key appended.
+"""
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from contextlib import closing
+from time import perf_counter
+
+from .compression import CODEC_EXTENSIONS, open_output
+from .engine import CHUNK_ROWS, ConversionCancelled, ConversionStats, iter_converted_blocks
+from .writer import PgnWriter
+
+# Bump when the manifest fields or their meaning change
+MANIFEST_VERSION = 1
+
+# PGN characters collected per shard before they are written
+SHARD_FLUSH_CHARS = 256 * 1024
+
+# Shard files kept open at once; each compressed one also holds a writer thread
+MAX_OPEN_SHARDS = 64
+
+# Shard keys and the default rating bucket width
+SHARD_KEYS = ['rating', 'opening']
+RATING_BUCKET = 200
+
+
+class ShardKey:
+    """Picklable shard key function: rating bucket or opening family of a row"""
+    
+    def __init__(self, kind, width=RATING_BUCKET):
+        if kind not in SHARD_KEYS:
+            raise ValueError(f"Unknown shard key: {kind}")
+        if width <= 0:
+            raise ValueError(f"Rating bucket width must be positive: {width}")
+        self.kind = kind
+        self.width = width
+        
+    def __call__(self, profile, row):
+        if self.kind == 'rating':
+            rating = profile.row_rating(row)
+            return 'unrated' if rating is None else str(rating // self.width * self.width)
+        return profile.opening_family(row) or 'unknown'
+        
+    def __str__(self):
+        return f"rating:{self.width}" if self.kind == 'rating' else self.kind
+
+
+class ShardSpec:
+    """How to split the output: at most max_games games or max_bytes bytes per shard, per key"""
+    
+    def __init__(self, max_games=None, max_bytes=None, key=None):
+        self.max_games = max_games
+        self.max_bytes = max_bytes
+        self.key = key
+        
+    def to_dict(self):
+        return {'key': None if self.key is None else str(self.key),
+                'max_games': self.max_games, 'max_bytes': self.max_bytes}
+
+
+def parse_shard_key(text):
+    """Parse a shard key such as "opening", "rating" or "rating:100" """
+    kind, _, width = text.partition(':')
+    if kind == 'rating' and width:
+        try:
+            width = int(width)
+        except ValueError:
+            raise ValueError(f"Rating bucket width must be a whole number: {width}")
+        return ShardKey(kind, width)
+    return ShardKey(kind)
+
+
+def split_output_path(path):
+    """Split an output path into (stem, extension), e.g. "out/games", ".pgn.gz" """
+    path = os.fspath(path)
+    root, ext = os.path.splitext(path)
+    if ext.lower() in CODEC_EXTENSIONS:
+        root, pgn_ext = os.path.splitext(root)
+        return root, pgn_ext + ext
+    return root, ext or '.pgn'
+
+
+def manifest_path(output):
+    stem, _ = split_output_path(output)
+    return stem + '.manifest.json'
+
+
+def key_slug(key):
+    """File name part for a shard key, e.g. "King's Gambit" -> "kings-gambit", "Réti" -> "reti" """
+    key = unicodedata.normalize('NFKD', key).encode('ascii', 'ignore').decode()
+    slug = re.sub(r'[^a-z0-9]+', '-', key.lower().replace("'", '')).strip('-')
+    return slug or 'unknown'
+
+
+class Shard:
+    """One output file and its counts"""
+    
+    def __init__(self, path, key, part, offset):
+        self.path = path
+        self.key = key
+        self.part = part
+        self.offset = offset
+        self.games = 0
+        self.bytes = 0
+        self.file = None
+        self.writer = None
+        self.open()
+        
+    def open(self, append=False):
+        self.file = open_output(self.path, append)
+        self.writer = PgnWriter(self.file, SHARD_FLUSH_CHARS)
+        
+    def write(self, text, size):
+        self.writer.write(text)
+        self.games += 1
+        self.bytes += size
+        
+    def close(self):
+        """Write out the shard and close its file; open(append=True) continues it"""
+        if self.file is not None:
+            self.writer.close()
+            self.file.close()
+            self.file = None
+            self.writer = None
+        
+    def to_dict(self, filters):
+        entry = {
+            'file': os.path.basename(self.path),
+            'key': self.key,
+            'part': self.part,
+            'games': self.games,
+            'bytes': self.bytes,
+            'file_bytes': os.path.getsize(self.path),
+            'filters': vars(filters),
+        }
+        if self.offset is not None:
+            entry['offset'] = self.offset
+        return entry
+
+
+class ShardedWriter:
+    """Routes game texts to shard files by key and size bounds"""
+    
+    def __init__(self, output, spec, max_open=MAX_OPEN_SHARDS):
+        self.stem, self.ext = split_output_path(output)
+        self.spec = spec
+        self.max_open = max_open
+        self.current = {}
+        # Keys of the shards with an open file, least recently written first
+        self.open_keys = OrderedDict()
+        # File name part of every key and the key using each name
+        self.names = {}
+        self.name_keys = {}
+        self.done = []
+        self.parts = {}
+        self.total_bytes = 0
+        
+    def shard_path(self, key, part):
+        if key is None:
+            return f"{self.stem}-{part:05d}{self.ext}"
+        name = f"{self.stem}-{self.spec.key.kind}-{self.key_name(key)}"
+        return f"{name}{self.ext}" if part == 0 else f"{name}-{part:05d}{self.ext}"
+        
+    def key_name(self, key):
+        """File name part of a key, made distinct from those of other keys with the same slug"""
+        name = self.names.get(key)
+        if name is None:
+            name = key_slug(key)
+            if self.name_keys.get(name, key) != key:
+                name = f"{name}-{hashlib.blake2b(key.encode('utf-8'), digest_size=4).hexdigest()}"
+            self.names[key] = name
+            self.name_keys[name] = key
+        return name
+        
+    def reserve(self, entries):
+        """Take over the key names of the manifest entries of an earlier keyed run"""
+        prefix = f"{os.path.basename(self.stem)}-{self.spec.key.kind}-"
+        for entry in entries:
+            key, name = entry.get('key'), entry.get('file', '')
+            if key is None or not name.startswith(prefix) or not name.endswith(self.ext):
+                continue
+            name = name[len(prefix):len(name) - len(self.ext)]
+            if entry.get('part'):
+                name = name[:-len(f"-{entry['part']:05d}")]
+            self.names.setdefault(key, name)
+            self.name_keys.setdefault(name, key)
+        
+    def write(self, key, text):
+        size = len(text) if text.isascii() else len(text.encode('utf-8'))
+        shard = self.current.get(key)
+        
+        # Start the next part once a bound would be exceeded
+        if shard is not None and shard.games and (
+                (self.spec.max_games and shard.games >= self.spec.max_games) or
+                (self.spec.max_bytes and shard.bytes + size > self.spec.max_bytes)):
+            shard.close()
+            self.open_keys.pop(key, None)
+            self.done.append(shard)
+            shard = None
+            
+        if shard is None or shard.file is None:
+            self.make_room()
+        if shard is None:
+            part = self.parts.get(key, -1) + 1
+            self.parts[key] = part
+            offset = self.total_bytes if key is None else None
+            shard = self.current[key] = Shard(self.shard_path(key, part), key, part, offset)
+        elif shard.file is None:
+            shard.open(append=True)
+        self.open_keys[key] = True
+        self.open_keys.move_to_end(key)
+        
+        shard.write(text, size)
+        self.total_bytes += size
+        
+    def make_room(self):
+        """Close the least recently written shards until another file can be opened"""
+        while self.open_keys and len(self.open_keys) >= self.max_open:
+            key, _ = self.open_keys.popitem(last=False)
+            self.current[key].close()
+            
+    def close(self):
+        """Close every shard and return them in the order they were started"""
+        for shard in self.current.values():
+            shard.close()
+            self.done.append(shard)
+        self.current = {}
+        self.open_keys = OrderedDict()
+        return sorted(self.done, key=lambda shard: (shard.key or '', shard.part))
+
+
+def read_manifest(output):
+    """Load the manifest of an earlier sharded run, or {} if there is none or it is outdated"""
+    try:
+        with open(manifest_path(output), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) and manifest.get('version') == MANIFEST_VERSION else {}
+
+
+def write_manifest(output, source, spec, filters, shards):
+    """Write the manifest of a sharded conversion and return its entries
+    
+    A keyed manifest keeps the entries of keys this run did not write from an
+    earlier manifest with the same key; any other earlier manifest is replaced.
+    Shard files of replaced entries that were not written again are removed.
+    """
+    path = manifest_path(output)
+    entries = [shard.to_dict(filters) for shard in shards]
+    previous = read_manifest(output)
+    previous_entries = previous.get('shards', [])
+    
+    if spec.key is not None and previous.get('shard_by') == spec.to_dict():
+        written = {entry['key'] for entry in entries}
+        kept = [entry for entry in previous_entries if entry.get('key') not in written]
+        entries = sorted(kept + entries, key=lambda entry: (entry['key'] or '', entry['part']))
+        
+    # Leftover parts of an earlier, larger run
+    current = {entry['file'] for entry in entries}
+    for entry in previous_entries:
+        stale = os.path.join(os.path.dirname(path), entry.get('file', ''))
+        if entry.get('file') and entry['file'] not in current and os.path.isfile(stale):
+            os.remove(stale)
+            
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'input': os.path.abspath(source) if isinstance(source, (str, os.PathLike)) else None,
+        'shard_by': spec.to_dict(),
+        'games': sum(entry['games'] for entry in entries),
+        'shards': entries,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.write('\n')
+    return entries
+
+
+def remove_manifest(output):
+    """Remove the manifest of output, if there is one"""
+    try:
+        os.remove(manifest_path(output))
+    except FileNotFoundError:
+        pass
+
+
+def sequential_key(profile, row):
+    """Shard key of sequential shards: every game goes to the current shard"""
+    return None
+
+
+def convert_sharded(source, output, spec, filters, workers=1, chunk_rows=CHUNK_ROWS,
+                    on_progress=None, on_error=None, cancel=None):
+    """Convert a CSV source into PGN shards next to output and write their manifest
+    
+    The manifest is written also when the conversion fails or is cancelled,
+    listing the shards as far as they were written; if it cannot be written,
+    the manifest of an earlier run is removed rather than left describing
+    files that were overwritten, and the error of the conversion is raised.
+    """
+    if not isinstance(output, (str, os.PathLike)):
+        raise ValueError("Sharded output needs an output path, not a stream")
+        
+    stats = ConversionStats()
+    started = perf_counter()
+    sharded = ShardedWriter(output, spec)
+    if spec.key is not None:
+        previous = read_manifest(output)
+        if previous.get('shard_by') == spec.to_dict():
+            sharded.reserve(previous.get('shards', []))
+    results = iter_converted_blocks(source, filters, workers, chunk_rows, shard_key=spec.key or sequential_key)
+    
+    failed = True
+    try:
+        with closing(results):
+            for games, rows, converted, skipped, errors, metrics, bytes_read, total_bytes in results:
+                start = perf_counter()
+                for key, text in games:
+                    sharded.write(key, text)
+                metrics.add_time('write', perf_counter() - start)
+                stats.metrics.merge(metrics, row_offset=stats.processed)
+                
+                if on_error:
+                    for error in errors:
+                        on_error(error)
+                        
+                stats.processed += rows
+                stats.converted += converted
+                stats.skipped += skipped
+                stats.bytes_read = bytes_read
+                stats.total_bytes = total_bytes
+                
+                if on_progress:
+                    on_progress(stats)
+                    
+                if cancel is not None and cancel.is_set():
+                    raise ConversionCancelled()
+        failed = False
+    finally:
+        try:
+            shards = sharded.close()
+            stats.shards = write_manifest(output, source, spec, filters, shards)
+        except Exception:
+            remove_manifest(output)
+            if not failed:
+                raise
+            
+    stats.metrics.add_time('total', perf_counter() - started)
+    return stats
+
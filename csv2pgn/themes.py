@@ -0,0 +1,203 @@
+"""Theme detection from the positions of a replayed game
+
+ThemeClassifier is fed every move while parse_moves replays a game, so all
+themes come out of the one replay the conversion already does. Tactical
+themes created by a move (fork, pin, skewer) only depend on the position
+after the move and the square the piece landed on, so they are cached by
+position key; openings and popular puzzle lines repeat the same positions
+across many games.
+
+Theme names are compared lowercased, e.g. "Mate in 2" matches "mate in 2".
+"""
+import chess
+
+PIECE_VALUES = {
+    chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3,
+    chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 100,
+}
+
+SLIDERS = (chess.BISHOP, chess.ROOK, chess.QUEEN)
+
+# Final positions with at most this many pieces besides kings and pawns are endgames
+ENDGAME_PIECES = 6
+
+# Final positions up to this move number count as the opening
+OPENING_MOVES = 10
+
+# Themes ThemeClassifier can detect from the moves alone
+SUPPORTED_THEMES = frozenset([
+    'mate in 1', 'mate in 2', 'mate in 3', 'mate in 4+',
+    'back rank mate', 'smothered mate',
+    'fork', 'double attack', 'pin', 'skewer',
+    'promotion', 'en passant', 'castling',
+    'endgame', 'opening', 'middlegame',
+])
+
+# Entries kept in the tactics cache before it is reset
+CACHE_SIZE = 200000
+
+_tactics_cache = {}
+
+
+def theme_set(themes):
+    """Normalize theme names for matching"""
+    return frozenset(theme.lower() for theme in themes)
+
+
+def position_key(board):
+    """Hashable key of the piece placement and state of a board"""
+    return (
+        board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+        board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK],
+        board.turn, board.castling_rights, board.ep_square,
+    )
+
+
+def _sign(x):
+    return (x > 0) - (x < 0)
+
+
+def _behind(board, origin, target):
+    """Return the first occupied square beyond target on the line from origin, or None"""
+    file_step = _sign(chess.square_file(target) - chess.square_file(origin))
+    rank_step = _sign(chess.square_rank(target) - chess.square_rank(origin))
+    file = chess.square_file(target) + file_step
+    rank = chess.square_rank(target) + rank_step
+    
+    while 0 <= file < 8 and 0 <= rank < 8:
+        square = chess.square(file, rank)
+        if board.occupied & chess.BB_SQUARES[square]:
+            return square
+        file += file_step
+        rank += rank_step
+        
+    return None
+
+
+def _find_tactics(board, square):
+    themes = set()
+    piece = board.piece_at(square)
+    if piece is None:
+        return frozenset()
+        
+    defender = not piece.color
+    value = PIECE_VALUES[piece.piece_type]
+    targets = board.attacks(square) & board.occupied_co[defender]
+    
+    # Fork: the piece hits two or more non-pawn pieces that are worth more or undefended
+    forked = 0
+    for target in targets:
+        target_type = board.piece_type_at(target)
+        if target_type == chess.PAWN:
+            continue
+        if target_type == chess.KING or PIECE_VALUES[target_type] > value or not board.is_attacked_by(defender, target):
+            forked += 1
+    if forked >= 2:
+        themes.update(('fork', 'double attack'))
+        
+    # Pin and skewer: a slider lines up two enemy pieces
+    if piece.piece_type in SLIDERS:
+        for target in targets:
+            behind = _behind(board, square, target)
+            if behind is None or board.color_at(behind) != defender:
+                continue
+                
+            front_type = board.piece_type_at(target)
+            back_type = board.piece_type_at(behind)
+            if front_type != chess.KING and PIECE_VALUES[back_type] > PIECE_VALUES[front_type]:
+                themes.add('pin')
+            elif back_type != chess.PAWN and PIECE_VALUES[front_type] > PIECE_VALUES[back_type]:
+                themes.add('skewer')
+                
+    return frozenset(themes)
+
+
+def move_tactics(board, square):
+    """Return the tactical themes created by the piece that just moved to square"""
+    key = (position_key(board), square)
+    themes = _tactics_cache.get(key)
+    
+    if themes is None:
+        if len(_tactics_cache) >= CACHE_SIZE:
+            _tactics_cache.clear()
+        themes = _tactics_cache[key] = _find_tactics(board, square)
+        
+    return themes
+
+
+class ThemeClassifier:
+    """Collects the themes of a game while its moves are replayed"""
+    
+    def __init__(self):
+        self.themes = set()
+        self.plies = 0
+        self.first_color = None
+        
+    def push(self, board, move, san=False):
+        """Push move onto board and record the themes it creates
+        
+        Returns the SAN of the move if san is set, computed while pushing.
+        """
+        if self.first_color is None:
+            self.first_color = board.turn
+            
+        if move.promotion:
+            self.themes.add('promotion')
+        if board.is_en_passant(move):
+            self.themes.add('en passant')
+        elif board.is_castling(move):
+            self.themes.add('castling')
+            
+        if san:
+            san = board.san_and_push(move)
+        else:
+            board.push(move)
+        self.plies += 1
+        self.themes.update(move_tactics(board, move.to_square))
+        return san
+        
+    def finish(self, board):
+        """Add the themes of the final position and return all themes as a frozenset"""
+        if self.plies and board.is_checkmate():
+            self.themes.update(self._mate_themes(board))
+            
+        # Game phase of the final position
+        pieces = chess.popcount(board.occupied & ~board.pawns & ~board.kings)
+        if pieces <= ENDGAME_PIECES:
+            self.themes.add('endgame')
+        elif board.fullmove_number <= OPENING_MOVES:
+            self.themes.add('opening')
+        else:
+            self.themes.add('middlegame')
+            
+        self.themes = frozenset(self.themes)
+        return self.themes
+        
+    def _mate_themes(self, board):
+        themes = set()
+        mated = board.turn
+        
+        # Count the moves the mating side made
+        if self.first_color == mated:
+            mating_moves = self.plies // 2
+        else:
+            mating_moves = (self.plies + 1) // 2
+        themes.add(f'mate in {mating_moves}' if mating_moves < 4 else 'mate in 4+')
+        
+        king = board.king(mated)
+        checkers = board.checkers()
+        escape_squares = chess.BB_KING_ATTACKS[king] & ~board.occupied_co[mated]
+        
+        # Smothered mate: a knight mates a king boxed in by its own pieces
+        if not escape_squares and all(board.piece_type_at(sq) == chess.KNIGHT for sq in checkers):
+            themes.add('smothered mate')
+            
+        # Back rank mate: a rook or queen mates along the king's own back rank
+        back_rank = 0 if mated == chess.WHITE else 7
+        if chess.square_rank(king) == back_rank and any(
+            chess.square_rank(sq) == back_rank and board.piece_type_at(sq) in (chess.ROOK, chess.QUEEN)
+            for sq in checkers
+        ):
+            themes.add('back rank mate')
+            
+        return themes
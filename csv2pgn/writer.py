@@ -0,0 +1,69 @@
+"""Direct PGN text output
+
+str(game) runs python-chess's StringExporter, a visitor that walks the game
+tree and replays every move on a fresh board to compute its SAN. The
+conversion already replays each game once to validate it, so it records the
+SAN of every mainline move during that replay and the functions here format
+the headers and movetext straight from them. The text is the same as
+str(game) + "\\n\\n".
+"""
+import chess
+
+# PGN characters collected before they are written to the output
+FLUSH_CHARS = 1024 * 1024
+
+
+def format_movetext(sans, turn=chess.WHITE, fullmove_number=1, result='*'):
+    """Format SAN moves played from the given side and move number, ending in the result"""
+    parts = []
+    for san in sans:
+        if turn == chess.WHITE:
+            parts.append(f"{fullmove_number}. {san}")
+        else:
+            # Only a game starting with Black gets a "N..." move number
+            parts.append(f"{fullmove_number}... {san}" if not parts else san)
+            fullmove_number += 1
+        turn = not turn
+        
+    parts.append(result)
+    return ' '.join(parts).rstrip()
+
+
+def format_game(headers, sans, turn=chess.WHITE, fullmove_number=1):
+    """Return the PGN text of a game followed by a blank line, like str(game) + "\\n\\n"
+    
+    headers is a chess.pgn.Headers (so the Seven Tag Roster comes first) and
+    sans the SAN of the mainline moves.
+    """
+    lines = [f'[{name} "{value}"]' for name, value in headers.items()]
+    if lines:
+        lines.append('')
+    lines.append(format_movetext(sans, turn, fullmove_number, headers.get('Result', '*')))
+    return '\n'.join(lines).rstrip() + '\n\n'
+
+
+class PgnWriter:
+    """Collects PGN text and writes it to a text file in large batches"""
+    
+    def __init__(self, output, flush_chars=FLUSH_CHARS):
+        self.output = output
+        self.flush_chars = flush_chars
+        self.parts = []
+        self.pending = 0
+        
+    def write(self, text):
+        self.parts.append(text)
+        self.pending += len(text)
+        if self.pending >= self.flush_chars:
+            self.flush()
+            
+    def flush(self):
+        """Write out the collected text and flush the output"""
+        if self.parts:
+            self.output.write(''.join(self.parts))
+            self.parts = []
+            self.pending = 0
+        self.output.flush()
+        
+    def close(self):
+        self.flush()
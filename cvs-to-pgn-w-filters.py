@@ -1,12 +1,21 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import pandas as pd
-import chess
-import chess.pgn
-from io import StringIO
-import re
 import os
 from datetime import datetime
+import multiprocessing
+import queue
+import threading
+
+from csv2pgn import (
+    OPENINGS, THEMES, ConversionCancelled, ConversionFilters, convert, find_checkpoint,
+    preview_csv, stats_report,
+)
+from csv2pgn.columnar import columnar_format
+from csv2pgn.lichess import THEME_TAGS
+from csv2pgn.themes import SUPPORTED_THEMES
+
+# How often the UI applies progress and log updates from the background task
+POLL_INTERVAL_MS = 100
 
 class CSVtoPGNConverter:
     def __init__(self, root):
@@ -20,33 +29,27 @@ class CSVtoPGNConverter:
         self.pgn_file_path = tk.StringVar()
         self.min_rating = tk.IntVar(value=0)
         self.max_rating = tk.IntVar(value=3000)
+        self.workers = tk.IntVar(value=os.cpu_count() or 1)
+        self.use_index = tk.BooleanVar(value=False)
+        self.skip_duplicates = tk.BooleanVar(value=False)
+        self.append_new_rows = tk.BooleanVar(value=False)
+        self.filter_expression = tk.StringVar()
         self.selected_openings = []
         self.selected_themes = []
         
+        # Background task state; the worker thread only talks to Tk through the queue
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.task_thread = None
+        
         # Common chess openings
-        self.openings = [
-            "Sicilian Defense", "French Defense", "Caro-Kann Defense",
-            "Queen's Gambit", "King's Indian Defense", "English Opening",
-            "Ruy Lopez", "Italian Game", "Scandinavian Defense",
-            "Alekhine Defense", "Nimzo-Indian Defense", "Queen's Indian Defense",
-            "Grünfeld Defense", "Catalan Opening", "Bird's Opening",
-            "Réti Opening", "Vienna Game", "King's Gambit",
-            "Petrov Defense", "Pirc Defense"
-        ]
-        
-        # Puzzle themes
-        self.themes = [
-            "Mate in 1", "Mate in 2", "Mate in 3", "Mate in 4+",
-            "Back Rank Mate", "Smothered Mate", "Anastasia's Mate",
-            "Arabian Mate", "Boden's Mate", "Légal's Mate",
-            "Pin", "Fork", "Skewer", "Discovered Attack",
-            "Double Attack", "Deflection", "Decoy", "Clearance",
-            "Interference", "Zugzwang", "Sacrifice", "Promotion",
-            "En Passant", "Castling", "Endgame", "Opening",
-            "Middlegame", "Tactical", "Positional"
-        ]
+        self.openings = list(OPENINGS)
+        
+        # Puzzle themes that are detected from moves or have a Lichess puzzle tag
+        self.themes = [theme for theme in THEMES if theme.lower() in SUPPORTED_THEMES or theme.lower() in THEME_TAGS]
         
         self.create_widgets()
+        self.root.after(POLL_INTERVAL_MS, self.poll_events)
         
     def create_widgets(self):
         # Main frame
@@ -89,6 +92,11 @@ class CSVtoPGNConverter:
         ttk.Spinbox(rating_frame, from_=0, to=3000, textvariable=self.min_rating, width=10).grid(row=0, column=2, padx=(0, 10))
         ttk.Label(rating_frame, text="Max:").grid(row=0, column=3, sticky=tk.W, padx=(10, 5))
         ttk.Spinbox(rating_frame, from_=0, to=3000, textvariable=self.max_rating, width=10).grid(row=0, column=4, padx=(0, 10))
+        ttk.Label(rating_frame, text="Workers:").grid(row=0, column=5, sticky=tk.W, padx=(10, 5))
+        ttk.Spinbox(rating_frame, from_=1, to=os.cpu_count() or 1, textvariable=self.workers, width=5).grid(row=0, column=6)
+        ttk.Checkbutton(rating_frame, text="Cache in index file", variable=self.use_index).grid(row=0, column=7, padx=(10, 0))
+        ttk.Checkbutton(rating_frame, text="Skip duplicates", variable=self.skip_duplicates).grid(row=0, column=8, padx=(10, 0))
+        ttk.Checkbutton(rating_frame, text="Append new rows only", variable=self.append_new_rows).grid(row=0, column=9, padx=(10, 0))
         
         # Opening filter
         opening_frame = ttk.Frame(filters_frame)
@@ -134,13 +142,25 @@ class CSVtoPGNConverter:
         for theme in self.themes:
             self.theme_listbox.insert(tk.END, theme)
         
+        # Filter expression
+        expression_frame = ttk.Frame(filters_frame)
+        expression_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        expression_frame.columnconfigure(1, weight=1)
+        
+        ttk.Label(expression_frame, text="Expression:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
+        ttk.Entry(expression_frame, textvariable=self.filter_expression).grid(row=0, column=1, sticky=(tk.W, tk.E))
+        
         # Buttons frame
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=2, column=0, columnspan=2, pady=(0, 10))
         
-        ttk.Button(button_frame, text="Preview Data", command=self.preview_data).grid(row=0, column=0, padx=(0, 10))
-        ttk.Button(button_frame, text="Convert", command=self.convert_csv_to_pgn).grid(row=0, column=1, padx=(0, 10))
-        ttk.Button(button_frame, text="Clear Filters", command=self.clear_filters).grid(row=0, column=2)
+        self.preview_button = ttk.Button(button_frame, text="Preview Data", command=self.preview_data)
+        self.preview_button.grid(row=0, column=0, padx=(0, 10))
+        self.convert_button = ttk.Button(button_frame, text="Convert", command=self.convert_csv_to_pgn)
+        self.convert_button.grid(row=0, column=1, padx=(0, 10))
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_task, state=tk.DISABLED)
+        self.cancel_button.grid(row=0, column=2, padx=(0, 10))
+        ttk.Button(button_frame, text="Clear Filters", command=self.clear_filters).grid(row=0, column=3)
         
         # Progress bar
         self.progress = ttk.Progressbar(main_frame, mode='determinate')
@@ -169,12 +189,67 @@ class CSVtoPGNConverter:
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
         self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        
+    def start_task(self, target, *args):
+        """Run target(*args) on a background thread with the action buttons disabled"""
+        self.cancel_event.clear()
+        self.preview_button.config(state=tk.DISABLED)
+        self.convert_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.task_thread = threading.Thread(target=target, args=args, daemon=True)
+        self.task_thread.start()
+        
+    def finish_task(self):
+        """Re-enable the action buttons once the background task is done"""
+        self.task_thread = None
+        self.preview_button.config(state=tk.NORMAL)
+        self.convert_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        
+    def cancel_task(self):
+        """Ask the background task to stop at the next chunk boundary"""
+        if self.task_thread is not None:
+            self.cancel_event.set()
+            self.status_label.config(text="Cancelling...")
+            
+    def post(self, callback, *args):
+        """Schedule callback(*args) on the Tk thread from the background task"""
+        self.events.put((callback, args))
+        
+    def poll_events(self):
+        """Apply queued updates from the background task, at most every POLL_INTERVAL_MS"""
+        latest_progress = None
+        while True:
+            try:
+                callback, args = self.events.get_nowait()
+            except queue.Empty:
+                break
+            
+            # Only the most recent progress update is worth drawing
+            if callback == self.show_progress:
+                latest_progress = args
+                continue
+            if latest_progress is not None:
+                self.show_progress(*latest_progress)
+                latest_progress = None
+            callback(*args)
+        
+        if latest_progress is not None:
+            self.show_progress(*latest_progress)
+        self.root.after(POLL_INTERVAL_MS, self.poll_events)
+        
+    def show_progress(self, percent, text):
+        self.progress['value'] = percent
+        self.status_label.config(text=text)
+        
+    def set_status(self, text):
+        self.status_label.config(text=text)
         
     def browse_csv_file(self):
         filename = filedialog.askopenfilename(
             title="Select CSV file",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            filetypes=[("CSV files", "*.csv"), ("Parquet and Arrow files", "*.parquet *.arrow *.feather"),
+                       ("All files", "*.*")]
         )
         if filename:
             self.csv_file_path.set(filename)
@@ -208,101 +283,15 @@ class CSVtoPGNConverter:
         selected_theme_indices = self.theme_listbox.curselection()
         self.selected_themes = [self.themes[i] for i in selected_theme_indices]
         
-    def validate_pgn_moves(self, moves_str):
-        """Validate if moves string is valid PGN"""
-        try:
-            if not moves_str or pd.isna(moves_str):
-                return False
-            
-            # Create a new game and try to parse moves
-            game = chess.pgn.Game()
-            board = game.board()
-            
-            # Clean up the moves string
-            moves_str = str(moves_str).strip()
-            
-            # Remove move numbers and extra whitespace
-            moves_str = re.sub(r'\d+\.+', '', moves_str)
-            moves_str = re.sub(r'\s+', ' ', moves_str).strip()
-            
-            if not moves_str:
-                return False
-            
-            moves = moves_str.split()
-            
-            for move in moves:
-                move = move.strip()
-                if not move:
-                    continue
-                    
-                # Skip annotations and comments
-                if move.startswith('(') or move.startswith('{'):
-                    continue
-                    
-                # Remove check/checkmate symbols and annotations
-                clean_move = re.sub(r'[+#!?]+$', '', move)
-                
-                if clean_move and clean_move not in ['1-0', '0-1', '1/2-1/2', '*']:
-                    try:
-                        board.push_san(clean_move)
-                    except (chess.InvalidMoveError, chess.IllegalMoveError):
-                        return False
-            
-            return True
-        except Exception:
-            return False
-            
-    def matches_theme(self, moves_str, themes):
-        """Check if game matches selected themes"""
-        if not themes:
-            return True
-            
-        moves_str = str(moves_str).lower()
-        
-        for theme in themes:
-            theme_lower = theme.lower()
-            
-            # Simple theme matching logic
-            if 'mate in 1' in theme_lower and ('mate in 1' in moves_str or '#' in moves_str):
-                return True
-            elif 'mate in 2' in theme_lower and 'mate in 2' in moves_str:
-                return True
-            elif 'mate in 3' in theme_lower and 'mate in 3' in moves_str:
-                return True
-            elif 'mate in 4' in theme_lower and 'mate in 4' in moves_str:
-                return True
-            elif 'pin' in theme_lower and 'pin' in moves_str:
-                return True
-            elif 'fork' in theme_lower and 'fork' in moves_str:
-                return True
-            elif 'skewer' in theme_lower and 'skewer' in moves_str:
-                return True
-            elif 'sacrifice' in theme_lower and ('sacrifice' in moves_str or 'sac' in moves_str):
-                return True
-            elif 'endgame' in theme_lower and 'endgame' in moves_str:
-                return True
-            elif 'opening' in theme_lower and 'opening' in moves_str:
-                return True
-            elif 'middlegame' in theme_lower and 'middlegame' in moves_str:
-                return True
-                
-        return False
-        
-    def matches_opening(self, opening_str, selected_openings):
-        """Check if game matches selected openings"""
-        if not selected_openings:
-            return True
-            
-        if not opening_str or pd.isna(opening_str):
-            return False
-            
-        opening_str = str(opening_str).lower()
-        
-        for selected_opening in selected_openings:
-            if selected_opening.lower() in opening_str:
-                return True
-                
-        return False
+    def get_conversion_filters(self):
+        """Snapshot the filter widgets into a ConversionFilters object"""
+        self.get_selected_filters()
+        return ConversionFilters(
+            self.min_rating.get(), self.max_rating.get(),
+            self.selected_openings, self.selected_themes,
+            'moves' if self.skip_duplicates.get() else None,
+            self.filter_expression.get().strip()
+        )
         
     def preview_data(self):
         """Preview the CSV data and show statistics"""
@@ -310,40 +299,39 @@ class CSVtoPGNConverter:
             messagebox.showerror("Error", "Please select a CSV file first")
             return
             
+        self.log_message("Loading CSV file for preview...")
+        self.start_task(self.load_preview, self.csv_file_path.get(), self.get_conversion_filters())
+        
+    def load_preview(self, csv_path, filters):
+        """Sample the CSV for the preview window (runs on the background thread)"""
         try:
-            self.log_message("Loading CSV file for preview...")
-            df = pd.read_csv(self.csv_file_path.get())
-            
-            # Show basic statistics
-            total_games = len(df)
-            columns = list(df.columns)
-            
-            preview_text = f"CSV Preview:\n"
-            preview_text += f"Total games: {total_games}\n"
-            preview_text += f"Columns: {', '.join(columns)}\n\n"
-            preview_text += f"First 5 rows:\n{df.head().to_string()}"
-            
-            # Create preview window
-            preview_window = tk.Toplevel(self.root)
-            preview_window.title("CSV Preview")
-            preview_window.geometry("800x600")
-            
-            preview_text_widget = tk.Text(preview_window, wrap=tk.WORD)
-            preview_scrollbar = ttk.Scrollbar(preview_window, orient=tk.VERTICAL, command=preview_text_widget.yview)
-            preview_text_widget.configure(yscrollcommand=preview_scrollbar.set)
-            
-            preview_text_widget.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            preview_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-            
-            preview_text_widget.insert(tk.END, preview_text)
-            preview_text_widget.config(state=tk.DISABLED)
-            
-            self.log_message(f"Preview loaded: {total_games} games found")
+            preview = preview_csv(csv_path, filters)
+            self.post(self.show_preview, preview.rows_label(), preview.summary())
             
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to preview CSV file: {str(e)}")
-            self.log_message(f"Error previewing file: {str(e)}")
+            self.post(messagebox.showerror, "Error", f"Failed to preview CSV file: {str(e)}")
+            self.post(self.log_message, f"Error previewing file: {str(e)}")
+        finally:
+            self.post(self.finish_task)
             
+    def show_preview(self, total_games, preview_text):
+        """Open the preview window"""
+        preview_window = tk.Toplevel(self.root)
+        preview_window.title("CSV Preview")
+        preview_window.geometry("800x600")
+        
+        preview_text_widget = tk.Text(preview_window, wrap=tk.WORD)
+        preview_scrollbar = ttk.Scrollbar(preview_window, orient=tk.VERTICAL, command=preview_text_widget.yview)
+        preview_text_widget.configure(yscrollcommand=preview_scrollbar.set)
+        
+        preview_text_widget.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        preview_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        preview_text_widget.insert(tk.END, preview_text)
+        preview_text_widget.config(state=tk.DISABLED)
+        
+        self.log_message(f"Preview loaded: {total_games} games found")
+        
     def convert_csv_to_pgn(self):
         """Main conversion function"""
         if not self.csv_file_path.get():
@@ -354,193 +342,115 @@ class CSVtoPGNConverter:
             messagebox.showerror("Error", "Please specify output PGN file")
             return
             
-        try:
-            self.get_selected_filters()
-            self.log_message("Starting conversion...")
-            self.status_label.config(text="Loading CSV file...")
-            
-            # Load CSV
-            df = pd.read_csv(self.csv_file_path.get())
-            total_games = len(df)
-            self.log_message(f"Loaded {total_games} games from CSV")
-            
-            # Set up progress bar
-            self.progress['maximum'] = total_games
-            self.progress['value'] = 0
-            
-            converted_games = 0
-            skipped_games = 0
-            
-            with open(self.pgn_file_path.get(), 'w', encoding='utf-8') as pgn_file:
-                for index, row in df.iterrows():
-                    # Update progress
-                    self.progress['value'] = index + 1
-                    self.status_label.config(text=f"Processing game {index + 1}/{total_games}")
-                    
-                    if index % 100 == 0:  # Update every 100 games
-                        self.root.update_idletasks()
-                    
-                    # Apply filters
-                    if not self.apply_filters(row):
-                        skipped_games += 1
-                        continue
-                    
-                    # Convert row to PGN
-                    game = self.row_to_pgn_game(row)
-                    if game:
-                        pgn_file.write(str(game) + "\n\n")
-                        converted_games += 1
-                    else:
-                        skipped_games += 1
-            
-            self.progress['value'] = total_games
-            self.status_label.config(text="Conversion completed!")
-            
-            success_msg = f"Conversion completed!\n"
-            success_msg += f"Converted: {converted_games} games\n"
-            success_msg += f"Skipped: {skipped_games} games\n"
-            success_msg += f"Output file: {self.pgn_file_path.get()}"
-            
-            self.log_message(success_msg)
-            messagebox.showinfo("Success", success_msg)
-            
-        except Exception as e:
-            error_msg = f"Conversion failed: {str(e)}"
-            self.log_message(error_msg)
-            messagebox.showerror("Error", error_msg)
-            self.status_label.config(text="Conversion failed!")
-            
-    def apply_filters(self, row):
-        """Apply all filters to a game row"""
-        # Rating filter
-        rating_cols = ['rating', 'white_rating', 'black_rating', 'player_rating']
-        game_rating = None
-        
-        for col in rating_cols:
-            if col in row and not pd.isna(row[col]):
-                try:
-                    game_rating = int(float(row[col]))
-                    break
-                except (ValueError, TypeError):
-                    continue
-        
-        if game_rating is not None:
-            if game_rating < self.min_rating.get() or game_rating > self.max_rating.get():
-                return False
-        
-        # Opening filter
-        opening_cols = ['opening', 'opening_name', 'eco']
-        game_opening = None
-        
-        for col in opening_cols:
-            if col in row and not pd.isna(row[col]):
-                game_opening = str(row[col])
-                break
-        
-        if not self.matches_opening(game_opening, self.selected_openings):
-            return False
+        # Read the Tk variables here; the background thread must not touch them
+        filters = self.get_conversion_filters()
+        workers = max(1, self.workers.get())
+        
+        # Some themes only come from the Themes column of Lichess puzzle files
+        puzzle_only = [theme for theme in filters.themes if theme.lower() not in SUPPORTED_THEMES]
+        if puzzle_only and not messagebox.askyesno(
+            "Puzzle themes",
+            f"{', '.join(puzzle_only)} can only be matched in Lichess puzzle files, not detected "
+            "from the moves of a game CSV, where they match no games.\nConvert anyway?"
+        ):
+            return
+        index_path = 'auto' if self.use_index.get() else None
+        incremental = 'auto' if self.append_new_rows.get() else None
+        
+        # Plain conversions of CSV files save checkpoints next to the PGN file; offer to continue an interrupted one
+        checkpoint_path = None if index_path or incremental or columnar_format(self.csv_file_path.get()) else 'auto'
+        resume = False
+        if checkpoint_path:
+            saved = find_checkpoint(self.csv_file_path.get(), self.pgn_file_path.get(), filters)
+            if saved is not None:
+                resume = messagebox.askyesno(
+                    "Resume conversion",
+                    f"A previous conversion to this file stopped after {saved['rows']} games.\nResume it?"
+                )
+                
+        self.log_message(f"Starting conversion with {workers} worker process(es)...")
+        self.status_label.config(text="Loading CSV file...")
         
-        # Theme filter
-        moves_cols = ['moves', 'pgn', 'game_moves', 'notation']
-        game_moves = None
+        # Stream the CSV chunk by chunk so memory stays flat
+        self.progress['maximum'] = 100
+        self.progress['value'] = 0
         
-        for col in moves_cols:
-            if col in row and not pd.isna(row[col]):
-                game_moves = str(row[col])
-                break
+        self.start_task(self.run_conversion, self.csv_file_path.get(), self.pgn_file_path.get(), filters, workers,
+                        index_path, checkpoint_path, resume, incremental)
         
-        if not self.matches_theme(game_moves, self.selected_themes):
-            return False
-            
-        return True
-        
-    def row_to_pgn_game(self, row):
-        """Convert a CSV row to a PGN game object"""
-        try:
-            game = chess.pgn.Game()
-            
-            # Set headers from CSV columns
-            header_mapping = {
-                'event': ['event', 'tournament', 'competition'],
-                'site': ['site', 'location', 'venue'],
-                'date': ['date', 'game_date', 'played_date'],
-                'round': ['round', 'round_number'],
-                'white': ['white', 'white_player', 'player1'],
-                'black': ['black', 'black_player', 'player2'],
-                'result': ['result', 'game_result'],
-                'eco': ['eco', 'opening_code'],
-                'opening': ['opening', 'opening_name'],
-                'whiteelo': ['white_rating', 'white_elo', 'rating1'],
-                'blackelo': ['black_rating', 'black_elo', 'rating2'],
-                'timecontrol': ['time_control', 'timecontrol'],
-                'termination': ['termination', 'end_reason']
-            }
-            
-            # Set standard headers
-            for pgn_header, csv_columns in header_mapping.items():
-                for csv_col in csv_columns:
-                    if csv_col in row and not pd.isna(row[csv_col]):
-                        game.headers[pgn_header.title()] = str(row[csv_col])
-                        break
+    def run_conversion(self, csv_path, pgn_path, filters, workers, index_path, checkpoint_path=None, resume=False,
+                       incremental=None):
+        """Convert the CSV file (runs on the background thread)"""
+        def on_progress(stats):
+            # Update progress from bytes read
+            self.post(
+                self.show_progress, stats.percent,
+                f"Processed {stats.processed} games ({stats.bytes_read // 1024 ** 2}/{stats.total_bytes // 1024 ** 2} MB)"
+            )
             
-            # Default values if not found
-            if 'Event' not in game.headers:
-                game.headers['Event'] = 'Unknown'
-            if 'Site' not in game.headers:
-                game.headers['Site'] = 'Unknown'
-            if 'Date' not in game.headers:
-                game.headers['Date'] = '????.??.??'
-            if 'Round' not in game.headers:
-                game.headers['Round'] = '?'
-            if 'White' not in game.headers:
-                game.headers['White'] = 'Unknown'
-            if 'Black' not in game.headers:
-                game.headers['Black'] = 'Unknown'
-            if 'Result' not in game.headers:
-                game.headers['Result'] = '*'
-            
-            # Add moves
-            moves_cols = ['moves', 'pgn', 'game_moves', 'notation']
-            moves_str = None
-            
-            for col in moves_cols:
-                if col in row and not pd.isna(row[col]):
-                    moves_str = str(row[col]).strip()
-                    break
-            
-            if moves_str and self.validate_pgn_moves(moves_str):
-                # Parse moves
-                board = game.board()
-                
-                # Clean up moves string
-                moves_str = re.sub(r'\d+\.+', '', moves_str)
-                moves_str = re.sub(r'\s+', ' ', moves_str).strip()
-                
-                moves = moves_str.split()
-                node = game
-                
-                for move in moves:
-                    move = move.strip()
-                    if not move or move in ['1-0', '0-1', '1/2-1/2', '*']:
-                        continue
-                        
-                    # Remove annotations
-                    clean_move = re.sub(r'[+#!?]+$', '', move)
-                    
-                    if clean_move:
-                        try:
-                            chess_move = board.push_san(clean_move)
-                            node = node.add_variation(chess_move)
-                        except (chess.InvalidMoveError, chess.IllegalMoveError):
-                            break
-            
-            return game
+        def on_error(message):
+            self.post(self.log_message, message)
             
+        try:
+            stats = convert(
+                csv_path, pgn_path, filters, workers,
+                on_progress=on_progress, on_error=on_error, cancel=self.cancel_event,
+                index_path=index_path, checkpoint_path=checkpoint_path, resume=resume, incremental=incremental
+            )
+            self.post(self.conversion_finished, stats, pgn_path, incremental is not None)
+            
+        except ConversionCancelled:
+            self.post(self.log_message, "Conversion cancelled")
+            if checkpoint_path or incremental:
+                self.post(self.log_message, "Progress saved; convert the same files again to resume")
+            self.post(self.set_status, "Conversion cancelled")
         except Exception as e:
-            self.log_message(f"Error converting row to PGN: {str(e)}")
-            return None
+            error_msg = f"Conversion failed: {str(e)}"
+            self.post(self.log_message, error_msg)
+            self.post(messagebox.showerror, "Error", error_msg)
+            self.post(self.set_status, "Conversion failed!")
+        finally:
+            self.post(self.finish_task)
+            
+    def conversion_finished(self, stats, pgn_path, incremental=False):
+        """Report a completed conversion"""
+        if stats.from_index:
+            self.log_message(f"Processed {stats.processed} games from index file")
+        else:
+            self.log_message(f"Processed {stats.processed} games from CSV")
+        if incremental:
+            if stats.rebuild_reason:
+                self.log_message(f"Converted from the start: {stats.rebuild_reason}")
+            self.log_message(f"New rows: {stats.processed - stats.resumed_rows}")
+        elif stats.resumed_rows:
+            self.log_message(f"Resumed after {stats.resumed_rows} games")
+        self.progress['value'] = 100
+        self.status_label.config(text="Conversion completed!")
+        
+        success_msg = f"Conversion completed!\n"
+        success_msg += f"Converted: {stats.converted} games\n"
+        success_msg += f"Skipped: {stats.skipped} games\n"
+        success_msg += f"Output file: {pgn_path}"
+        
+        self.log_message(success_msg)
+        
+        # Where the skipped games went and where the time went
+        report = stats_report(stats)
+        reasons = ', '.join(f"{reason}: {count}" for reason, count in report['skipped_by_reason'].items() if count)
+        if reasons:
+            self.log_message(f"Skipped by {reasons}")
+        invalid = ', '.join(f"{reason.replace('_', ' ')}: {count}" for reason, count in report['invalid_by_reason'].items() if count)
+        if invalid:
+            self.log_message(f"Written without moves ({invalid})")
+        timers = ', '.join(f"{stage} {seconds:.1f}s" for stage, seconds in report['timers'].items())
+        self.log_message(f"Time per stage: {timers}")
+        
+        messagebox.showinfo("Success", success_msg)
+            
 
 def main():
+    # Needed for worker processes in the frozen Windows build
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = CSVtoPGNConverter(root)
     root.mainloop()
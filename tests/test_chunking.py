@@ -0,0 +1,51 @@
+"""The PGN output must not depend on how the CSV is cut into blocks"""
+import pytest
+
+from csv2pgn import ConversionFilters, convert
+
+GAMES_CSV = """event,round,white,black,result,rating,opening,moves
+Club,3.0,Ann,Bob,1-0,1500,Sicilian Defense,1. e4 c5 2. Nf3 d6
+Club,4,Cid,Dan,0-1,,French Defense,1. e4 e6 2. d4 d5
+Club,5.5,Eve,Fay,1/2-1/2,1650.0,,1. d4 d5 2. c4 e6
+Club,,Gus,Hal,*,abc,Caro-Kann Defense,1. e4 c6
+Club,6,Ivy,Jon,1-0,2100,Ruy Lopez,1. e4 e5 2. Nf3 Nc6 3. Bb5 a6
+Club,7,Kim,Lee,1-0,1800,Italian Game,1. e4 e5 2. Nf3 Nc6 3. Bc4
+"""
+
+PUZZLES_CSV = """PuzzleId,FEN,Moves,Rating,RatingDeviation,Popularity,NbPlays,Themes,GameUrl,OpeningTags
+00000,r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3,f1c4 g8f6,1500,75,90,100,opening short,https://lichess.org/a,Italian_Game
+00001,r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3,f1b5 a7a6,1600,75,90,100,opening,https://lichess.org/b,Ruy_Lopez
+0a002,r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3,d2d4 e5d4,1700,75,90,100,opening,https://lichess.org/c,Scotch_Game
+00003,r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3,b1c3 g8f6,1800,75,90,100,opening,https://lichess.org/d,
+00004,r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3,c2c3 g8f6,1900,75,90,100,opening,https://lichess.org/e,Ponziani_Opening
+"""
+
+
+def convert_text(tmp_path, csv_text, name, **kwargs):
+    source = tmp_path / 'input.csv'
+    source.write_text(csv_text, encoding='utf-8')
+    output = tmp_path / name
+    convert(str(source), str(output), ConversionFilters(), **kwargs)
+    return output.read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize('csv_text', [GAMES_CSV, PUZZLES_CSV], ids=['games', 'puzzles'])
+def test_output_identical_across_chunk_sizes(tmp_path, csv_text):
+    whole = convert_text(tmp_path, csv_text, 'whole.pgn')
+    for chunk_rows in (1, 2, 3, 5):
+        assert convert_text(tmp_path, csv_text, f'chunks{chunk_rows}.pgn', chunk_rows=chunk_rows) == whole
+
+
+def test_output_identical_with_workers(tmp_path):
+    whole = convert_text(tmp_path, GAMES_CSV, 'whole.pgn')
+    assert convert_text(tmp_path, GAMES_CSV, 'workers.pgn', chunk_rows=2, workers=2) == whole
+
+
+def test_cells_keep_their_text(tmp_path):
+    games = convert_text(tmp_path, GAMES_CSV, 'games.pgn', chunk_rows=2)
+    assert '[Round "3.0"]' in games
+    assert '[Round "4"]' in games
+    
+    puzzles = convert_text(tmp_path, PUZZLES_CSV, 'puzzles.pgn', chunk_rows=5)
+    assert '[PuzzleId "00000"]' in puzzles
+    assert '[PuzzleId "0a002"]' in puzzles
@@ -0,0 +1,51 @@
+"""Command line options: flags must not take the input path as their value"""
+import os
+import subprocess
+import sys
+
+from csv2pgn.cli import build_parser, main
+from test_chunking import PUZZLES_CSV
+
+
+def test_dedup_flags():
+    args = build_parser().parse_args(['--dedup', 'games.csv'])
+    assert args.input == 'games.csv' and args.dedup and args.dedup_by is None
+    args = build_parser().parse_args(['--dedup-by', 'PuzzleId', 'puzzles.csv'])
+    assert args.input == 'puzzles.csv' and args.dedup_by == 'PuzzleId'
+
+
+def test_index_flags():
+    args = build_parser().parse_args(['--index', 'games.csv'])
+    assert args.input == 'games.csv' and args.index and args.index_path is None
+    args = build_parser().parse_args(['--index-path', 'cache.pgnidx', 'games.csv'])
+    assert args.input == 'games.csv' and args.index_path == 'cache.pgnidx'
+
+
+def test_checkpoint_flags():
+    args = build_parser().parse_args(['--checkpoint', 'games.csv', '-o', 'games.pgn'])
+    assert args.input == 'games.csv' and args.checkpoint and args.checkpoint_path is None
+    args = build_parser().parse_args(['--checkpoint-path', 'run.ckpt', '--resume', 'games.csv'])
+    assert args.input == 'games.csv' and args.checkpoint_path == 'run.ckpt' and args.resume
+
+
+def test_incremental_flags():
+    args = build_parser().parse_args(['--incremental', 'games.csv', '-o', 'games.pgn'])
+    assert args.input == 'games.csv' and args.incremental and args.incremental_path is None
+    args = build_parser().parse_args(['--incremental-path', 'daily.state', 'games.csv'])
+    assert args.input == 'games.csv' and args.incremental_path == 'daily.state'
+
+
+def test_dedup_by_column(tmp_path):
+    source = tmp_path / 'puzzles.csv'
+    source.write_text(PUZZLES_CSV + PUZZLES_CSV.split('\n', 2)[1] + '\n', encoding='utf-8')
+    output = tmp_path / 'puzzles.pgn'
+    assert main(['--dedup-by', 'PuzzleId', str(source), '-o', str(output), '-q']) == 0
+    assert output.read_text(encoding='utf-8').count('[PuzzleId "00000"]') == 1
+
+
+def test_cli_import_stays_light():
+    # pandas, numpy and pyarrow are only imported once a conversion starts
+    code = "import sys, csv2pgn.cli; print(sorted({'pandas', 'numpy', 'pyarrow'} & set(sys.modules)))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
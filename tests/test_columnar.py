@@ -0,0 +1,59 @@
+"""Parquet and Arrow input converts like the same data as CSV"""
+import pytest
+
+from csv2pgn import ConversionFilters, convert
+
+from test_chunking import GAMES_CSV, PUZZLES_CSV
+
+pyarrow = pytest.importorskip('pyarrow')
+pyarrow_csv = pytest.importorskip('pyarrow.csv')
+pyarrow_feather = pytest.importorskip('pyarrow.feather')
+pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+
+
+def write_inputs(tmp_path, csv_text):
+    csv_path = tmp_path / 'input.csv'
+    csv_path.write_text(csv_text, encoding='utf-8')
+    # Typed columns, as a corpus kept in Parquet would have them; ids and rounds stay text
+    options = pyarrow_csv.ConvertOptions(
+        strings_can_be_null=True,
+        column_types={'PuzzleId': pyarrow.string(), 'round': pyarrow.string()},
+    )
+    table = pyarrow_csv.read_csv(str(csv_path), convert_options=options)
+    pyarrow_parquet.write_table(table, str(tmp_path / 'input.parquet'), row_group_size=2)
+    pyarrow_feather.write_feather(table, str(tmp_path / 'input.feather'), chunksize=2)
+    return csv_path
+
+
+@pytest.mark.parametrize('csv_text', [GAMES_CSV, PUZZLES_CSV], ids=['games', 'puzzles'])
+@pytest.mark.parametrize('filters', [
+    ConversionFilters(),
+    ConversionFilters(1600, 2000),
+    ConversionFilters(openings=['Italian', 'Ruy Lopez']),
+], ids=['all', 'rating', 'opening'])
+def test_columnar_matches_csv(tmp_path, csv_text, filters):
+    csv_path = write_inputs(tmp_path, csv_text)
+    expected = tmp_path / 'csv.pgn'
+    expected_stats = convert(str(csv_path), str(expected), filters)
+    
+    for name in ('input.parquet', 'input.feather'):
+        output = tmp_path / (name + '.pgn')
+        stats = convert(str(tmp_path / name), str(output), filters, chunk_rows=3)
+        assert output.read_text(encoding='utf-8') == expected.read_text(encoding='utf-8')
+        assert (stats.processed, stats.converted, stats.skipped) == (
+            expected_stats.processed, expected_stats.converted, expected_stats.skipped)
+
+
+def test_pruning_compares_text(tmp_path):
+    # NbPlays is an integer column with a null, which pandas would turn into 100.0
+    csv_text = PUZZLES_CSV.replace('1600,75,90,100,', '1600,75,90,,')
+    csv_path = write_inputs(tmp_path, csv_text)
+    filters = ConversionFilters(expression='NbPlays has 100')
+    expected = tmp_path / 'csv.pgn'
+    expected_stats = convert(str(csv_path), str(expected), filters)
+    assert expected_stats.converted == 4
+    
+    output = tmp_path / 'parquet.pgn'
+    stats = convert(str(tmp_path / 'input.parquet'), str(output), filters)
+    assert output.read_text(encoding='utf-8') == expected.read_text(encoding='utf-8')
+    assert (stats.converted, stats.skipped) == (expected_stats.converted, expected_stats.skipped)
@@ -0,0 +1,38 @@
+"""The set of seen game hashes: lookups, bounded merges and saving"""
+import numpy as np
+
+from csv2pgn import dedup
+from csv2pgn.dedup import HashSet
+
+
+def filled_set(monkeypatch, count=20000, blocks=37):
+    monkeypatch.setattr(dedup, 'MAX_RUN_HASHES', 4096)
+    hashes = np.random.default_rng(1).integers(0, 2 ** 63, count, dtype=np.uint64)
+    hash_set = HashSet()
+    for block in np.array_split(hashes, blocks):
+        block = np.unique(block)
+        hash_set.add(block[~hash_set.contains(block)])
+    return hash_set, np.unique(hashes)
+
+
+def test_runs_stay_below_the_merge_cap(monkeypatch):
+    hash_set, hashes = filled_set(monkeypatch)
+    assert len(hash_set) == len(hashes)
+    assert max(len(run) for run in hash_set.runs) <= 4096
+    assert all((np.diff(run.astype(np.float64)) >= 0).all() for run in hash_set.runs)
+    assert hash_set.contains(hashes).all()
+    assert not hash_set.contains(np.arange(1, 1000, dtype=np.uint64)).any()
+
+
+def test_save_and_load(monkeypatch, tmp_path):
+    hash_set, hashes = filled_set(monkeypatch)
+    path = str(tmp_path / 'seen.npy')
+    hash_set.save(path)
+    assert np.array_equal(np.sort(np.load(path)), hashes)
+    
+    loaded = HashSet.load(path)
+    assert len(loaded) == len(hashes)
+    assert loaded.contains(hashes).all()
+    
+    HashSet().save(path)
+    assert len(HashSet.load(path)) == 0
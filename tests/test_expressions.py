@@ -0,0 +1,169 @@
+"""Filter expressions: parsing, and the chunk masks agreeing with the per-row check"""
+import pytest
+
+from csv2pgn import ConversionFilters, compile_expression, convert
+from csv2pgn.engine import detect_profile, read_csv_block
+from test_chunking import GAMES_CSV
+
+PUZZLES_CSV = """PuzzleId,FEN,Moves,Rating,RatingDeviation,Popularity,NbPlays,Themes,GameUrl,OpeningTags
+p1,8/8/8/8/8/8/8/K6k w - - 0 1,a1a2,1500,75,90,100,mateIn2 short,https://lichess.org/a,Italian_Game
+p2,8/8/8/8/8/8/8/K6k w - - 0 1,a1a2,1600,75,90,250,fork middlegame,https://lichess.org/b,Sicilian_Defense
+p3,8/8/8/8/8/8/8/K6k w - - 0 1,a1a2,1700,75,90,400,endgame long,https://lichess.org/c,
+p4,8/8/8/8/8/8/8/K6k w - - 0 1,a1a2,1800,75,90,50,,https://lichess.org/d,French_Defense
+p5,8/8/8/8/8/8/8/K6k w - - 0 1,a1a2,,75,90,,mateIn1 fork,https://lichess.org/e,Sicilian_Defense_Najdorf_Variation
+"""
+
+
+def load(csv_text):
+    chunk = read_csv_block(csv_text.encode('utf-8'))
+    return chunk, detect_profile(tuple(chunk.columns))
+
+
+def puzzles_selected(text):
+    """PuzzleIds selected by the chunk masks and by the per-row check"""
+    chunk, profile = load(PUZZLES_CSV)
+    expression = compile_expression(text)
+    kept, undecided = expression.filter_chunk(chunk, profile)
+    assert not undecided.any()
+    by_row = {row['PuzzleId'] for row in chunk.to_dict('records') if expression.matches(row, profile)}
+    return set(kept['PuzzleId']), by_row
+
+
+@pytest.mark.parametrize('text, expected', [
+    # Rating
+    ('rating = 1500', {'p1'}),
+    ('rating == 1500', {'p1'}),
+    ('rating != 1500', {'p2', 'p3', 'p4'}),
+    ('rating < 1700', {'p1', 'p2'}),
+    ('rating <= 1700', {'p1', 'p2', 'p3'}),
+    ('rating > 1700', {'p4'}),
+    ('rating >= 1700', {'p3', 'p4'}),
+    ('rating between 1600 and 1700', {'p2', 'p3'}),
+    ('rating in (1500, 1800)', {'p1', 'p4'}),
+    # Themes, by Lichess tag or theme name
+    ('themes = mateIn2', {'p1'}),
+    ('themes == "Mate in 2"', {'p1'}),
+    ('themes != fork', {'p1', 'p3'}),
+    ('themes != mateIn2', {'p2', 'p3', 'p5'}),
+    ('themes has fork', {'p2', 'p5'}),
+    ('theme has "mate in 1"', {'p5'}),
+    ('themes ~ mate', {'p1', 'p5'}),
+    ('themes in (fork, endgame)', {'p2', 'p3', 'p5'}),
+    # Opening
+    ('opening = "Italian Game"', {'p1'}),
+    ('opening != "Italian Game"', {'p2', 'p4', 'p5'}),
+    ('opening ~ Sicilian', {'p2', 'p5'}),
+    ('opening in ("French Defense", "Italian Game")', {'p1', 'p4'}),
+    ('opening has defense', {'p2', 'p4', 'p5'}),
+    # Text column
+    ('PuzzleId = p3', {'p3'}),
+    ('puzzleid != p3', {'p1', 'p2', 'p4', 'p5'}),
+    ('PuzzleId in (p1, p2)', {'p1', 'p2'}),
+    ('GameUrl ~ "org/E"', {'p5'}),
+    # Numeric column
+    ('NbPlays = 250', {'p2'}),
+    ('NbPlays != 100', {'p2', 'p3', 'p4'}),
+    ('NbPlays < 100', {'p4'}),
+    ('NbPlays <= 100', {'p1', 'p4'}),
+    ('NbPlays > 100', {'p2', 'p3'}),
+    ('NbPlays >= 250', {'p2', 'p3'}),
+    ('NbPlays between 50 and 100', {'p1', 'p4'}),
+    ('NbPlays in (50, 400)', {'p3', 'p4'}),
+    # Logic
+    ('rating >= 1600 and themes has fork', {'p2'}),
+    ('rating < 1600 or opening ~ French', {'p1', 'p4'}),
+    ('not themes has fork', {'p1', 'p3', 'p4'}),
+    ('not (rating > 1600 or themes has mateIn1)', {'p1', 'p2'}),
+    ('rating = 1500 or rating = 1600 and themes has short', {'p1'}),
+    ('(rating = 1500 or rating = 1600) and themes has middlegame', {'p2'}),
+    ('Rating BETWEEN 1500 AND 1600 Or NOT opening ~ Sicilian', {'p1', 'p2', 'p3', 'p4'}),
+])
+def test_puzzle_expressions(text, expected):
+    by_mask, by_row = puzzles_selected(text)
+    assert by_mask == expected
+    assert by_row == expected
+
+
+@pytest.mark.parametrize('text, themes, expected', [
+    ('themes has fork', frozenset(['fork']), True),
+    ('themes has fork', frozenset(['pin']), False),
+    ('themes != fork', frozenset(['pin']), True),
+    ('themes != fork', frozenset(['fork', 'pin']), False),
+    ('themes = mateIn2', frozenset(['mate in 2']), True),
+    ('themes in (pin, skewer)', frozenset(['skewer']), True),
+    ('themes ~ mate', frozenset(['back rank mate']), True),
+    ('not themes has fork', frozenset(['pin']), True),
+])
+def test_game_themes_decided_after_replay(text, themes, expected):
+    chunk, profile = load(GAMES_CSV)
+    expression = compile_expression(text)
+    kept, undecided = expression.filter_chunk(chunk, profile)
+    assert len(kept) == len(chunk) and undecided.all()
+    row = chunk.to_dict('records')[0]
+    assert expression.matches(row, profile, themes) is expected
+
+
+def test_game_opening_unknown_without_name():
+    chunk, profile = load(GAMES_CSV)
+    expression = compile_expression('opening ~ "Queen\'s Gambit"')
+    kept, undecided = expression.filter_chunk(chunk, profile)
+    
+    # Only the game without an opening name waits for its replay
+    assert list(kept['white']) == ['Eve']
+    assert undecided.all()
+    row = kept.to_dict('records')[0]
+    assert expression.matches(row, profile, opening="Queen's Gambit Declined")
+    assert not expression.matches(row, profile, opening='English Opening')
+
+
+def test_game_rating_and_columns():
+    chunk, profile = load(GAMES_CSV)
+    for text, expected in [
+            ('rating between 1500 and 1800', ['Ann', 'Eve', 'Kim']),
+            ('rating != 1500', ['Eve', 'Ivy', 'Kim']),
+            ('round >= 5', ['Eve', 'Ivy', 'Kim']),
+            ('black in (Bob, Dan)', ['Ann', 'Cid']),
+            ('not result = "1-0"', ['Cid', 'Eve', 'Gus'])]:
+        expression = compile_expression(text)
+        kept, undecided = expression.filter_chunk(chunk, profile)
+        assert not undecided.any()
+        assert list(kept['white']) == expected
+        rows = [row['white'] for row in chunk.to_dict('records') if expression.matches(row, profile)]
+        assert rows == expected
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    'rating',
+    'rating >',
+    'rating < high',
+    'rating between 1500',
+    'rating in (1500',
+    'themes has fork and',
+    '(rating > 1500',
+    'rating > 1500 1600',
+    '= 1500',
+    'rating ! 1500',
+])
+def test_parse_errors(text):
+    with pytest.raises(ValueError):
+        compile_expression(text)
+
+
+def test_unknown_column():
+    chunk, profile = load(PUZZLES_CSV)
+    with pytest.raises(ValueError, match='Unknown field'):
+        compile_expression('elo > 1500').filter_chunk(chunk, profile)
+
+
+@pytest.mark.parametrize('options', [{}, {'checkpoint_path': 'auto'}, {'incremental': 'auto'}],
+                         ids=['plain', 'checkpoint', 'incremental'])
+def test_unknown_column_keeps_output(tmp_path, options):
+    source = tmp_path / 'puzzles.csv'
+    source.write_text(PUZZLES_CSV, encoding='utf-8')
+    output = tmp_path / 'puzzles.pgn'
+    output.write_text('earlier games\n', encoding='utf-8')
+    
+    with pytest.raises(ValueError, match='Unknown field'):
+        convert(str(source), str(output), ConversionFilters(expression='elo > 1500'), **options)
+    assert output.read_text(encoding='utf-8') == 'earlier games\n'
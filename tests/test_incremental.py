@@ -0,0 +1,39 @@
+"""Incremental and checkpointed runs must only stop between whole rows"""
+import pytest
+
+from csv2pgn import ConversionFilters, convert
+
+HEADER = 'white,rating,moves\n'
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 1000])
+def test_row_appended_in_two_parts(tmp_path, chunk_rows):
+    source = tmp_path / 'games.csv'
+    output = tmp_path / 'games.pgn'
+    source.write_text(HEADER + 'A,1500,1. e4 e5\nB,1600,1. d4 d5 2. c4', encoding='utf-8')
+    
+    stats = convert(str(source), str(output), ConversionFilters(), chunk_rows=chunk_rows, incremental='auto')
+    assert stats.converted == 1
+    assert '[White "B"]' not in output.read_text(encoding='utf-8')
+    
+    with open(source, 'a', encoding='utf-8') as f:
+        f.write(' e6 3. Nc3\nC,1700,1. c4\n')
+    stats = convert(str(source), str(output), ConversionFilters(), chunk_rows=chunk_rows, incremental='auto')
+    assert stats.processed - stats.resumed_rows == 2
+    
+    pgn = output.read_text(encoding='utf-8')
+    assert pgn.count('[Event ') == 3
+    assert '[White "B"]' in pgn
+    assert '1. d4 d5 2. c4 e6 3. Nc3 *' in pgn
+    assert '[White "C"]' in pgn
+
+
+def test_checkpoint_converts_last_row_without_line_break(tmp_path):
+    source = tmp_path / 'games.csv'
+    output = tmp_path / 'games.pgn'
+    source.write_text(HEADER + 'A,1500,1. e4 e5\nB,1600,1. d4 d5', encoding='utf-8')
+    
+    stats = convert(str(source), str(output), ConversionFilters(), chunk_rows=1, checkpoint_path='auto')
+    assert stats.converted == 2
+    assert output.read_text(encoding='utf-8').endswith('1. d4 d5 *\n\n')
+    assert not (tmp_path / 'games.pgn.ckpt').exists()
@@ -0,0 +1,99 @@
+"""Sharded output: shard keys, open file limits and the manifest"""
+import gzip
+import json
+import threading
+
+import pytest
+
+from csv2pgn import (
+    ConversionCancelled, ConversionFilters, ShardKey, ShardSpec, convert, manifest_path, parse_shard_key,
+)
+from csv2pgn.shards import ShardedWriter, key_slug, read_manifest, write_manifest
+from test_chunking import GAMES_CSV
+
+
+@pytest.mark.parametrize('text', ['rating:0', 'rating:-100', 'rating:wide', 'elo'])
+def test_bad_shard_keys_rejected(text):
+    with pytest.raises(ValueError):
+        parse_shard_key(text)
+
+
+def test_shard_key_parsed():
+    assert str(parse_shard_key('rating')) == 'rating:200'
+    assert str(parse_shard_key('rating:100')) == 'rating:100'
+    assert str(parse_shard_key('opening')) == 'opening'
+    with pytest.raises(ValueError):
+        ShardKey('rating', 0)
+
+
+def shard_texts(shards, read):
+    return {shard.key: read(shard.path) for shard in shards}
+
+
+@pytest.mark.parametrize('ext', ['.pgn', '.pgn.gz'])
+def test_open_shards_capped(tmp_path, ext):
+    games = [(f'key{i % 5}', f'[Event "{i}"]\n\n*\n\n') for i in range(40)]
+    read = (lambda path: gzip.open(path, 'rt', encoding='utf-8').read()) if ext.endswith('.gz') else (
+        lambda path: open(path, encoding='utf-8').read())
+        
+    expected = {}
+    for key, text in games:
+        expected[key] = expected.get(key, '') + text
+        
+    writer = ShardedWriter(str(tmp_path / f'games{ext}'), ShardSpec(key=ShardKey('opening')), max_open=2)
+    for key, text in games:
+        writer.write(key, text)
+        assert sum(shard.file is not None for shard in writer.current.values()) <= 2
+    assert shard_texts(writer.close(), read) == expected
+
+
+def test_manifest_written_when_cancelled(tmp_path):
+    source = tmp_path / 'input.csv'
+    source.write_text(GAMES_CSV, encoding='utf-8')
+    output = tmp_path / 'games.pgn'
+    spec = ShardSpec(max_games=2)
+    
+    convert(str(source), str(output), ConversionFilters(), shards=spec)
+    with open(manifest_path(output), encoding='utf-8') as f:
+        assert json.load(f)['games'] == 6
+        
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(ConversionCancelled):
+        convert(str(source), str(output), ConversionFilters(), chunk_rows=1, cancel=cancel, shards=spec)
+    with open(manifest_path(output), encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert manifest['games'] == 1
+    assert [entry['file'] for entry in manifest['shards']] == ['games-00000.pgn']
+    assert not (tmp_path / 'games-00001.pgn').exists()
+
+
+def test_key_slugs_transliterated():
+    assert key_slug("King's Gambit") == 'kings-gambit'
+    assert key_slug('Grünfeld Defense') == 'grunfeld-defense'
+    assert key_slug('Réti Opening') == 'reti-opening'
+
+
+def write_keyed(output, games):
+    spec = ShardSpec(key=ShardKey('opening'))
+    writer = ShardedWriter(output, spec)
+    writer.reserve(read_manifest(output).get('shards', []))
+    for key, text in games:
+        writer.write(key, text)
+    return write_manifest(output, None, spec, ConversionFilters(), writer.close())
+
+
+def test_colliding_slugs_get_distinct_files(tmp_path):
+    output = str(tmp_path / 'games.pgn')
+    entries = write_keyed(output, [('Grünfeld', 'one\n\n'), ('Grunfeld', 'two\n\n'), ('Grünfeld', 'three\n\n')])
+    files = {entry['key']: entry['file'] for entry in entries}
+    assert files['Grünfeld'] == 'games-opening-grunfeld.pgn'
+    assert files['Grunfeld'].startswith('games-opening-grunfeld-')
+    assert (tmp_path / files['Grünfeld']).read_text(encoding='utf-8') == 'one\n\nthree\n\n'
+    assert (tmp_path / files['Grunfeld']).read_text(encoding='utf-8') == 'two\n\n'
+    
+    # Converting one key again keeps its file name and leaves the other key's file alone
+    entries = write_keyed(output, [('Grunfeld', 'four\n\n')])
+    assert {entry['key']: entry['file'] for entry in entries} == files
+    assert (tmp_path / files['Grünfeld']).read_text(encoding='utf-8') == 'one\n\nthree\n\n'
+    assert (tmp_path / files['Grunfeld']).read_text(encoding='utf-8') == 'four\n\n'
@@ -0,0 +1,93 @@
+"""The direct PGN formatter must write what python-chess writes for the same game
+
+The golden files in tests/data were checked against str(chess.pgn.Game); a
+change in the formatter or the header mapping shows up as a diff against them.
+"""
+import io
+import os
+import re
+
+import chess
+import chess.pgn
+import pytest
+
+from csv2pgn import ConversionFilters, convert, format_game
+from csv2pgn.engine import detect_profile, read_csv_block
+from csv2pgn.writer import format_movetext
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+FIXTURES = ['games', 'puzzles']
+
+
+def fixture_rows(name):
+    with open(os.path.join(DATA, f'{name}.csv'), 'rb') as f:
+        chunk = read_csv_block(f.read())
+    return detect_profile(tuple(chunk.columns)), chunk.to_dict('records')
+
+
+def games_by(name, header):
+    """Map a header value to the game text, for the games of a converted fixture"""
+    with open(os.path.join(DATA, f'{name}.pgn'), encoding='utf-8') as f:
+        texts = re.split(r'\n\n(?=\[Event )', f.read().rstrip('\n'))
+    return {chess.pgn.read_game(io.StringIO(text)).headers[header]: text for text in texts}
+
+
+@pytest.mark.parametrize('name', FIXTURES)
+def test_render_matches_python_chess(name):
+    profile, rows = fixture_rows(name)
+    for row in rows:
+        text, valid, _ = profile.render_game(row)
+        game, built_valid, _ = profile.build_game(row)
+        assert valid == built_valid
+        assert text == str(game) + "\n\n"
+
+
+@pytest.mark.parametrize('name', FIXTURES)
+def test_golden_output(tmp_path, name):
+    output = tmp_path / f'{name}.pgn'
+    convert(os.path.join(DATA, f'{name}.csv'), str(output), ConversionFilters())
+    with open(os.path.join(DATA, f'{name}.pgn'), encoding='utf-8') as f:
+        assert output.read_text(encoding='utf-8') == f.read()
+
+
+def test_invalid_moves_keep_headers_and_result():
+    games = games_by('games', 'Event')
+    assert games['Illegal moves'].endswith('[Blackelo "1610"]\n\n1/2-1/2')
+    assert games['Missing moves'].endswith('[Result "*"]\n\n*')
+    
+    puzzles = games_by('puzzles', 'PuzzleId')
+    assert puzzles['BADMV'].endswith('[Themes "opening"]\n\n*')
+
+
+def test_missing_headers_get_defaults():
+    game = games_by('games', 'Event')['?']
+    assert game.startswith('[Event "?"]\n[Site "?"]\n[Date "????.??.??"]\n[Round "?"]\n'
+                           '[White "?"]\n[Black "?"]\n[Result "*"]\n\n1. d4')
+
+
+def test_header_values_written_as_python_chess_does():
+    profile, rows = fixture_rows('games')
+    row = next(row for row in rows if str(row['event']).startswith('Quotes'))
+    text = profile.render_game(row)[0]
+    assert '[Event "Quotes "and" \\backslash"]' in text
+    assert '[White "O"Neil, Tim"]' in text
+    assert '[Black "Zoë Ünal"]' in text
+    
+    headers = chess.pgn.Headers(Event='a "quoted" \\ value')
+    assert format_game(headers, []) == str(chess.pgn.Game(headers)) + "\n\n"
+
+
+def test_puzzle_setup_headers():
+    puzzles = games_by('puzzles', 'PuzzleId')
+    assert '[FEN "r6k/pp2r2p/4Rp1Q/3p4/8/1N1P2R1/PqP2bPP/7K b - - 0 24"]\n[SetUp "1"]\n\n24... Bxg3 25. Rxe7' in puzzles['00008']
+    assert '[SetUp "1"]\n\n27. Qd6 Rd8' in puzzles['0000D']
+    
+    # The starting position needs no FEN
+    assert '[FEN ' not in puzzles['EMPTY']
+    assert '[SetUp ' not in puzzles['EMPTY']
+
+
+def test_movetext_from_either_side():
+    assert format_movetext(['e4', 'e5', 'Nf3']) == '1. e4 e5 2. Nf3 *'
+    assert format_movetext(['e5', 'Nf3', 'Nc6'], chess.BLACK, 5, '1-0') == '5... e5 6. Nf3 Nc6 1-0'
+    assert format_movetext([], chess.BLACK, 5, '0-1') == '0-1'